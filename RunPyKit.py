@@ -26,6 +26,7 @@
 # Formatted with black 21.9b0
 ################################################################################
 
+import multiprocessing
 import os
 import sys
 from platform import machine, platform
@@ -65,7 +66,11 @@ from library import *
 from library.libcip import ImportInspector
 from library.libm import PyEnv
 from library.libpyi import PyiTool
-from library.libqt import QLineEditMod, QTextEditMod
+from library.libqt import PkgsTableModel, QLineEditMod, QTextEditMod
+from library.librun import runner
+
+# 强制退出时等待正在运行的任务结束的最长秒数
+EXIT_TIMEOUT = 5
 
 
 class MainInterface(Ui_main_interface, QMainWindow):
@@ -83,22 +88,19 @@ class MainInterface(Ui_main_interface, QMainWindow):
         self.pb_pkg_dload.clicked.connect(win_dload_pkg.show)
 
     def closeEvent(self, event):
-        if (
-            win_package_mgr.repo.is_empty()
-            and win_pyi_tool.repo.is_empty()
-            and win_dload_pkg.repo.is_empty()
-        ):
+        if task_executor.is_idle():
             event.accept()
         else:
             role = NewMessageBox(
                 "警告",
-                "有任务正在运行...",
+                f"有{task_executor.running_count()}个任务正在运行...",
                 QMessageBox.Warning,
                 (("accept", "强制退出"), ("reject", "取消")),
             ).exec_()
             if role == 0:
-                win_package_mgr.repo.kill_all()
-                win_pyi_tool.repo.kill_all()
+                # 结束所有任务启动的子进程组，最多等待 EXIT_TIMEOUT 秒
+                task_executor.cancel()
+                task_executor.wait_idle(EXIT_TIMEOUT)
                 event.accept()
             else:
                 event.ignore()
@@ -117,6 +119,10 @@ class MainInterface(Ui_main_interface, QMainWindow):
 
 
 class PackageManagerWindow(Ui_package_manager, QMainWindow):
+    env_found = pyqtSignal(object, str)
+    latest_found = pyqtSignal(str, str, str)
+    pkgs_batch = pyqtSignal(int, list)
+
     def __init__(self):
         super().__init__()
         self.setupUi(self)
@@ -125,18 +131,32 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         self.env_list = get_pyenv_list(load_conf("pths"))
         self.path_list = [env.env_path for env in self.env_list]
         self.cur_pkgs_info = {}
+        self.pkgs_cache = PkgsInfoCache()
         self._reverseds = [True, True, True, True]
+        # 加载包信息的批次号，切换环境后旧的加载线程发来的数据被丢弃
+        self._load_token = 0
+        # 当前表格中规范化包名到显示包名的映射
+        self._pkg_names = {}
         self.selected_env_index = 0
-        self.repo = ThreadRepo(500)
+        self.env_jobs = EnvJobQueues(task_executor, self)
+        self.env_jobs.busy_changed.connect(self._refresh_env_state)
+        # 各环境正在执行的任务的提示文字
+        self._busy_texts = {}
+        self._loading = False
         self._normal_size = self.size()
 
     def _setup_other_widgets(self):
-        self.tw_installed_info.setColumnWidth(0, 220)
-        horiz_head = self.tw_installed_info.horizontalHeader()
+        self.pkgs_model = PkgsTableModel(self)
+        self.tv_installed_info.setModel(self.pkgs_model)
+        self.tv_installed_info.setColumnWidth(0, 220)
+        horiz_head = self.tv_installed_info.horizontalHeader()
         horiz_head.setSectionResizeMode(0, QHeaderView.Interactive)
         horiz_head.setSectionResizeMode(1, QHeaderView.ResizeToContents)
         horiz_head.setSectionResizeMode(2, QHeaderView.ResizeToContents)
         horiz_head.setSectionResizeMode(3, QHeaderView.Stretch)
+        horiz_head.setSortIndicatorShown(True)
+        # 按内容调整列宽时只计算可见行，行数很多时排序、筛选不必遍历上千行
+        horiz_head.setResizeContentsPrecision(0)
         self.loading_mov = QMovie(os.path.join(resources_path, "loading.gif"))
         self.loading_mov.setScaledSize(QSize(18, 18))
 
@@ -150,15 +170,19 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
     def _stop_before_close():
         return not NewMessageBox(
             "警告",
-            "当前有任务正在运行！\n是否安全停止所有正在运行的任务并关闭窗口？",
-            QMessageBox.Question,
-            (("accept", "安全停止并关闭"), ("reject", "取消")),
+            "当前有任务正在运行！\n关闭窗口将取消等待中的任务，并强制结束正在运行的"
+            "安装、卸载等 pip 进程，相关环境中的包可能处于未装完的状态。\n"
+            "是否停止所有任务并关闭窗口？",
+            QMessageBox.Warning,
+            (("accept", "强制停止并关闭"), ("reject", "取消")),
         ).exec_()
 
     def closeEvent(self, event):
-        if not self.repo.is_empty():
+        if not task_executor.is_idle(self):
             if self._stop_before_close():
-                self.repo.stop_all()
+                self.env_jobs.cancel_pending()
+                self._load_token += 1
+                self._loading = False
                 self._clear_pkgs_table_widget()
                 save_conf(self.path_list, "pths")
                 event.accept()
@@ -188,20 +212,24 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
 
     def connect_signals_slots(self):
         self.btn_autosearch.clicked.connect(self.auto_search_env)
+        self.env_found.connect(self._add_found_env)
+        self.latest_found.connect(self._set_latest_version)
+        self.pkgs_batch.connect(self._add_pkgs_batch)
         self.btn_delselected.clicked.connect(self.del_selected_py_env)
         self.btn_addmanully.clicked.connect(self.add_py_path_manully)
         self.cb_check_uncheck_all.clicked.connect(self.select_all_or_cancel_all)
-        self.lw_env_list.itemPressed.connect(lambda: self.get_pkgs_info(0))
+        self.lw_env_list.itemPressed.connect(lambda: self.get_pkgs_info())
         self.btn_check_for_updates.clicked.connect(self.check_cur_pkgs_for_updates)
         self.btn_install_package.clicked.connect(win_ins_pkg.show)
         self.btn_install_package.clicked.connect(self.set_win_install_package_envinfo)
         self.btn_uninstall_package.clicked.connect(self.uninstall_pkgs)
         self.btn_upgrade_package.clicked.connect(self.upgrade_pkgs)
         self.btn_upgrade_all.clicked.connect(self.upgrade_all_pkgs)
-        self.tw_installed_info.horizontalHeader().sectionClicked[int].connect(
+        self.tv_installed_info.horizontalHeader().sectionClicked[int].connect(
             self._sort_by_column
         )
-        self.tw_installed_info.clicked.connect(self._show_tip_num_selected)
+        self.tv_installed_info.clicked.connect(self._show_tip_num_selected)
+        self.le_filter_pkgs.textChanged.connect(self.pkgs_model.set_filter)
         self.cb_check_uncheck_all.clicked.connect(self._show_tip_num_selected)
         win_ins_pkg.pb_do_install.clicked.connect(self.install_pkgs)
 
@@ -213,7 +241,7 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
 
     def _show_tip_num_selected(self):
         self.lb_num_selected_items.setText(
-            f"当前选中数量：{len(self.indexs_of_selected_rows())}"
+            f"当前选中数量：{sum(b - t + 1 for t, b in self.selected_row_ranges())}"
         )
 
     def list_widget_pyenvs_update(self):
@@ -229,111 +257,214 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
 
     def table_widget_pkgs_info_update(self):
         self.lb_num_selected_items.clear()
-        self.tw_installed_info.clearContents()
-        self.tw_installed_info.setRowCount(len(self.cur_pkgs_info))
-        color_green = QColor(0, 170, 0)
-        color_red = QColor(255, 0, 0)
-        color_gray = QColor(243, 243, 243)
-        for rowind, pkg_name in enumerate(self.cur_pkgs_info):
-            even_num_row = rowind % 2
-            item = QTableWidgetItem(pkg_name)
-            self.tw_installed_info.setItem(rowind, 0, item)
-            if not even_num_row:
-                item.setBackground(color_gray)
-            for colind, item_text in enumerate(
-                self.cur_pkgs_info.get(pkg_name, ["", "", ""])
-            ):
-                item = QTableWidgetItem(item_text)
-                if colind == 2:
-                    if item_text in ("升级成功", "安装成功", "卸载成功"):
-                        item.setForeground(color_green)
-                    elif item_text in ("升级失败", "安装失败", "卸载失败"):
-                        item.setForeground(color_red)
-                    item.setTextAlignment(Qt.AlignHCenter | Qt.AlignVCenter)
-                if not even_num_row:
-                    item.setBackground(color_gray)
-                self.tw_installed_info.setItem(rowind, colind + 1, item)
+        self.pkgs_model.sync(self.cur_pkgs_info)
 
     def _sort_by_column(self, colind):
-        if colind == 0:
-            self.cur_pkgs_info = dict(
-                sorted(
-                    self.cur_pkgs_info.items(),
-                    key=lambda x: x[0].lower(),
-                    reverse=self._reverseds[colind],
-                )
-            )
-        else:
-            self.cur_pkgs_info = dict(
-                sorted(
-                    self.cur_pkgs_info.items(),
-                    key=lambda x: x[1][colind - 1],
-                    reverse=self._reverseds[colind],
-                )
-            )
-        self.table_widget_pkgs_info_update()
+        order = Qt.DescendingOrder if self._reverseds[colind] else Qt.AscendingOrder
+        self.pkgs_model.sort(colind, order)
+        self.tv_installed_info.horizontalHeader().setSortIndicator(colind, order)
         self._reverseds[colind] = not self._reverseds[colind]
 
     def _clear_pkgs_table_widget(self):
         self.lb_num_selected_items.clear()
-        self.tw_installed_info.clearContents()
-        self.tw_installed_info.setRowCount(0)
+        self.pkgs_model.clear()
 
-    def get_pkgs_info(self, no_connect):
+    def get_pkgs_info(self):
+        """
+        在线程中分批读取选中环境的包信息，每批通过 pkgs_batch 信号添加到表格，
+        加载期间表格可以滚动、筛选，只禁用针对包的操作按钮。
+        """
         self.selected_env_index = self.lw_env_list.currentRow()
         if self.selected_env_index == -1:
             return None
+        cur_env = self.env_list[self.selected_env_index]
+        self._load_token += 1
+        token = self._load_token
+        self.cur_pkgs_info.clear()
+        self._pkg_names.clear()
+        self._clear_pkgs_table_widget()
 
         def do_get_pkgs_info():
-            pkgs_info = self.env_list[self.selected_env_index].pkgs_info()
-            self.cur_pkgs_info.clear()
-            for pkg_info in pkgs_info:
-                self.cur_pkgs_info[pkg_info[0]] = [pkg_info[1], "", ""]
-
+            for batch in self.pkgs_cache.iter_pkgs_info(cur_env):
+                # 已切换到其他环境，不再读取
+                if token != self._load_token:
+                    break
+                self.pkgs_batch.emit(token, batch)
+
+        self._loading = True
+        self._refresh_env_state()
         thread_get_pkgs_info = NewTask(do_get_pkgs_info)
-        if not no_connect:
-            thread_get_pkgs_info.at_start(
-                self.lock_widgets,
-                lambda: self.show_loading("正在加载包信息..."),
-            )
-            thread_get_pkgs_info.at_finish(
-                self.table_widget_pkgs_info_update,
-                self.hide_loading,
-                self.release_widgets,
-            )
-        thread_get_pkgs_info.start()
-        self.repo.put(thread_get_pkgs_info, 1)
+        thread_get_pkgs_info.at_finish(lambda: self._finish_loading(token))
+        # 快速切换环境时只保留最后一次等待中的加载任务
+        task_executor.submit(
+            thread_get_pkgs_info, PRIORITY_HIGH, key=(self, "pkgs_info"), group=self
+        )
         return thread_get_pkgs_info
 
-    def indexs_of_selected_rows(self):
-        row_indexs = []
-        for item in self.tw_installed_info.selectedItems():
-            row_index = item.row()
-            if row_index not in row_indexs:
-                row_indexs.append(row_index)
-        return row_indexs
+    def _add_pkgs_batch(self, token, batch):
+        """
+        把一批 (包名, 版本) 合并到 cur_pkgs_info 和表格中，按规范化包名去重，
+        版本为 None 的包从中删除。
+        """
+        if token != self._load_token:
+            return
+        new_rows, removed = [], False
+        for name, version in batch:
+            key = canonical_name(name)
+            old_name = self._pkg_names.get(key, None)
+            if version is None:
+                if old_name is not None:
+                    del self._pkg_names[key]
+                    del self.cur_pkgs_info[old_name]
+                    removed = True
+                continue
+            if old_name is None:
+                self._pkg_names[key] = name
+                self.cur_pkgs_info[name] = [version, "", ""]
+                new_rows.append((name, self.cur_pkgs_info[name]))
+                continue
+            if old_name != name:
+                self._pkg_names[key] = name
+                self.cur_pkgs_info[name] = self.cur_pkgs_info.pop(old_name)
+                self.pkgs_model.rename(old_name, name)
+            self.cur_pkgs_info[name][0] = version
+            self.pkgs_model.update(name, (version, None, None))
+        if removed:
+            # 有包被删除时表格重新载入全部数据，其中已包括本批新增的包
+            self.pkgs_model.sync(self.cur_pkgs_info)
+        else:
+            self.pkgs_model.extend(new_rows)
+
+    def _finish_loading(self, token):
+        if token != self._load_token:
+            return
+        self.pkgs_model.resort()
+        self._loading = False
+        self._refresh_env_state()
+
+    def _cur_env_path(self):
+        if 0 <= self.selected_env_index < len(self.env_list):
+            return self.env_list[self.selected_env_index].env_path
+        return ""
+
+    def _refresh_env_state(self, *_):
+        """
+        按当前选中的环境是否有任务在执行、包信息是否正在加载，启用或禁用针对该环境
+        的操作按钮并显示提示；其他环境的任务不影响当前环境的操作。
+        """
+        env_path = self._cur_env_path()
+        busy_text = ""
+        if self.env_jobs.is_busy(env_path):
+            busy_text = self._busy_texts.get(env_path, "")
+            pending = self.env_jobs.pending(env_path)
+            if pending:
+                busy_text += f"(另有{pending}个任务排队)"
+        for widget in (
+            self.btn_check_for_updates,
+            self.btn_install_package,
+            self.btn_uninstall_package,
+            self.btn_upgrade_package,
+            self.btn_upgrade_all,
+        ):
+            widget.setEnabled(not (busy_text or self._loading))
+        self.btn_delselected.setEnabled(not busy_text)
+        if busy_text:
+            self.show_loading(busy_text)
+        elif self._loading:
+            self.show_loading("正在加载包信息...")
+        else:
+            self.hide_loading()
+
+    def _run_env_job(self, pyenv, target, busy_text, *at_finish):
+        """
+        把针对 pyenv 环境的任务加入该环境的队列，同一环境的任务依次执行。
+        target 在线程中执行，以本任务的取消标记为参数，不直接修改 cur_pkgs_info，
+        结果由 at_finish 中的回调在主线程中应用。
+        """
+        env_path = pyenv.env_path
+        token = CancelToken()
+        task = NewTask(target, (token,), token)
+        task.at_start(
+            lambda: self._busy_texts.__setitem__(env_path, busy_text),
+            self._refresh_env_state,
+        )
+        task.at_finish(*at_finish, self._refresh_env_state, self._show_pip_cost)
+        self.env_jobs.put(env_path, task)
+
+    def _show_pip_cost(self):
+        """在状态栏中显示程序启动以来 pip 各子命令的累计运行开销。"""
+        report = runner.report("pip ")
+        if report:
+            self.statusBar().showMessage("；".join(report.splitlines()))
+
+    def _apply_pkg_results(self, env_path, action, snapshot, names):
+        """
+        在主线程中把安装、卸载、升级任务的结果快照应用到 cur_pkgs_info 和表格。
+        :param action: str, "安装"、"卸载" 或 "升级"。
+        :param snapshot: dict, 任务线程填写的 {"results": [(包名, 是否成功)...],
+        "changes": PkgsInfoCache.changes 的返回值, "cancelled": 是否被取消}。
+        :param names: list[str], 本次任务要处理的包名，任务被取消时其中没有结果的包
+        标记为已取消。
+        """
+        if env_path != self._cur_env_path() or "results" not in snapshot:
+            return
+        if snapshot.get("cancelled", False):
+            done = {canonical_name(n) for n, _ in snapshot["results"]}
+            for name in names:
+                if canonical_name(name) not in done:
+                    item = self.cur_pkgs_info.setdefault(name, ["", "", ""])
+                    item[2] = action + "已取消"
+        for name, code in snapshot["results"]:
+            item = self.cur_pkgs_info.setdefault(name, ["", "", ""])
+            if action == "安装" and not item[0]:
+                item[0] = "- N/A -"
+            elif action == "卸载" and code:
+                item[0] = "- N/A -"
+            elif action == "升级" and code and item[1]:
+                item[0] = item[1]
+            item[2] = action + ("成功" if code else "失败")
+        installed, removed = snapshot.get("changes", ([], []))
+        keys = {canonical_name(k): k for k in self.cur_pkgs_info}
+        for name, version in installed:
+            key = keys.get(canonical_name(name), name)
+            self.cur_pkgs_info.setdefault(key, ["", "", ""])[0] = version
+        for name in removed:
+            key = keys.get(canonical_name(name), None)
+            if key is not None:
+                self.cur_pkgs_info[key][0] = "- N/A -"
+        self.table_widget_pkgs_info_update()
+
+    def selected_row_ranges(self):
+        """
+        返回选中行的区间列表 [[起始行, 结束行]...]，按行号排序，相邻、重叠的区间合并。
+        直接取选择模型中的区间，不逐个列出选中的单元格。
+        """
+        merged = []
+        for top, bottom in sorted(
+            (sel_range.top(), sel_range.bottom())
+            for sel_range in self.tv_installed_info.selectionModel().selection()
+        ):
+            if merged and top <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], bottom)
+            else:
+                merged.append([top, bottom])
+        return merged
 
     def select_all_or_cancel_all(self):
         if self.cb_check_uncheck_all.isChecked():
-            self.tw_installed_info.selectAll()
+            self.tv_installed_info.selectAll()
         else:
-            self.tw_installed_info.clearSelection()
+            self.tv_installed_info.clearSelection()
 
 
     def auto_search_env(self):
         def search_env():
-            for _path in all_py_paths():
-                _path = _check_venv(_path)
-                if _path.lower() in path_list_lower:
-                    continue
-                try:
-                    env = PyEnv(_path)
-                except Exception:
-                    continue
-                self.env_list.append(env)
-                self.path_list.append(env.env_path)
+            for env, text in search_py_envs(
+                (_check_venv(p) for p in all_py_paths()), known_paths
+            ):
+                self.env_found.emit(env, text)
 
-        path_list_lower = [p.lower() for p in self.path_list]
+        known_paths = self.path_list.copy()
         thread_search_envs = NewTask(search_env)
         thread_search_envs.at_start(
             self.lock_widgets,
@@ -341,13 +472,22 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         )
         thread_search_envs.at_finish(
             self._clear_pkgs_table_widget,
-            self.list_widget_pyenvs_update,
             self.hide_loading,
             self.release_widgets,
+            self._refresh_env_state,
             lambda: save_conf(self.path_list, "pths"),
         )
-        thread_search_envs.start()
-        self.repo.put(thread_search_envs, 0)
+        task_executor.submit(thread_search_envs, PRIORITY_HIGH, group=self)
+
+    def _add_found_env(self, env, text):
+        """搜索过程中每找到一个Python环境就将其添加到环境列表。"""
+        if env.env_path.lower() in [p.lower() for p in self.path_list]:
+            return
+        self.env_list.append(env)
+        self.path_list.append(env.env_path)
+        item = QListWidgetItem(text)
+        item.setSizeHint(QSize(0, 28))
+        self.lw_env_list.addItem(item)
 
     def del_selected_py_env(self):
         cur_index = self.lw_env_list.currentRow()
@@ -397,33 +537,32 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         save_conf(self.path_list, "pths")
 
     def check_cur_pkgs_for_updates(self):
-        if self.tw_installed_info.rowCount() == 0:
+        if self.pkgs_model.rowCount() == 0:
             return
         cur_row = self.lw_env_list.currentRow()
         if cur_row == -1:
             return
-        thread_get_info = self.get_pkgs_info(no_connect=1)
-
-        def do_get_outdated():
-            thread_get_info.wait()
-            outdateds = self.env_list[cur_row].outdated()
-            for outdated_info in outdateds:
-                self.cur_pkgs_info.setdefault(outdated_info[0], ["", "", ""])[
-                    1
-                ] = outdated_info[2]
-
-        thread_get_outdated = NewTask(do_get_outdated)
-        thread_get_outdated.at_start(
-            self.lock_widgets,
-            lambda: self.show_loading("正在检查更新..."),
-        )
-        thread_get_outdated.at_finish(
-            self.table_widget_pkgs_info_update,
-            self.hide_loading,
-            self.release_widgets,
-        )
-        thread_get_outdated.start()
-        self.repo.put(thread_get_outdated, 1)
+        cur_env = self.env_list[cur_row]
+        pkgs_info = [
+            (name, info[0])
+            for name, info in self.cur_pkgs_info.items()
+            if info[0] and info[0] != "- N/A -"
+        ]
+
+        def do_get_outdated(token):
+            for name, _, latest in query_outdated(cur_env, pkgs_info):
+                if token.cancelled:
+                    break
+                self.latest_found.emit(cur_env.env_path, name, latest)
+
+        self._run_env_job(cur_env, do_get_outdated, "正在检查更新...")
+
+    def _set_latest_version(self, env_path, name, latest):
+        """查询到一个包的最新版本后立即填入表格的最新版本列。"""
+        if env_path != self._cur_env_path() or name not in self.cur_pkgs_info:
+            return
+        self.cur_pkgs_info[name][1] = latest
+        self.pkgs_model.update(name, (None, latest, None))
 
     def lock_widgets(self):
         for widget in (
@@ -431,7 +570,7 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
             self.btn_addmanully,
             self.btn_delselected,
             self.lw_env_list,
-            self.tw_installed_info,
+            self.tv_installed_info,
             self.cb_check_uncheck_all,
             self.btn_check_for_updates,
             self.btn_install_package,
@@ -448,7 +587,7 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
             self.btn_addmanully,
             self.btn_delselected,
             self.lw_env_list,
-            self.tw_installed_info,
+            self.tv_installed_info,
             self.cb_check_uncheck_all,
             self.btn_check_for_updates,
             self.btn_install_package,
@@ -472,36 +611,34 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         use_index_url = conf.get("use_index_url", False)
         index_url = conf.get("index_url", "") if use_index_url else ""
 
-        def do_install():
-            for name, code in loop_install(
-                cur_env,
-                package_to_be_installed,
-                pre=install_pre,
-                user=user,
-                index_url=index_url,
-            ):
-                item = self.cur_pkgs_info.setdefault(name, ["", "", ""])
-                if not item[0]:
-                    item[0] = "- N/A -"
-                item[2] = "安装成功" if code else "安装失败"
-
-        thread_install_pkgs = NewTask(do_install)
-        thread_install_pkgs.at_start(
-            self.lock_widgets,
-            lambda: self.show_loading("正在安装..."),
-        )
-        thread_install_pkgs.at_finish(
-            self.table_widget_pkgs_info_update,
-            self.hide_loading,
-            self.release_widgets,
+        snapshot = {}
+
+        def do_install(token):
+            results = list(
+                batch_install(
+                    cur_env,
+                    package_to_be_installed,
+                    pre=install_pre,
+                    user=user,
+                    index_url=index_url,
+                    token=token,
+                )
+            )
+            snapshot["changes"] = self.pkgs_cache.changes(cur_env)
+            snapshot["cancelled"] = token.cancelled
+            snapshot["results"] = results
+
+        self._run_env_job(
+            cur_env,
+            do_install,
+            "正在安装...",
+            lambda: self._apply_pkg_results(
+                cur_env.env_path, "安装", snapshot, package_to_be_installed
+            ),
         )
-        thread_install_pkgs.start()
-        self.repo.put(thread_install_pkgs, 0)
 
     def uninstall_pkgs(self):
-        pkgs_info_keys = tuple(self.cur_pkgs_info.keys())
-        pkg_indexs = self.indexs_of_selected_rows()
-        pkg_names = [pkgs_info_keys[index] for index in pkg_indexs]
+        pkg_names = self.pkgs_model.names_in_ranges(self.selected_row_ranges())
         if not pkg_names:
             return
         cur_env = self.env_list[self.lw_env_list.currentRow()]
@@ -519,30 +656,25 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         if uninstall_msg_box.exec_() != 0:
             return
 
-        def do_uninstall():
-            for pkg_name, code in loop_uninstall(cur_env, pkg_names):
-                item = self.cur_pkgs_info.setdefault(pkg_name, ["", "", ""])
-                if code:
-                    item[0] = "- N/A -"
-                item[2] = "卸载成功" if code else "卸载失败"
-
-        thread_uninstall_pkgs = NewTask(do_uninstall)
-        thread_uninstall_pkgs.at_start(
-            self.lock_widgets,
-            lambda: self.show_loading("正在卸载..."),
-        )
-        thread_uninstall_pkgs.at_finish(
-            self.table_widget_pkgs_info_update,
-            self.hide_loading,
-            self.release_widgets,
+        snapshot = {}
+
+        def do_uninstall(token):
+            results = list(loop_uninstall(cur_env, pkg_names, token=token))
+            snapshot["changes"] = self.pkgs_cache.changes(cur_env)
+            snapshot["cancelled"] = token.cancelled
+            snapshot["results"] = results
+
+        self._run_env_job(
+            cur_env,
+            do_uninstall,
+            "正在卸载...",
+            lambda: self._apply_pkg_results(
+                cur_env.env_path, "卸载", snapshot, pkg_names
+            ),
         )
-        thread_uninstall_pkgs.start()
-        self.repo.put(thread_uninstall_pkgs, 0)
 
     def upgrade_pkgs(self):
-        pkgs_info_keys = tuple(self.cur_pkgs_info.keys())
-        pkg_indexs = self.indexs_of_selected_rows()
-        pkg_names = [pkgs_info_keys[index] for index in pkg_indexs]
+        pkg_names = self.pkgs_model.names_in_ranges(self.selected_row_ranges())
         if not pkg_names:
             return
         cur_env = self.env_list[self.lw_env_list.currentRow()]
@@ -562,23 +694,22 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         ):
             return
 
-        def do_upgrade():
-            for pkg_name, code in loop_install(cur_env, pkg_names, upgrade=1):
-                item = self.cur_pkgs_info.setdefault(pkg_name, ["", "", ""])
-                if code and item[1]:
-                    item[0] = item[1]
-                item[2] = "升级成功" if code else "升级失败"
-
-        thread_upgrade_pkgs = NewTask(do_upgrade)
-        thread_upgrade_pkgs.at_start(
-            self.lock_widgets,
-            lambda: self.show_loading("正在升级..."),
-        )
-        thread_upgrade_pkgs.at_finish(
-            self.table_widget_pkgs_info_update, self.hide_loading, self.release_widgets
+        snapshot = {}
+
+        def do_upgrade(token):
+            results = list(batch_install(cur_env, pkg_names, upgrade=1, token=token))
+            snapshot["changes"] = self.pkgs_cache.changes(cur_env)
+            snapshot["cancelled"] = token.cancelled
+            snapshot["results"] = results
+
+        self._run_env_job(
+            cur_env,
+            do_upgrade,
+            "正在升级...",
+            lambda: self._apply_pkg_results(
+                cur_env.env_path, "升级", snapshot, pkg_names
+            ),
         )
-        thread_upgrade_pkgs.start()
-        self.repo.put(thread_upgrade_pkgs, 0)
 
     def upgrade_all_pkgs(self):
         upgradeable = [item[0] for item in self.cur_pkgs_info.items() if item[1][1]]
@@ -590,15 +721,39 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
             ).exec_()
             return
         cur_env = self.env_list[self.lw_env_list.currentRow()]
-        names_text = (
-            "\n".join(upgradeable)
-            if len(upgradeable) <= 10
-            else "\n".join(("\n".join(upgradeable[:10]), "......"))
+        plan = {}
+
+        def make_plan(token):
+            # 读取所有已安装包的元数据较慢，在线程中进行，不阻塞界面
+            waves = upgrade_waves(dist_requires(cur_env), upgradeable)
+            if not token.cancelled:
+                plan["waves"] = waves
+
+        self._run_env_job(
+            cur_env,
+            make_plan,
+            "正在分析依赖...",
+            lambda: self._confirm_upgrade(cur_env, upgradeable, plan),
         )
+
+    def _confirm_upgrade(self, cur_env, upgradeable, plan):
+        """依赖分析完成后在主线程中确认升级计划，确认后按批次升级。"""
+        if "waves" not in plan or cur_env.env_path != self._cur_env_path():
+            return
+        waves = plan["waves"]
+        plan_lines = list()
+        for num, wave in enumerate(waves[:10], 1):
+            wave_text = ", ".join(wave[:6])
+            if len(wave) > 6:
+                wave_text += f" 等{len(wave)}个"
+            plan_lines.append(f"第{num}批：{wave_text}")
+        if len(waves) > 10:
+            plan_lines.append("......")
+        plan_text = "\n".join(plan_lines)
         if (
             NewMessageBox(
                 "全部升级",
-                f"确认升级？\n{names_text}",
+                f"确认升级？共{len(upgradeable)}个包，分{len(waves)}批升级：\n{plan_text}",
                 QMessageBox.Question,
                 (("accept", "确定"), ("reject", "取消")),
             ).exec_()
@@ -606,23 +761,26 @@ class PackageManagerWindow(Ui_package_manager, QMainWindow):
         ):
             return
 
-        def do_upgrade():
-            for pkg_name, code in loop_install(cur_env, upgradeable, upgrade=1):
-                item = self.cur_pkgs_info.setdefault(pkg_name, ["", "", ""])
-                if code and item[1]:
-                    item[0] = item[1]
-                item[2] = "升级成功" if code else "升级失败"
-
-        thread_upgrade_pkgs = NewTask(do_upgrade)
-        thread_upgrade_pkgs.at_start(
-            self.lock_widgets,
-            lambda: self.show_loading("正在升级..."),
+        snapshot = {}
+
+        def do_upgrade(token):
+            results = []
+            for wave in waves:
+                if token.cancelled:
+                    break
+                results.extend(batch_install(cur_env, wave, upgrade=1, token=token))
+            snapshot["changes"] = self.pkgs_cache.changes(cur_env)
+            snapshot["cancelled"] = token.cancelled
+            snapshot["results"] = results
+
+        self._run_env_job(
+            cur_env,
+            do_upgrade,
+            "正在升级...",
+            lambda: self._apply_pkg_results(
+                cur_env.env_path, "升级", snapshot, upgradeable
+            ),
         )
-        thread_upgrade_pkgs.at_finish(
-            self.table_widget_pkgs_info_update, self.hide_loading, self.release_widgets
-        )
-        thread_upgrade_pkgs.start()
-        self.repo.put(thread_upgrade_pkgs, 0)
 
 
 class AskFilePath:
@@ -957,7 +1115,6 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
             self.le_product_version_3,
         )
         self._setup_other_widgets()
-        self.repo = ThreadRepo(500)
         self._stored_conf = {}
         self.toolwin_env = None
         self.pyi_tool = PyiTool()
@@ -968,7 +1125,7 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
         self._normal_size = self.size()
 
     def closeEvent(self, event):
-        if not self.repo.is_empty():
+        if not task_executor.is_idle(self):
             NewMessageBox(
                 "提醒",
                 "任务正在运行中，关闭此窗口后任务将在后台运行。\n请勿对相关目录进行任\
@@ -982,7 +1139,7 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
     def show(self):
         self.resize(self._normal_size)
         super().show()
-        if self.repo.is_empty():
+        if task_executor.is_idle(self):
             self.apply_stored_config()
             self.pyi_tool.initialize(
                 self._stored_conf.get("env_path", ""),
@@ -1120,8 +1277,7 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
             lambda: win_check_imp.checkimp_table_update(missings),
             win_check_imp.show,
         )
-        thread_check_imp.start()
-        self.repo.put(thread_check_imp, 1)
+        task_executor.submit(thread_check_imp, group=self)
 
     def set_le_program_entry(self):
         selected_file = self._select_file_dir(
@@ -1445,8 +1601,7 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
             self.hide_running,
             self.release_widgets,
         )
-        thread_reinstall.start()
-        self.repo.put(thread_reinstall, 0)
+        task_executor.submit(thread_reinstall, group=self)
 
     def set_platform_info(self):
         self.lb_platform_info.setText(f"{platform()}-{machine()}")
@@ -1541,15 +1696,15 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
             ).exec_()
             return
         self.pyi_tool.prepare_cmd(self._stored_conf)
-        self.handle = self.pyi_tool.handle()
-        thread_build = NewTask(self.pyi_tool.execute_cmd)
+        token = CancelToken()
+        self.handle = self.pyi_tool.handle(token)
+        thread_build = NewTask(self.pyi_tool.execute_cmd, token=token)
         thread_build.at_start(
             self.lock_widgets,
             lambda: self.show_running("正在生成可执行文件..."),
         )
         thread_build.at_finish(self.hide_running, self.release_widgets)
-        thread_build.start()
-        self.repo.put(thread_build, 0)
+        task_executor.submit(thread_build, group=self)
 
     def install_missings(self, missings):
         if not missings:
@@ -1567,11 +1722,12 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
         ).exec_():
             return
 
-        def install_mis():
-            for name in missings:
-                self.toolwin_env.install(name)
+        def install_mis(token):
+            for _ in loop_install(self.toolwin_env, missings, token=token):
+                pass
 
-        thread_ins_mis = NewTask(install_mis)
+        token = CancelToken()
+        thread_ins_mis = NewTask(install_mis, (token,), token)
         thread_ins_mis.at_start(
             self.lock_widgets,
             lambda: self.show_running("正在安装缺失模块..."),
@@ -1586,8 +1742,7 @@ class PyinstallerToolWindow(Ui_pyinstaller_tool, QMainWindow):
                 QMessageBox.Information,
             ).exec_(),
         )
-        thread_ins_mis.start()
-        self.repo.put(thread_ins_mis, 0)
+        task_executor.submit(thread_ins_mis, group=self)
 
 
 class ChooseEnvWindow(Ui_choose_env, QWidget):
@@ -1667,7 +1822,8 @@ class CheckImportsWindow(Ui_check_imports, QWidget):
         missing_data, *_ = missing_data
         self.all_missing_modules = set()
         for *_, m in missing_data:
-            self.all_missing_modules.update(m)
+            if m is not None:
+                self.all_missing_modules.update(m)
         self.tw_missing_imports.clearContents()
         self.tw_missing_imports.setRowCount(len(missing_data))
         for rowind, value in enumerate(missing_data):
@@ -1675,6 +1831,9 @@ class CheckImportsWindow(Ui_check_imports, QWidget):
             # missing_items特点，可知项目内没有可以打开的文件，直接中断
             if value[0] is None:
                 break
+            if value[1] is None:
+                # 文件无法读取或解码
+                value = value[0], ("- 无法读取 -",), ()
             item0 = QTableWidgetItem(os.path.basename(value[0]))
             item1 = QTableWidgetItem("，".join(value[1]))
             item2 = QTableWidgetItem("，".join(value[2]))
@@ -1705,7 +1864,6 @@ class DownloadPackageWindow(Ui_download_package, QWidget, AskFilePath):
         self.environments = None
         self.connect_signals_slots()
         self.last_path = None
-        self.repo = ThreadRepo(500)
 
     def connect_signals_slots(self):
         self.cb_use_index_url.clicked.connect(self.change_le_index_url)
@@ -1742,7 +1900,7 @@ class DownloadPackageWindow(Ui_download_package, QWidget, AskFilePath):
             self.le_save_to.setText(dir_path)
 
     def closeEvent(self, event):
-        if self.repo.is_empty():
+        if task_executor.is_idle(self):
             self.store_config()
             save_conf(self.config, "dlpc")
         else:
@@ -1755,7 +1913,7 @@ class DownloadPackageWindow(Ui_download_package, QWidget, AskFilePath):
 
     def show(self):
         super().show()
-        if self.repo.is_empty():
+        if task_executor.is_idle(self):
             self.apply_config()
 
     def update_envpaths_and_combobox(self):
@@ -1895,15 +2053,20 @@ class DownloadPackageWindow(Ui_download_package, QWidget, AskFilePath):
         if not isinstance(config, dict):
             return
 
-        def do_download():
+        def do_download(token):
             saved_path = ""
             self.set_download_table.emit(pkg_names)
             for index, name in enumerate(pkg_names):
+                if token.cancelled:
+                    self.download_status.emit(index, "已取消")
+                    continue
                 self.download_status.emit(index, "下载中...")
                 try:
-                    status = env.download(name, **config)
+                    status = pip_download(env, name, token=token, **config)
                     if status[0]:
                         self.download_status.emit(index, "下载完成")
+                    elif token.cancelled:
+                        self.download_status.emit(index, "已取消")
                     else:
                         self.download_status.emit(index, "下载失败")
                 except Exception:
@@ -1913,13 +2076,13 @@ class DownloadPackageWindow(Ui_download_package, QWidget, AskFilePath):
                     saved_path = status[1]
             self.download_completed.emit(saved_path)
 
-        thread_download = NewTask(target=do_download)
+        token = CancelToken()
+        thread_download = NewTask(do_download, (token,), token)
         thread_download.at_start(lambda: self.pb_start_download.setEnabled(False))
         thread_download.at_finish(
             lambda: self.pb_start_download.setEnabled(True),
         )
-        thread_download.start()
-        self.repo.put(thread_download, 0)
+        task_executor.submit(thread_download, group=self)
 
     def check_download(self, dest):
         if not dest:
@@ -2127,8 +2290,11 @@ def main():
     global win_check_imp
     global win_dload_pkg
     global win_downloading
+    global task_executor
+    setup_pip_workers()
     app_awesomepykit = QApplication(sys.argv)
     app_awesomepykit.setWindowIcon(QIcon(os.path.join(resources_path, "icon.ico")))
+    task_executor = TaskExecutor()
     win_ins_pkg = InstallPackagesWindow()
     win_package_mgr = PackageManagerWindow()
     win_chenviron = ChooseEnvWindow()
@@ -2143,4 +2309,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的程序中，导入检查的进程池工作进程也由本程序启动，须先交给 multiprocessing 处理
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,110 @@
+# coding: utf-8
+
+__doc__ = """
+比较 libcip 中各导入模块查找方式(regex、stmt、ast、tokenize)的速度和准确度。
+用法：python benchmarks/bench_import_engines.py [源码目录] [-r 重复次数]
+默认使用运行本脚本的解释器的标准库目录作为语料。
+准确度以能被 ast 解析的文件的 ast 结果为准，统计结果完全一致的文件比例、
+漏掉的模块数及多出的模块数。
+"""
+
+import argparse
+import ast
+import os
+import sys
+import sysconfig
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library.libcip import (
+    ast_imports,
+    decode_source,
+    project_files,
+    regex_imports,
+    statement_imports,
+    tokenize_imports,
+)
+
+ENGINES = (
+    ("regex", regex_imports),
+    ("stmt", statement_imports),
+    ("ast", ast_imports),
+    ("tokenize", tokenize_imports),
+)
+
+
+def load_corpus(root):
+    """读取 root 目录中所有能解码的源码文件，返回 [(文件路径, 源码字符串), ...]。"""
+    corpus = list()
+    for file_path in project_files(root):
+        try:
+            with open(file_path, "rb") as sf:
+                data = sf.read()
+        except Exception:
+            continue
+        _, string, _ = decode_source(data)
+        if string is not None:
+            corpus.append((file_path, string.replace("\r\n", "\n").replace("\r", "\n")))
+    return corpus
+
+
+def parses(string):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            ast.parse(string)
+        return True
+    except Exception:
+        return False
+
+
+def bench(extractor, corpus, repeat):
+    best, results = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extractor(string) for _, string in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入模块查找方式性能、准确度对比")
+    parser.add_argument("root", nargs="?", default=sysconfig.get_paths()["stdlib"])
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+    corpus = load_corpus(args.root)
+    if not corpus:
+        print(f"目录中没有可读取的源码文件：{args.root}")
+        return 1
+    valid = [parses(string) for _, string in corpus]
+    size = sum(len(string) for _, string in corpus)
+    print(
+        f"语料：{args.root}，{len(corpus)} 个文件，{size / 1024 / 1024:.1f} MB 字符，"
+        f"其中 {len(corpus) - sum(valid)} 个文件无法被 ast 解析"
+    )
+    timings = dict()
+    for name, extractor in ENGINES:
+        timings[name] = bench(extractor, corpus, args.repeat)
+    truth = timings["ast"][1]
+    print(f"{'方式':<10}{'用时(秒)':>10}{'一致文件':>10}{'漏掉':>8}{'多出':>8}")
+    for name, _ in ENGINES:
+        elapsed, results = timings[name]
+        same = missed = extra = 0
+        for ok, expected, found in zip(valid, truth, results):
+            if not ok:
+                continue
+            same += expected == found
+            missed += len(expected - found)
+            extra += len(found - expected)
+        print(
+            f"{name:<10}{elapsed:>12.3f}{same / sum(valid):>12.1%}"
+            f"{missed:>10}{extra:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
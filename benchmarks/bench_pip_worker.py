@@ -0,0 +1,73 @@
+# coding: utf-8
+
+__doc__ = """
+比较连续执行 pip 命令时，每次启动子进程与使用常驻 pip 工作进程的总用时。
+用法：python benchmarks/bench_pip_worker.py [解释器路径] [-n 次数]
+默认使用运行本脚本的解释器，依次循环执行 pip list、pip show pip、pip freeze。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library.libpipw import PipWorkerPool
+from library.librun import pinned_env, run_process
+
+OPERATIONS = (
+    ("list", "--format=json"),
+    ("show", "pip"),
+    ("freeze",),
+)
+
+
+def bench_subprocess(interpreter, count):
+    results = list()
+    start = time.perf_counter()
+    for i in range(count):
+        args = OPERATIONS[i % len(OPERATIONS)]
+        result = run_process(
+            (interpreter, "-m", "pip") + args, env=pinned_env(interpreter)
+        )
+        results.append((result.returncode, result.output))
+    return time.perf_counter() - start, results
+
+
+def bench_worker(interpreter, count):
+    pool = PipWorkerPool(enabled=True)
+    results = list()
+    start = time.perf_counter()
+    for i in range(count):
+        args = OPERATIONS[i % len(OPERATIONS)]
+        results.append(pool.call(interpreter, args))
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pip 工作进程模式性能对比")
+    parser.add_argument("interpreter", nargs="?", default=sys.executable)
+    parser.add_argument("-n", "--count", type=int, default=50)
+    args = parser.parse_args()
+    sub_time, sub_results = bench_subprocess(args.interpreter, args.count)
+    wkr_time, wkr_results = bench_worker(args.interpreter, args.count)
+    if None in wkr_results:
+        print("pip 工作进程无法启动，请检查该环境是否安装了 pip。")
+        return 1
+    mismatched = sum(a[0] != b[0] for a, b in zip(sub_results, wkr_results))
+    print(f"解释器：{args.interpreter}，连续执行 {args.count} 次 pip 命令")
+    print(
+        f"每次启动子进程：{sub_time:.2f} 秒，平均 {sub_time / args.count * 1000:.0f} 毫秒"
+    )
+    print(
+        f"常驻工作进程：  {wkr_time:.2f} 秒，平均 {wkr_time / args.count * 1000:.0f} 毫秒"
+    )
+    print(f"加速比：{sub_time / wkr_time:.1f} 倍，返回码不一致的命令：{mismatched} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+__doc__ = """
+测量已安装包表格模型 PkgsTableModel 在大量行时载入、排序、筛选的用时。
+用法：python benchmarks/bench_pkgs_table.py [-n 行数] [-r 重复次数]
+模型连接到一个 QTableView(不显示)，用时包括视图处理模型信号的时间。
+每项操作取多次重复中的最长用时，排序、筛选的用时与一帧的时间(16 毫秒)比较，
+载入只在打开窗口、刷新时发生，只列出用时。
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QTableView
+
+from library.libqt import PkgsTableModel
+
+FRAME_MS = 16
+
+
+def make_pkgs_info(count, seed=0):
+    """生成 count 个包的 {包名: [当前版本, 最新版本, 状态]} 字典。"""
+    rand = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz-_"
+    pkgs_info = dict()
+    while len(pkgs_info) < count:
+        name = "".join(rand.choice(letters) for _ in range(rand.randint(4, 16)))
+        version = ".".join(str(rand.randint(0, 30)) for _ in range(3))
+        latest = rand.choice(("", version, version + ".post1", "99.0"))
+        pkgs_info[name.strip("-_") or name] = [version, latest, ""]
+    return pkgs_info
+
+
+def timed(func, repeat):
+    """重复执行 func，返回最长用时(毫秒)。"""
+    longest = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        longest = max(longest, (time.perf_counter() - start) * 1000)
+    return longest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="已安装包表格模型性能测试")
+    parser.add_argument("-n", "--count", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+    app = QApplication.instance() or QApplication([])
+    pkgs_info = make_pkgs_info(args.count)
+    model = PkgsTableModel()
+    view = QTableView()
+    view.setModel(model)
+    load_time = timed(lambda: model.load(pkgs_info), args.repeat)
+    results = list()
+    for col, header in enumerate(model.HEADERS[:3]):
+        orders = iter((Qt.AscendingOrder, Qt.DescendingOrder) * args.repeat)
+        results.append(
+            (
+                f"按{header}排序",
+                timed(lambda: model.sort(col, next(orders)), args.repeat),
+            )
+        )
+    for text in ("p", "py", "pyt", ""):
+        results.append(
+            (
+                f"筛选 {text!r}",
+                timed(lambda: model.set_filter(text), 1),
+            )
+        )
+    print(f"{args.count} 行，每项操作重复 {args.repeat} 次取最长用时")
+    print(f"{'载入':<12}{load_time:>8.2f} 毫秒")
+    slow = 0
+    for label, elapsed in results:
+        mark = "" if elapsed < FRAME_MS else "  超过一帧"
+        slow += bool(mark)
+        print(f"{label:<12}{elapsed:>8.2f} 毫秒{mark}")
+    del app
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
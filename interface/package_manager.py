@@ -2,7 +2,7 @@
 
 # Form implementation generated from reading ui file 'package_manager.ui'
 #
-# Created by: PyQt5 UI code generator 5.15.2
+# Created by: PyQt5 UI code generator 5.15.11
 #
 # WARNING: Any manual changes made to this file will be lost when pyuic5 is
 # run again.  Do not edit this file unless you know what you are doing.
@@ -57,10 +57,17 @@ class Ui_package_manager(object):
         self.horizontalLayout_4.addWidget(self.line)
         self.verticalLayout = QtWidgets.QVBoxLayout()
         self.verticalLayout.setObjectName("verticalLayout")
+        self.hlo_pkgs_filter = QtWidgets.QHBoxLayout()
+        self.hlo_pkgs_filter.setObjectName("hlo_pkgs_filter")
         self.lb_installed_pkgs_info = QtWidgets.QLabel(self.centralwidget)
         self.lb_installed_pkgs_info.setObjectName("lb_installed_pkgs_info")
-        self.verticalLayout.addWidget(self.lb_installed_pkgs_info)
-        self.tw_installed_info = QtWidgets.QTableWidget(self.centralwidget)
+        self.hlo_pkgs_filter.addWidget(self.lb_installed_pkgs_info)
+        self.le_filter_pkgs = QtWidgets.QLineEdit(self.centralwidget)
+        self.le_filter_pkgs.setClearButtonEnabled(True)
+        self.le_filter_pkgs.setObjectName("le_filter_pkgs")
+        self.hlo_pkgs_filter.addWidget(self.le_filter_pkgs)
+        self.verticalLayout.addLayout(self.hlo_pkgs_filter)
+        self.tv_installed_info = QtWidgets.QTableView(self.centralwidget)
         palette = QtGui.QPalette()
         brush = QtGui.QBrush(QtGui.QColor(0, 170, 255))
         brush.setStyle(QtCore.Qt.SolidPattern)
@@ -80,26 +87,16 @@ class Ui_package_manager(object):
         brush = QtGui.QBrush(QtGui.QColor(255, 255, 255))
         brush.setStyle(QtCore.Qt.SolidPattern)
         palette.setBrush(QtGui.QPalette.Disabled, QtGui.QPalette.HighlightedText, brush)
-        self.tw_installed_info.setPalette(palette)
-        self.tw_installed_info.setContextMenuPolicy(QtCore.Qt.NoContextMenu)
-        self.tw_installed_info.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
-        self.tw_installed_info.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
-        self.tw_installed_info.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
-        self.tw_installed_info.setCornerButtonEnabled(False)
-        self.tw_installed_info.setColumnCount(4)
-        self.tw_installed_info.setObjectName("tw_installed_info")
-        self.tw_installed_info.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tw_installed_info.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tw_installed_info.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tw_installed_info.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tw_installed_info.setHorizontalHeaderItem(3, item)
-        self.tw_installed_info.horizontalHeader().setHighlightSections(False)
-        self.tw_installed_info.verticalHeader().setHighlightSections(False)
-        self.verticalLayout.addWidget(self.tw_installed_info)
+        self.tv_installed_info.setPalette(palette)
+        self.tv_installed_info.setContextMenuPolicy(QtCore.Qt.NoContextMenu)
+        self.tv_installed_info.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tv_installed_info.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
+        self.tv_installed_info.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tv_installed_info.setCornerButtonEnabled(False)
+        self.tv_installed_info.setObjectName("tv_installed_info")
+        self.tv_installed_info.horizontalHeader().setHighlightSections(False)
+        self.tv_installed_info.verticalHeader().setHighlightSections(False)
+        self.verticalLayout.addWidget(self.tv_installed_info)
         self.glo_table_btns = QtWidgets.QGridLayout()
         self.glo_table_btns.setObjectName("glo_table_btns")
         self.btn_check_for_updates = QtWidgets.QPushButton(self.centralwidget)
@@ -171,14 +168,8 @@ class Ui_package_manager(object):
         self.btn_delselected.setText(_translate("package_manager", "删除选中项"))
         self.lb_installed_pkgs_info.setToolTip(_translate("package_manager", "选中的Python环境中已安装的包名、当前版本、最新版本、安装状态信息。"))
         self.lb_installed_pkgs_info.setText(_translate("package_manager", "已安装的包信息："))
-        item = self.tw_installed_info.horizontalHeaderItem(0)
-        item.setText(_translate("package_manager", "名称"))
-        item = self.tw_installed_info.horizontalHeaderItem(1)
-        item.setText(_translate("package_manager", "当前版本"))
-        item = self.tw_installed_info.horizontalHeaderItem(2)
-        item.setText(_translate("package_manager", "最新版本"))
-        item = self.tw_installed_info.horizontalHeaderItem(3)
-        item.setText(_translate("package_manager", "状态"))
+        self.le_filter_pkgs.setToolTip(_translate("package_manager", "输入包名或包名的一部分筛选表格中的包，包名以输入内容开头的排在前面。"))
+        self.le_filter_pkgs.setPlaceholderText(_translate("package_manager", "筛选包名..."))
         self.btn_check_for_updates.setToolTip(_translate("package_manager", "检查选中的Python环境中的所有模块的最新版本，有新版本则在\"最新版本\"列中显示版本号。"))
         self.btn_check_for_updates.setText(_translate("package_manager", "检查更新"))
         self.btn_install_package.setToolTip(_translate("package_manager", "将输入的包名安装到选中的Python环境中。\n"
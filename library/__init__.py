@@ -1,9 +1,17 @@
 # coding: utf-8
 
 from .libm import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    CancelToken,
+    EnvJobQueues,
     NewTask,
-    ThreadRepo,
+    PkgsInfoCache,
+    TaskExecutor,
     all_py_paths,
+    batch_install,
+    canonical_name,
     check_index_url,
     check_py_path,
     clean_index_urls,
@@ -13,24 +21,41 @@ from .libm import (
     conf_path_py_paths,
     conf_path_pyi_defs,
     cur_py_path,
+    dist_requires,
     get_cmd_o,
     get_cur_pyenv,
     get_index_url,
     get_pyenv_list,
+    installed_pkgs_info,
     load_conf,
     loop_install,
     loop_uninstall,
     multi_install,
     multi_uninstall,
+    pip_download,
+    query_memo,
+    query_outdated,
     resources_path,
     save_conf,
+    search_py_envs,
     set_index_url,
+    setup_pip_workers,
+    upgrade_waves,
+    wheelhouse_install,
 )
 
 __all__ = [
+    "PRIORITY_HIGH",
+    "PRIORITY_LOW",
+    "PRIORITY_NORMAL",
+    "CancelToken",
+    "EnvJobQueues",
     "NewTask",
-    "ThreadRepo",
+    "PkgsInfoCache",
+    "TaskExecutor",
     "all_py_paths",
+    "batch_install",
+    "canonical_name",
     "check_index_url",
     "check_py_path",
     "clean_index_urls",
@@ -40,16 +65,25 @@ __all__ = [
     "conf_path_py_paths",
     "conf_path_pyi_defs",
     "cur_py_path",
+    "dist_requires",
     "get_cmd_o",
     "get_cur_pyenv",
     "get_index_url",
     "get_pyenv_list",
+    "installed_pkgs_info",
     "load_conf",
     "loop_install",
     "loop_uninstall",
     "multi_install",
     "multi_uninstall",
+    "pip_download",
+    "query_memo",
+    "query_outdated",
     "resources_path",
     "save_conf",
+    "search_py_envs",
     "set_index_url",
+    "setup_pip_workers",
+    "upgrade_waves",
+    "wheelhouse_install",
 ]
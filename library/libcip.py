@@ -2,125 +2,517 @@
 
 __doc__ = "包含检查项目导入模块所需的类、函数等。"
 
+import ast
+import codecs
+import hashlib
+import io
+import json
+import multiprocessing
 import os
 import re
+import threading
+import tokenize
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 from chardet.universaldetector import UniversalDetector
 
-from .libm import PyEnv
+from .libm import PyEnv, conf_path_import_scan
+from .libtree import ProjectTree
 
+# 文件开头的 BOM 及其对应的编码，UTF-32 的 BOM 以 UTF-16 的 BOM 开头，需先检查
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# PEP 263 编码声明，只在前两行中查找
+_CODING_COOKIE = re.compile(rb"^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)")
+# 各种检测方式的使用次数
+_detection_counts = Counter()
+_counts_lock = threading.Lock()
 
-def file_encodings(project_root):
-    pattern = re.compile(r"^.+\.py[w]?$")
-    path_encoding_groups = []
-    for root, _, files in os.walk(project_root):
-        for name in files:
-            if not pattern.match(name):
-                continue
-            path_encoding_groups.append(os.path.join(root, name))
-    encoding_detector = UniversalDetector()
-    for index, file_path in enumerate(path_encoding_groups):
-        encoding_detector.reset()
+
+def _coding_cookie(data):
+    """返回 data 前两行中 PEP 263 编码声明的编码名，没有或编码名无效返回 None。"""
+    for line in data.split(b"\n", 2)[:2]:
+        matched = _CODING_COOKIE.match(line)
+        if matched:
+            try:
+                return codecs.lookup(matched.group(1).decode("ascii")).name
+            except Exception:
+                return None
+    return None
+
+
+def decode_source(data, detector=None):
+    """
+    检测源码文件内容 data(bytes) 的编码并解码，依次尝试：
+    BOM、PEP 263 编码声明、严格的 UTF-8 解码，都不成功时才使用 chardet 检测。
+    :return: tuple[str or None, str or None, str],
+    (编码, 解码得到的字符串, 检测方式)，检测方式为 bom、cookie、utf8、chardet 或 failed，
+    无法检测编码时编码为 None，解码失败时字符串为 None。
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            try:
+                return encoding, data.decode(encoding), "bom"
+            except Exception:
+                break
+    encoding = _coding_cookie(data)
+    if encoding is not None:
         try:
-            with open(file_path, "rb") as sf:
-                for line in sf:
-                    encoding_detector.feed(line)
-                    if encoding_detector.done:
-                        break
-            encoding_detector.close()
-            path_encoding_groups[index] = (
-                file_path,
-                encoding_detector.result["encoding"],
+            return encoding, data.decode(encoding), "cookie"
+        except Exception:
+            pass
+    try:
+        return "utf-8", data.decode("utf-8"), "utf8"
+    except UnicodeDecodeError:
+        pass
+    if detector is None:
+        detector = UniversalDetector()
+    detector.reset()
+    for line in data.splitlines(True):
+        detector.feed(line)
+        if detector.done:
+            break
+    detector.close()
+    encoding = detector.result["encoding"]
+    if encoding is None:
+        return None, None, "failed"
+    try:
+        return encoding, data.decode(encoding), "chardet"
+    except Exception:
+        return encoding, None, "failed"
+
+
+def count_detections(counts):
+    """累加 counts({检测方式: 次数}) 到检测方式使用次数中。"""
+    with _counts_lock:
+        _detection_counts.update(counts)
+
+
+def detection_stats():
+    """返回各检测方式的使用次数：{"bom": 次数, "cookie": 次数, "utf8": 次数, ...}。"""
+    with _counts_lock:
+        return {
+            k: _detection_counts[k]
+            for k in ("bom", "cookie", "utf8", "chardet", "failed")
+        }
+
+
+def detect_encoding(file_path, detector=None):
+    """检测文件编码，无法检测或读取失败返回 None。"""
+    try:
+        with open(file_path, "rb") as sf:
+            data = sf.read()
+    except Exception:
+        return None
+    encoding, _, how = decode_source(data, detector)
+    count_detections((how,))
+    return encoding
+
+
+def project_files(project_root, tree=None):
+    """
+    项目目录下所有的 .py、.pyw 文件路径。
+    :param tree: ProjectTree or None, 项目目录的文件索引，None 时新建。
+    """
+    if tree is None:
+        tree = ProjectTree(project_root)
+    return tree.files(re.compile(r"^.+\.py[w]?$"))
+
+
+def file_encodings(project_root, tree=None):
+    encoding_detector = UniversalDetector()
+    return [
+        (file_path, detect_encoding(file_path, encoding_detector))
+        for file_path in project_files(project_root, tree)
+    ]
+
+
+_MATCH_ALL = re.compile(r"^[^#\n]*?import [_0-9a-zA-Z .,;(]+$", re.M)
+
+
+def regex_imports(string):
+    """
+    用正则表达式查找string中需要导入的模块(顶层包名)。
+    processed_1为匹配到的导入语句，processed_2为按分号拆分后的导入语句。
+    """
+    final_res, processed_2, processed_1 = (
+        set(),
+        [],
+        _MATCH_ALL.findall(string),
+    )
+    for item in processed_1:
+        if ";" in item:
+            for string in item.split(";"):
+                if string:
+                    processed_2.append(string.strip())
+        else:
+            processed_2.append(item)
+    for item in processed_2:
+        if "from " in item:
+            matched = re.match(
+                r"^\s*from (?:([^.]+).*|\.([^.]+)) import",
+                item,
             )
+            if not matched:
+                continue
+            for group in matched.groups():
+                if group is None:
+                    continue
+                final_res.add(group)
+        else:
+            matched = re.match(r"\s*import (.+)", item)
+            if not matched:
+                continue
+            tmp_string = matched.group(1)
+            if " as " in tmp_string:
+                matched = re.match(r"([^.]+).* as", tmp_string)
+                if matched:
+                    final_res.add(matched.group(1))
+            elif "," in tmp_string:
+                string_list = tmp_string.split(",")
+                for string in string_list:
+                    string = string.strip()
+                    package_name = string.split(".")[0]
+                    if package_name:
+                        final_res.add(package_name)
+            else:
+                package_name = tmp_string.split(".")[0]
+                if package_name:
+                    final_res.add(package_name)
+    return final_res
+
+
+def _import_roots(nodes, final_res):
+    """把 nodes 中导入语句节点导入的顶层包名加入 final_res。"""
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            final_res.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            final_res.add(node.module.split(".")[0])
+
+
+def ast_imports(string):
+    """
+    用 ast 查找string中需要导入的模块(顶层包名)，包括函数体等处的导入语句及
+    带模块名的相对导入(取其第一级名称)，不包括字符串、注释中的内容。
+    string 无法解析(如 Python2 代码)时改用 tokenize_imports。
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tree = ast.parse(string)
+    except Exception:
+        return tokenize_imports(string)
+    final_res = set()
+    _import_roots(ast.walk(tree), final_res)
+    return final_res
+
+
+# 导入语句：import/from 开头，可以用反斜杠续行，from 语句的导入列表可以在括号中跨行
+_STATEMENT = r"[ \t]*((?:import|from)\b(?:[^\n\\(#;]|\\\n)*(?:\([^)]*\)[^\n;#]*)?)"
+# 跳过字符串、注释，匹配行首或分号、冒号后的导入语句。每个分支都以确定的字符开头，
+# 正则引擎可以直接跳到这些字符处尝试匹配
+_STATEMENTS = re.compile(
+    r'"""(?:\\.|[^\\])*?"""|'
+    r"'''(?:\\.|[^\\])*?'''|"
+    r'"(?:\\.|[^"\\\n])*"|'
+    r"'(?:\\.|[^'\\\n])*'|"
+    r"#[^\n]*|"
+    rf"\n{_STATEMENT}|;{_STATEMENT}|:{_STATEMENT}",
+    re.S,
+)
+
+
+def statement_imports(string):
+    """
+    查找string中需要导入的模块(顶层包名)，结果与 ast_imports 相同，但不解析整个文件：
+    先用一个正则表达式跳过字符串、注释找出各条导入语句，再只用 ast 解析这些语句。
+    单条语句无法解析时忽略该语句，因此也适用于语法不正确的文件。
+    """
+    final_res = set()
+    for matched in _STATEMENTS.finditer("\n" + string):
+        if not matched.lastindex:
+            continue
+        try:
+            tree = ast.parse(matched.group(matched.lastindex))
         except Exception:
-            path_encoding_groups[index] = file_path, None
-    return path_encoding_groups
+            continue
+        _import_roots(tree.body, final_res)
+    return final_res
+
+
+def tokenize_imports(string):
+    """
+    用 tokenize 逐个词法单元查找string中需要导入的模块(顶层包名)，
+    结果与 ast_imports 相同，用于语法不正确的文件，遇到词法错误时返回已找到的模块。
+    """
+    final_res = set()
+    # statement 为当前所在的导入语句类型："import"、"from" 或 None
+    statement, at_start, expect_name, skip_name = None, True, False, False
+    ends = (tokenize.NEWLINE, tokenize.ENDMARKER)
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(string).readline):
+            kind, value = token[0], token[1]
+            if kind in (tokenize.COMMENT, tokenize.NL):
+                continue
+            if statement is None:
+                if at_start and kind == tokenize.NAME and value in ("import", "from"):
+                    statement, expect_name, skip_name = value, True, False
+                    continue
+                at_start = kind in ends + (tokenize.INDENT, tokenize.DEDENT) or (
+                    kind == tokenize.OP and value in (";", ":")
+                )
+                continue
+            if kind in ends or (kind == tokenize.OP and value == ";"):
+                statement, at_start = None, True
+            elif kind != tokenize.NAME:
+                if statement == "import" and value == ",":
+                    expect_name = True
+            elif value == "import":
+                expect_name = False
+            elif value == "as":
+                skip_name = True
+            elif skip_name:
+                skip_name = False
+            elif expect_name:
+                final_res.add(value)
+                expect_name = False
+    except Exception:
+        pass
+    return final_res
+
+
+# 可选的导入模块查找方式
+IMPORT_EXTRACTORS = {
+    "stmt": statement_imports,
+    "ast": ast_imports,
+    "regex": regex_imports,
+}
+
+
+def cpu_count():
+    """当前进程可以使用的 CPU 数量。"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _scan_file(file_path, known, detector, counts, extractor):
+    """
+    检测文件编码并查找其中导入的模块，返回缓存条目：
+    [文件大小, 修改时间(纳秒), 内容 sha1, 编码, [导入的模块...] 或 None]，
+    无法检测编码时编码为 None，读取、解码失败时导入模块列表为 None；
+    文件无法读取返回 None。文件只读取一次，检测编码和解码都使用读取到的内容。
+    :param known: list or None, 该文件之前的缓存条目，内容未变时沿用其编码和导入模块。
+    :param counts: Counter, 累加所用的编码检测方式。
+    :param extractor: callable, IMPORT_EXTRACTORS 中的导入模块查找函数。
+    """
+    try:
+        stat = os.stat(file_path)
+        with open(file_path, "rb") as sf:
+            data = sf.read()
+    except Exception:
+        return None
+    digest = hashlib.sha1(data).hexdigest()
+    if known is not None and known[2] == digest:
+        return [stat.st_size, stat.st_mtime_ns, digest, known[3], known[4]]
+    encoding, string, how = decode_source(data, detector)
+    counts[how] += 1
+    names = None
+    if string is not None:
+        string = string.replace("\r\n", "\n").replace("\r", "\n")
+        names = sorted(extractor(string))
+    return [stat.st_size, stat.st_mtime_ns, digest, encoding, names]
+
+
+def _scan_files(items, engine="stmt"):
+    """
+    在进程池的工作进程中执行，items 为 [(文件路径, 之前的缓存条目或 None), ...]，
+    engine 为 IMPORT_EXTRACTORS 中的查找方式名称，
+    返回 (各文件的 _scan_file 结果列表, {编码检测方式: 次数})。
+    """
+    detector, counts = UniversalDetector(), Counter()
+    extractor = IMPORT_EXTRACTORS[engine]
+    results = [
+        _scan_file(file_path, known, detector, counts, extractor)
+        for file_path, known in items
+    ]
+    return results, counts
+
+
+class ImportScanCache:
+    """
+    保存在 config 目录中的项目导入模块查找结果缓存，每个项目目录保存为缓存目录中的
+    一个 json 文件，记录各文件的大小、修改时间、内容 sha1、编码及导入的模块。
+    大小、修改时间未变的文件直接使用缓存；改变但内容 sha1 相同的文件不再检测编码、
+    查找导入的模块。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _file_path(self, project_root):
+        key = os.path.normcase(os.path.abspath(project_root))
+        file_name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self.cache_dir, file_name)
+
+    def load(self, project_root, engine):
+        """
+        返回 project_root 项目的缓存 {相对路径: 缓存条目}，
+        没有缓存或缓存不是用 engine 查找方式得到的返回空字典。
+        """
+        try:
+            with self._lock, open(
+                self._file_path(project_root), "rt", encoding="utf-8"
+            ) as fo:
+                data = json.load(fo)
+        except Exception:
+            return dict()
+        if data.get("engine", "regex") != engine:
+            return dict()
+        return data.get("files", {})
+
+    def save(self, project_root, files, engine):
+        """保存 project_root 项目的缓存，files 为 {相对路径: 缓存条目}。"""
+        data = {
+            "root": os.path.abspath(project_root),
+            "engine": engine,
+            "files": files,
+        }
+        try:
+            with self._lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(self._file_path(project_root), "wt", encoding="utf-8") as fo:
+                    json.dump(data, fo, ensure_ascii=False)
+        except Exception:
+            pass
+
+
+import_scan_cache = ImportScanCache(conf_path_import_scan)
 
 
 class ImportInspector:
-    match_all = re.compile(r"^[^#\n]*?import [_0-9a-zA-Z .,;(]+$", re.M)
+    match_all = _MATCH_ALL
+    # 文件数量不少于此数时才使用进程池并行查找
+    PARALLEL_MIN_FILES = 64
+    # 每次交给工作进程的文件数量
+    CHUNK_SIZE = 32
 
-    def __init__(self, python_dir, project_root):
+    def __init__(self, python_dir, project_root, use_cache=True, engine="stmt"):
+        """
+        :param use_cache: bool, 是否使用 import_scan_cache 缓存各文件导入的模块，
+        再次检查时只读取新增或改变的文件。
+        :param engine: str, IMPORT_EXTRACTORS 中的导入模块查找方式，
+        "stmt"(默认，只解析导入语句)、"ast"(解析整个文件，无法解析的用 tokenize)
+        或 "regex"(旧的正则表达式方式)。
+        """
         self._root = project_root
-        self._imports = PyEnv(python_dir).imports()
-        self._imports.extend(self.project_imports())
+        self._use_cache = use_cache
+        self.engine = engine
+        # 项目目录的文件索引，查找项目中的模块和需要检查的文件共用
+        self._tree = ProjectTree(project_root)
+        self._imports = set(PyEnv(python_dir).imports())
+        self._imports.update(self.project_imports())
 
-    def missing_items(self):
+    def missing_items(self, workers=None):
         """
         返回给定Python环境中，给定目录内脚本导入但环境未安装的模块集合。
-        返回值类型：(文件路径, {文件中导入的模块}, {环境中未安装的模块})。
+        返回值类型：(文件路径, {文件中导入的模块}, {环境中未安装的模块})，
+        文件无法读取或解码时后两项为 None。
+        :param workers: int or None, 进程池的工作进程数量，None 为可用 CPU 数量，
+        小于 2 或需要读取的文件数量少于 PARALLEL_MIN_FILES 时在当前线程中依次读取。
         """
-        groups = file_encodings(self._root)
-        if groups:
-            for _path, encoding in groups:
-                if encoding is None:
-                    continue
-                try:
-                    with open(_path, encoding=encoding) as sf:
-                        string = sf.read()
-                    imps, missing = self.missing_imports(string)
-                    yield _path, imps, missing
-                except Exception:
-                    yield _path, None, None
-        else:
+        if workers is None:
+            workers = cpu_count()
+        file_paths = project_files(self._root, self._tree)
+        if not file_paths:
             yield None, None, None
+            return
+        cached = (
+            import_scan_cache.load(self._root, self.engine) if self._use_cache else {}
+        )
+        entries, stale = dict(), list()
+        for _path in file_paths:
+            rel_path = os.path.relpath(_path, self._root)
+            known = cached.get(rel_path, None)
+            try:
+                stat = os.stat(_path)
+            except Exception:
+                continue
+            if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                entries[rel_path] = known
+            else:
+                stale.append((_path, known))
+        if stale:
+            for (_path, _), entry in zip(stale, self._scan(stale, workers)):
+                if entry is not None:
+                    entries[os.path.relpath(_path, self._root)] = entry
+        if self._use_cache and (stale or len(entries) != len(cached)):
+            import_scan_cache.save(self._root, entries, self.engine)
+        for _path in file_paths:
+            entry = entries.get(os.path.relpath(_path, self._root), None)
+            # 无法读取、无法检测编码或解码失败的文件
+            if entry is None or entry[4] is None:
+                yield _path, None, None
+            else:
+                imps = set(entry[4])
+                yield _path, imps, self.not_installed(imps)
+
+    def _scan(self, items, workers):
+        """
+        读取 items 中的文件，返回与 items 顺序相同的 _scan_file 结果列表。
+        文件较多时分块交给进程池的各工作进程读取。
+        """
+        if workers < 2 or len(items) < self.PARALLEL_MIN_FILES:
+            results, counts = _scan_files(items, self.engine)
+            count_detections(counts)
+            return results
+        chunks = [
+            items[i : i + self.CHUNK_SIZE]
+            for i in range(0, len(items), self.CHUNK_SIZE)
+        ]
+        # 本进程中有其他线程在运行，不能直接 fork，
+        # 用 forkserver(不支持时用 spawn)启动工作进程
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+        else:
+            context = multiprocessing.get_context("spawn")
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)), mp_context=context
+        ) as executor:
+            engines = [self.engine] * len(chunks)
+            for chunk_results, counts in executor.map(_scan_files, chunks, engines):
+                results.extend(chunk_results)
+                count_detections(counts)
+        return results
 
     def missing_imports(self, string):
         """
         查找环境中未安装但string中需要导入的模块。
-        pre3为最终处理后得到的string中所有导入的模块列表。
+        返回值类型：({string中导入的模块}, {环境中未安装的模块})。
         """
-        final_res, processed_2, processed_1 = (
-            set(),
-            [],
-            self.match_all.findall(string),
-        )
-        for item in processed_1:
-            if ";" in item:
-                for string in item.split(";"):
-                    if string:
-                        processed_2.append(string.strip())
-            else:
-                processed_2.append(item)
-        for item in processed_2:
-            if "from " in item:
-                matched = re.match(
-                    r"^\s*from (?:([^.]+).*|\.([^.]+)) import",
-                    item,
-                )
-                if not matched:
-                    continue
-                for group in matched.groups():
-                    if group is None:
-                        continue
-                    final_res.add(group)
-            else:
-                matched = re.match(r"\s*import (.+)", item)
-                if not matched:
-                    continue
-                tmp_string = matched.group(1)
-                if " as " in tmp_string:
-                    matched = re.match(r"([^.]+).* as", tmp_string)
-                    if matched:
-                        final_res.add(matched.group(1))
-                elif "," in tmp_string:
-                    string_list = tmp_string.split(",")
-                    for string in string_list:
-                        string = string.strip()
-                        package_name = string.split(".")[0]
-                        if package_name:
-                            final_res.add(package_name)
-                else:
-                    package_name = tmp_string.split(".")[0]
-                    if package_name:
-                        final_res.add(package_name)
-        return final_res, set(p for p in final_res if p not in self._imports)
+        final_res = IMPORT_EXTRACTORS[self.engine](string)
+        return final_res, self.not_installed(final_res)
+
+    def not_installed(self, imports):
+        """imports 中环境未安装、项目中也没有的模块。"""
+        return set(p for p in imports if p not in self._imports)
 
     def project_imports(self):
         """项目目录下可导入的包、模块。"""
         project_imports = set()
         m_pattern = re.compile(r"^([0-9a-zA-Z_]+).*(?<!_d)\.py[cdw]?$")
-        for root, _, files in os.walk(self._root):
+        for root, files in self._tree.walk():
             if "__init__.py" in files:
                 project_imports.add(os.path.basename(root))
             for file_name in files:
@@ -0,0 +1,205 @@
+# coding: utf-8
+
+__doc__ = """包含在Linux系统上查找Python解释器目录的类、函数。"""
+
+import os
+import re
+
+# Linux上Python解释器可执行文件名：python、python3、python3.10等
+PY_EXE_PATTERN = re.compile(r"^python(?:[23](?:\.\d+)?)?$")
+VENV_CFG = "pyvenv.cfg"
+CONDA_META = "conda-meta"
+# 搜索时不进入的目录名
+SKIP_DIRS = {
+    "__pycache__",
+    "dist-packages",
+    "include",
+    "lib",
+    "lib64",
+    "man",
+    "node_modules",
+    "share",
+    "site-packages",
+    "src",
+}
+# 以"."开头的隐藏目录中只进入这些目录
+HIDDEN_ALLOWED = {".venv", ".virtualenvs", ".env", ".conda"}
+
+
+def _expand(_path):
+    return os.path.normpath(os.path.expandvars(os.path.expanduser(_path)))
+
+
+def default_roots():
+    """
+    返回默认的搜索起点列表，列表元素为(目录路径, 搜索深度)元组。
+    深度为0表示只检查目录本身，不进入子目录。
+    """
+    roots = [(p, 0) for p in os.getenv("PATH", "").split(os.pathsep) if p]
+    roots.extend((("/usr/bin", 0), ("/usr/local", 2), ("/opt", 3)))
+    pyenv_root = os.getenv("PYENV_ROOT", "~/.pyenv")
+    roots.append((os.path.join(pyenv_root, "versions"), 3))
+    for conda in (
+        "~/anaconda3",
+        "~/miniconda3",
+        "~/miniforge3",
+        "~/mambaforge",
+        "~/.conda/envs",
+        "/opt/conda",
+    ):
+        roots.append((conda, 2))
+    for venvs in (
+        "~/.virtualenvs",
+        "~/.local/share/virtualenvs",
+        "~/.cache/pypoetry/virtualenvs",
+    ):
+        roots.append((venvs, 1))
+    return [(_expand(p), d) for p, d in roots]
+
+
+# 同一目录中有多个解释器时优先选用的文件名
+PREFERRED_NAMES = ("python3", "python")
+
+
+def find_interpreter(dir_path):
+    """
+    返回 dir_path 目录中的Python解释器路径，只调用一次 os.scandir。
+    dir_path 是venv或conda环境根目录时查找其中的bin目录，没有找到返回空字符串。
+    """
+    try:
+        with os.scandir(dir_path) as entries:
+            names = sorted(e.name for e in entries if _is_py_exe(e))
+    except Exception:
+        return ""
+    for name in PREFERRED_NAMES:
+        if name in names:
+            return os.path.join(dir_path, name)
+    if names:
+        return os.path.join(dir_path, names[0])
+    if os.path.isfile(os.path.join(dir_path, VENV_CFG)) or os.path.isdir(
+        os.path.join(dir_path, CONDA_META)
+    ):
+        return find_interpreter(os.path.join(dir_path, "bin"))
+    return ""
+
+
+def has_interpreter(dir_path):
+    """检查 dir_path 目录(或venv、conda环境根目录)中是否有Python解释器。"""
+    return bool(find_interpreter(dir_path))
+
+
+def _is_py_exe(entry):
+    if not PY_EXE_PATTERN.match(entry.name):
+        return False
+    try:
+        return entry.is_file() and os.access(entry.path, os.X_OK)
+    except Exception:
+        return False
+
+
+class PyFinder:
+    """
+    用 os.scandir 按深度限制搜索Python解释器目录。
+    cache 字典以目录路径为键，值为该目录上次列出时的记录：
+    {"m": 修改时间(纳秒), "py": 是否有解释器, "sub": [要进入的子目录名...]}。
+    再次搜索时只对修改时间改变的目录重新调用 os.scandir，其余目录只调用 os.stat。
+    """
+
+    def __init__(self, cache=None, roots=None, venv_roots=(), max_depth=4):
+        """
+        :param cache: dict or None, 上次搜索保存的缓存字典，会被原地更新。
+        :param roots: list or None, (目录路径, 搜索深度)元组列表，None则用默认值。
+        :param venv_roots: iterable[str], 额外搜索虚拟环境的目录，如用户主目录。
+        :param max_depth: int, 在 venv_roots 中搜索的深度。
+        """
+        self.cache = dict() if cache is None else cache
+        self.roots = default_roots() if roots is None else list(roots)
+        self.roots.extend((_expand(p), max_depth) for p in venv_roots)
+        self.changed = False
+        # 本次搜索调用 os.stat、os.scandir 的目录数量
+        self.stated = 0
+        self.listed = 0
+
+    def _record(self, dir_path):
+        """返回目录的记录，修改时间未变时直接使用缓存。"""
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except Exception:
+            if self.cache.pop(dir_path, None) is not None:
+                self.changed = True
+            return None
+        self.stated += 1
+        record = self.cache.get(dir_path, None)
+        if record is not None and record["m"] == mtime:
+            return record
+        self.listed += 1
+        has_py, names, subdirs = False, set(), []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+                    if not has_py and _is_py_exe(entry):
+                        has_py = True
+                    elif self._should_enter(entry):
+                        subdirs.append(entry.name)
+        except Exception:
+            return None
+        # venv、conda环境的根目录只进入bin、envs目录，不再深入其他子目录
+        if VENV_CFG in names:
+            subdirs = [d for d in subdirs if d == "bin"]
+        elif CONDA_META in names:
+            subdirs = [d for d in subdirs if d in ("bin", "envs")]
+        record = {"m": mtime, "py": has_py, "sub": sorted(subdirs)}
+        self.cache[dir_path] = record
+        self.changed = True
+        return record
+
+    @staticmethod
+    def _should_enter(entry):
+        name = entry.name
+        if name in SKIP_DIRS:
+            return False
+        if name.startswith(".") and name not in HIDDEN_ALLOWED:
+            return False
+        try:
+            return entry.is_dir(follow_symlinks=False)
+        except Exception:
+            return False
+
+    def _walk(self, dir_path, depth, found, visited):
+        # 同一目录可能从不同起点以不同深度到达，以更深的搜索为准
+        if visited.get(dir_path, -1) >= depth:
+            return
+        visited[dir_path] = depth
+        record = self._record(dir_path)
+        if record is None:
+            return
+        if record["py"]:
+            found.append(dir_path)
+        for name in record["sub"]:
+            # bin、envs目录是环境根目录的组成部分，深度用尽也要检查
+            if depth > 0 or name in ("bin", "envs"):
+                self._walk(
+                    os.path.join(dir_path, name), max(depth - 1, 0), found, visited
+                )
+
+    def find(self):
+        """
+        搜索所有起点，返回有Python解释器的目录列表(按真实路径去重)。
+        """
+        found, visited = list(), dict()
+        for root, depth in self.roots:
+            self._walk(root, depth, found, visited)
+        results, real_paths = list(), set()
+        for dir_path in found:
+            real_path = os.path.realpath(dir_path)
+            # pyenv的shims目录中是转发用的脚本而不是解释器
+            if real_path in real_paths or os.path.basename(real_path) == "shims":
+                continue
+            real_paths.add(real_path)
+            results.append(dir_path)
+        # 清理已不存在的目录的缓存
+        for dir_path in [d for d in self.cache if d not in visited]:
+            del self.cache[dir_path]
+            self.changed = True
+        return results
@@ -0,0 +1,582 @@
+# coding: utf-8
+
+__doc__ = """包含访问pip镜像源(simple index)、比较版本号相关的类、函数。"""
+
+import gzip
+import html
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import HTTPConnection, HTTPSConnection
+from queue import Empty, LifoQueue
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+DEFAULT_INDEX = "https://pypi.org/simple"
+ACCEPT_SIMPLE = (
+    "application/vnd.pypi.simple.v1+json, "
+    "application/vnd.pypi.simple.v1+html;q=0.1, text/html;q=0.01"
+)
+SDIST_EXTS = (".tar.gz", ".zip", ".tar.bz2", ".tgz", ".tar.xz", ".tar")
+
+_VERSION_PATTERN = re.compile(
+    r"""
+    ^\s*v?
+    (?:(?P<epoch>\d+)!)?
+    (?P<release>\d+(?:\.\d+)*)
+    (?:[-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)[-_.]?(?P<pre_n>\d+)?)?
+    (?:-(?P<post_n1>\d+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>\d+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>\d+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    re.X | re.I,
+)
+_PRE_RANKS = {"a": 0, "alpha": 0, "b": 1, "beta": 1}
+
+
+def canonical_name(name):
+    """按 PEP 503 规则规范化包名，用于比较、去重。"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def version_key(version):
+    """
+    返回按 PEP 440 规则比较版本号大小用的键，可直接用于 sorted、max 等。
+    无法解析的版本号(旧式版本号)小于所有合法版本号，它们之间按字符串比较。
+    """
+    matched = _VERSION_PATTERN.match(version)
+    if not matched:
+        return (-1, version)
+    release = [int(x) for x in matched.group("release").split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    pre_l, post_l = matched.group("pre_l"), matched.group("post_l")
+    post_n = matched.group("post_n1") or matched.group("post_n2")
+    dev = matched.group("dev_l")
+    if pre_l:
+        pre = (_PRE_RANKS.get(pre_l.lower(), 2), int(matched.group("pre_n") or 0))
+    elif dev and not (post_n or post_l):
+        # 只有 dev 段的版本小于同版本的所有预发布版本
+        pre = (-1, 0)
+    else:
+        pre = (3, 0)
+    post = int(post_n or 0) if (post_n or post_l) else -1
+    dev = (0, int(matched.group("dev_n") or 0)) if dev else (1, 0)
+    local = matched.group("local")
+    if local:
+        local = (
+            1,
+            tuple(
+                (1, int(p)) if p.isdigit() else (0, p.lower())
+                for p in re.split(r"[-_.]", local)
+            ),
+        )
+    else:
+        local = (0, ())
+    return (0, int(matched.group("epoch") or 0), tuple(release), pre, post, dev, local)
+
+
+def is_prerelease(version):
+    """版本号是否是预发布版本或开发版本。"""
+    matched = _VERSION_PATTERN.match(version)
+    if not matched:
+        return False
+    return bool(matched.group("pre_l") or matched.group("dev_l"))
+
+
+def python_matches(requires_python, py_version):
+    """
+    检查 Python 版本 py_version 是否满足 Requires-Python 条件 requires_python。
+    条件为空、Python 版本未知或条件无法解析时视为满足。
+    """
+    if not (requires_python and py_version):
+        return True
+    py_key = version_key(py_version)
+    py_release = py_key[2] if py_key[0] == 0 else ()
+    for clause in requires_python.split(","):
+        clause = clause.strip()
+        if not clause:
+            continue
+        matched = re.match(r"^(~=|===|==|!=|<=|>=|<|>)\s*(\S+)$", clause)
+        if not matched:
+            continue
+        op, ver = matched.groups()
+        if ver.endswith(".*") and op in ("==", "!="):
+            try:
+                prefix = tuple(int(x) for x in ver[:-2].split("."))
+            except ValueError:
+                continue
+            same = (tuple(py_release) + (0,) * len(prefix))[: len(prefix)] == prefix
+            if same != (op == "=="):
+                return False
+            continue
+        key = version_key(ver)
+        if op == "~=":
+            # 前缀按 ver 中写出的发布段计算，不能用 version_key 中去掉末尾 0 的发布段
+            matched = _VERSION_PATTERN.match(ver)
+            if not matched:
+                continue
+            release = tuple(int(x) for x in matched.group("release").split("."))
+            if len(release) < 2:
+                continue
+            prefix = release[:-1]
+            same = (tuple(py_release) + (0,) * len(prefix))[: len(prefix)] == prefix
+            if not (same and py_key >= key):
+                return False
+        elif not {
+            "==": py_key == key,
+            "===": py_version == ver,
+            "!=": py_key != key,
+            "<=": py_key <= key,
+            ">=": py_key >= key,
+            "<": py_key < key,
+            ">": py_key > key,
+        }[op]:
+            return False
+    return True
+
+
+def file_version(filename):
+    """从 wheel 或源码包文件名中解析版本号，不是这两类文件返回 None。"""
+    if filename.endswith(".whl"):
+        parts = filename[:-4].split("-")
+        return parts[1] if len(parts) in (5, 6) else None
+    for ext in SDIST_EXTS:
+        if filename.endswith(ext):
+            _, sep, version = filename[: -len(ext)].rpartition("-")
+            return version if sep else None
+    return None
+
+
+def parse_project_json(text):
+    """解析 PEP 691 JSON 格式的项目页面，返回文件信息字典列表。"""
+    files = list()
+    for item in json.loads(text).get("files", []):
+        files.append(
+            {
+                "filename": item.get("filename", ""),
+                "url": item.get("url", ""),
+                "hashes": item.get("hashes", {}),
+                "requires_python": item.get("requires-python", None) or "",
+                "yanked": bool(item.get("yanked", False)),
+            }
+        )
+    return files
+
+
+_ANCHOR_PATTERN = re.compile(r"<a\s+([^>]*)>([^<]*)</a\s*>", re.I)
+_ATTR_PATTERN = re.compile(r"""([\w-]+)\s*(?:=\s*(?:"([^"]*)"|'([^']*)'|(\S+)))?""")
+
+
+def parse_project_html(text):
+    """解析 PEP 503 HTML 格式的项目页面，返回文件信息字典列表。"""
+    files = list()
+    for attrs_text, anchor_text in _ANCHOR_PATTERN.findall(text):
+        attrs = dict()
+        for name, v1, v2, v3 in _ATTR_PATTERN.findall(attrs_text):
+            attrs[name.lower()] = html.unescape(v1 or v2 or v3)
+        url = attrs.get("href", "")
+        url_path, _, fragment = url.partition("#")
+        filename = html.unescape(anchor_text).strip() or unquote(
+            url_path.rsplit("/", 1)[-1]
+        )
+        hashes = dict()
+        if "=" in fragment:
+            hash_name, _, hash_value = fragment.partition("=")
+            hashes[hash_name] = hash_value
+        files.append(
+            {
+                "filename": filename,
+                "url": url,
+                "hashes": hashes,
+                "requires_python": attrs.get("data-requires-python", ""),
+                "yanked": "data-yanked" in attrs,
+            }
+        )
+    return files
+
+
+def latest_version(files, py_version="", pre=False):
+    """
+    从项目页面的文件信息列表中选出最新版本号，跳过已撤回(yanked)的文件、
+    不满足 Requires-Python 的文件，pre 为 False 时跳过预发布版本。
+    没有可用版本返回 None。
+    """
+    best, best_key = None, None
+    for item in files:
+        if item["yanked"]:
+            continue
+        version = file_version(item["filename"])
+        if version is None:
+            continue
+        if not pre and is_prerelease(version):
+            continue
+        if not python_matches(item["requires_python"], py_version):
+            continue
+        key = version_key(version)
+        if best_key is None or key > best_key:
+            best, best_key = version, key
+    return best
+
+
+class IndexCache:
+    """
+    镜像源项目页面的磁盘缓存，以(镜像源地址, 项目名)为键，每个键保存为缓存目录中的
+    一个 json 文件，记录响应内容及 ETag、Last-Modified 响应头。
+    保存时间未超过 ttl 秒的缓存直接使用；超过后发送条件请求，服务器返回 304 时
+    继续使用缓存。缓存总大小超过 max_bytes 时按最近使用时间(文件修改时间)淘汰。
+    """
+
+    def __init__(self, cache_dir, ttl=600, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # {文件名: [文件大小, 最近使用时间]}，第一次使用时才列出缓存目录
+        self._files = None
+        self._total = 0
+        # 命中(未过期)、重新验证(304)、未命中、淘汰的次数
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _file_name(index_url, project):
+        key = "{}\n{}".format(index_url.rstrip("/"), canonical_name(project))
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+    def _load_files(self):
+        if self._files is not None:
+            return
+        self._files, self._total = dict(), 0
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    stat = entry.stat()
+                    self._files[entry.name] = [stat.st_size, stat.st_mtime]
+                    self._total += stat.st_size
+        except Exception:
+            pass
+
+    def get(self, index_url, project):
+        """返回缓存记录字典，没有缓存返回 None。"""
+        file_name = self._file_name(index_url, project)
+        with self._lock:
+            self._load_files()
+            if file_name not in self._files:
+                return None
+        try:
+            with open(
+                os.path.join(self.cache_dir, file_name), "rt", encoding="utf-8"
+            ) as fo:
+                return json.load(fo)
+        except Exception:
+            return None
+
+    def count(self, name):
+        """统计数加一，name 为 hits、revalidated 或 misses。"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def is_fresh(self, record):
+        return time.time() - record.get("stored", 0) < self.ttl
+
+    def put(self, index_url, project, record):
+        """保存缓存记录，record 中的 stored 字段设为当前时间。"""
+        file_name = self._file_name(index_url, project)
+        file_path = os.path.join(self.cache_dir, file_name)
+        record["stored"] = time.time()
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._load_files()
+            tmp_path = "{}.{}.tmp".format(file_path, threading.get_ident())
+            try:
+                with open(tmp_path, "wb") as fo:
+                    fo.write(data)
+                os.replace(tmp_path, file_path)
+            except Exception:
+                return
+            old_size = self._files.get(file_name, [0])[0]
+            self._files[file_name] = [len(data), time.time()]
+            self._total += len(data) - old_size
+            self._evict()
+
+    def touch(self, index_url, project):
+        """更新缓存的最近使用时间。"""
+        file_name = self._file_name(index_url, project)
+        with self._lock:
+            if self._files is None or file_name not in self._files:
+                return
+            try:
+                os.utime(os.path.join(self.cache_dir, file_name))
+            except Exception:
+                pass
+            self._files[file_name][1] = time.time()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for file_name, (size, _) in sorted(self._files.items(), key=lambda x: x[1][1]):
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except Exception:
+                pass
+            del self._files[file_name]
+            self._total -= size
+            self.evicted += 1
+            if self._total <= self.max_bytes:
+                break
+
+    def stats(self):
+        """返回缓存统计信息字典。"""
+        with self._lock:
+            self._load_files()
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "evicted": self.evicted,
+                "entries": len(self._files),
+                "bytes": self._total,
+            }
+
+
+class IndexClient:
+    """
+    访问 simple 镜像源的 HTTP 客户端。
+    按(协议, 主机)保存保持连接(keep-alive)的连接池，多个线程共用同一个客户端时
+    复用已建立的连接，连接池大小即同一主机的最大并发连接数。
+    """
+
+    def __init__(self, max_connections=8, timeout=15, cache=None):
+        """
+        :param max_connections: int, 每个主机连接池的大小。
+        :param timeout: int or float, 连接、读取超时秒数。
+        :param cache: IndexCache or None, 项目页面缓存，None 则不使用缓存。
+        """
+        self.cache = cache
+        self._max = max_connections
+        self._timeout = timeout
+        self._pools = dict()
+        self._lock = threading.Lock()
+        self._proxies = getproxies()
+
+    def _pool(self, key):
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = LifoQueue(self._max)
+            return self._pools[key]
+
+    def _new_conn(self, scheme, netloc):
+        host = netloc.rpartition("@")[2]
+        proxy = None if proxy_bypass(host) else self._proxies.get(scheme, None)
+        if proxy:
+            proxy_netloc = urlsplit(proxy).netloc or proxy
+            if scheme == "https":
+                conn = HTTPSConnection(proxy_netloc, timeout=self._timeout)
+                conn.set_tunnel(host)
+                return conn, False
+            return HTTPConnection(proxy_netloc, timeout=self._timeout), True
+        if scheme == "https":
+            return HTTPSConnection(host, timeout=self._timeout), False
+        return HTTPConnection(host, timeout=self._timeout), False
+
+    def _acquire(self, scheme, netloc):
+        try:
+            return self._pool((scheme, netloc)).get_nowait()
+        except Empty:
+            return self._new_conn(scheme, netloc)
+
+    def _release(self, scheme, netloc, conn_info):
+        try:
+            self._pool((scheme, netloc)).put_nowait(conn_info)
+        except Exception:
+            conn_info[0].close()
+
+    def request(self, url, headers=None, redirects=5):
+        """
+        以 GET 方法请求 url，自动跟随重定向、解压 gzip 响应体。
+        :return: tuple[int, dict, bytes, str], (状态码, 小写键名的响应头, 响应体, 最终地址)。
+        网络错误时抛出 OSError 或 http.client.HTTPException。
+        """
+        headers = dict(headers or {})
+        headers.setdefault("Accept-Encoding", "gzip")
+        headers.setdefault("User-Agent", "AwesomePyKit")
+        for _ in range(redirects + 1):
+            parts = urlsplit(url)
+            scheme, netloc = parts.scheme.lower(), parts.netloc
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            req_headers = dict(headers)
+            userinfo = netloc.rpartition("@")[0]
+            if userinfo:
+                token = b64encode(unquote(userinfo).encode("utf-8")).decode("ascii")
+                req_headers["Authorization"] = "Basic " + token
+            # 连接可能已被服务器关闭，换新连接重试一次
+            for attempt in range(2):
+                conn_info = self._acquire(scheme, netloc)
+                conn, absolute = conn_info
+                try:
+                    conn.request(
+                        "GET",
+                        url.split("#")[0] if absolute else target,
+                        None,
+                        req_headers,
+                    )
+                    resp = conn.getresponse()
+                    body = resp.read()
+                    break
+                except Exception:
+                    conn.close()
+                    if attempt:
+                        raise
+            resp_headers = {k.lower(): v for k, v in resp.getheaders()}
+            if resp_headers.get("connection", "").lower() == "close":
+                conn.close()
+            else:
+                self._release(scheme, netloc, conn_info)
+            if resp.status in (301, 302, 303, 307, 308) and "location" in resp_headers:
+                url = urljoin(url, resp_headers["location"])
+                continue
+            if resp_headers.get("content-encoding", "") == "gzip":
+                body = gzip.decompress(body)
+            return resp.status, resp_headers, body, url
+        raise OSError("重定向次数过多：{}".format(url))
+
+    def project_files(self, index_url, project):
+        """
+        获取镜像源中项目 project 的文件信息列表，项目不存在返回 None。
+        设置了缓存时优先使用未过期的缓存，过期缓存用条件请求重新验证。
+        """
+        url = "{}/{}/".format(index_url.rstrip("/"), canonical_name(project))
+        headers = {"Accept": ACCEPT_SIMPLE}
+        record = None
+        if self.cache is not None:
+            record = self.cache.get(index_url, project)
+            if record is not None and self.cache.is_fresh(record):
+                self.cache.count("hits")
+                self.cache.touch(index_url, project)
+                return self.parse_page(
+                    record["content_type"], record["text"], record["url"]
+                )
+            if record is not None:
+                if record.get("etag", ""):
+                    headers["If-None-Match"] = record["etag"]
+                if record.get("last_modified", ""):
+                    headers["If-Modified-Since"] = record["last_modified"]
+        status, resp_headers, body, url = self.request(url, headers)
+        if status == 304 and record is not None:
+            self.cache.count("revalidated")
+            self.cache.put(index_url, project, record)
+            return self.parse_page(
+                record["content_type"], record["text"], record["url"]
+            )
+        if self.cache is not None:
+            self.cache.count("misses")
+        if status == 404:
+            return None
+        if status != 200:
+            raise OSError("HTTP {}：{}".format(status, url))
+        content_type = resp_headers.get("content-type", "")
+        charset = re.search(r"charset=([\w-]+)", content_type)
+        text = body.decode(charset.group(1) if charset else "utf-8", "replace")
+        if self.cache is not None:
+            self.cache.put(
+                index_url,
+                project,
+                {
+                    "url": url,
+                    "content_type": content_type,
+                    "etag": resp_headers.get("etag", ""),
+                    "last_modified": resp_headers.get("last-modified", ""),
+                    "text": text,
+                },
+            )
+        return self.parse_page(content_type, text, url)
+
+    @staticmethod
+    def parse_page(content_type, text, url):
+        """按响应类型解析项目页面，文件地址转换为绝对地址。"""
+        if "json" in content_type:
+            files = parse_project_json(text)
+        else:
+            files = parse_project_html(text)
+        for item in files:
+            item["url"] = urljoin(url, item["url"])
+        return files
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, dict()
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait()[0].close()
+                except Empty:
+                    break
+
+
+def check_outdated(
+    pkgs_info,
+    index_url="",
+    py_version="",
+    *,
+    pre=False,
+    max_workers=8,
+    client=None,
+    cache=None,
+):
+    """
+    并发查询镜像源，检查 pkgs_info 中的包是否有新版本，代替 pip list --outdated。
+    :param pkgs_info: iterable[tuple[str, str]], (包名, 已安装版本)元组。
+    :param index_url: str, simple 镜像源地址，为空则使用 PyPI。
+    :param py_version: str, 目标环境的 Python 版本，用于排除不兼容的版本。
+    :param pre: bool, 是否包括预发布版本。
+    :param max_workers: int, 最大并发请求数。
+    :param client: IndexClient or None, 共用的客户端，None 则新建并在结束后关闭。
+    :param cache: IndexCache or None, 新建客户端时使用的项目页面缓存。
+    :return: generator, 按查询完成的先后产出有新版本的包的(包名, 已安装版本, 最新版本)。
+    """
+    index_url = index_url or DEFAULT_INDEX
+    own_client = client is None
+    if own_client:
+        client = IndexClient(max_workers, cache=cache)
+
+    def query(name, installed):
+        try:
+            files = client.project_files(index_url, name)
+        except Exception:
+            return None
+        if not files:
+            return None
+        latest = latest_version(files, py_version, pre or is_prerelease(installed))
+        if latest is None or version_key(latest) <= version_key(installed):
+            return None
+        return name, installed, latest
+
+    executor, futures = ThreadPoolExecutor(max_workers=max_workers), list()
+    try:
+        futures.extend(executor.submit(query, n, v) for n, v in pkgs_info)
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                yield result
+    finally:
+        # 使用者提前关闭生成器(如任务被取消)时取消排队中的请求，不等待它们完成，
+        # 效果同 Python 3.9 的 shutdown(cancel_futures=True)
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+        if own_client:
+            client.close()
@@ -2,24 +2,34 @@
 
 __doc__ = """包含AwesomePyKit的主要类、函数、配置文件路径等。"""
 
+import heapq
+import itertools
 import json
 import os
 import re
-from subprocess import (
-    PIPE,
-    STARTF_USESHOWWINDOW,
-    STARTUPINFO,
-    SW_HIDE,
-    Popen,
-)
+import threading
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from fastpip import PyEnv, all_py_paths, cur_py_path, index_urls
+from fastpip import PyEnv as _PyEnv
+from fastpip import cur_py_path, index_urls
+from fastpip import all_py_paths as _all_py_paths
 from fastpip.errors import *
-from PyQt5.QtCore import QMutex, QThread, QTimer
+from PyQt5.QtCore import QMutex, QObject, pyqtSignal
 
-_STARTUP = STARTUPINFO()
-_STARTUP.dwFlags = STARTF_USESHOWWINDOW
-_STARTUP.wShowWindow = SW_HIDE
+from .libfind import PyFinder, find_interpreter, has_interpreter
+from .libidx import (
+    DEFAULT_INDEX,
+    IndexCache,
+    IndexClient,
+    canonical_name,
+    check_outdated,
+    latest_version,
+)
+from .libpipw import pip_workers
+from .librun import CancelToken, run_process
+from .libwhl import Wheelhouse, file_project, run_pip
 
 _root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 conf_path = os.path.join(_root_path, "config")
@@ -29,6 +39,13 @@ conf_path_index_urls = os.path.join(conf_path, "IndexURLs.json")
 conf_path_pyi_defs = os.path.join(conf_path, "PyiDefault.json")
 conf_path_install_package = os.path.join(conf_path, "InstallPackage.json")
 conf_path_dload_package = os.path.join(conf_path, "DloadPackage.json")
+conf_path_pkgs_cache = os.path.join(conf_path, "PkgsInfoCache.json")
+conf_path_py_finder = os.path.join(conf_path, "PyFinder.json")
+conf_path_fingerprints = os.path.join(conf_path, "PyFingerprints.json")
+conf_path_index_cache = os.path.join(conf_path, "IndexCache")
+conf_path_wheelhouse = os.path.join(conf_path, "Wheelhouse")
+conf_path_pip_worker = os.path.join(conf_path, "PipWorker.json")
+conf_path_import_scan = os.path.join(conf_path, "ImportScanCache")
 
 
 def _load_json(path, get_data):
@@ -79,6 +96,18 @@ def load_conf(conf="all"):
     # 保存模块下载界面设置的字典
     if conf == "dlpc":
         return _load_json(conf_path_dload_package, dict)
+    # 各 Python 环境已安装包信息的缓存字典
+    if conf == "pkgc":
+        return _load_json(conf_path_pkgs_cache, dict)
+    # Linux 上查找 Python 目录的设置及目录缓存字典
+    if conf == "pfnd":
+        return _load_json(conf_path_py_finder, dict)
+    # 以解释器指纹为键的解释器信息缓存字典
+    if conf == "fgpt":
+        return _load_json(conf_path_fingerprints, dict)
+    # pip 工作进程模式的设置字典
+    if conf == "pipw":
+        return _load_json(conf_path_pip_worker, dict)
     return (
         _load_json(conf_path_py_paths, list),
         _load_json(conf_path_index_urls, index_urls.copy),
@@ -99,12 +128,240 @@ def save_conf(sequence, conf):
         pth = conf_path_install_package
     elif conf == "dlpc":
         pth = conf_path_dload_package
+    elif conf == "pkgc":
+        pth = conf_path_pkgs_cache
+    elif conf == "pfnd":
+        pth = conf_path_py_finder
+    elif conf == "fgpt":
+        pth = conf_path_fingerprints
+    elif conf == "pipw":
+        pth = conf_path_pip_worker
     else:
         return
     with open(pth, "wt", encoding="utf-8") as fo:
         json.dump(sequence, fo, indent=4, ensure_ascii=False)
 
 
+# 在目标解释器中运行，收集解释器信息的代码，需兼容 Python2
+_PY_FACTS_CODE = r"""
+import json, os, platform, site, sys, sysconfig
+stdlib = getattr(sys, "stdlib_module_names", None)
+if stdlib is None:
+    stdlib = set(sys.builtin_module_names)
+    paths = sysconfig.get_paths()
+    for d in (paths.get("stdlib"), os.path.join(paths.get("stdlib", ""), "lib-dynload")):
+        try:
+            names = os.listdir(d)
+        except Exception:
+            continue
+        for n in names:
+            if n == "site-packages" or n.startswith("_test"):
+                continue
+            stdlib.add(n.split(".")[0])
+impl = platform.python_implementation()
+ver = sys.version_info
+usersite = site.getusersitepackages() if site.ENABLE_USER_SITE else None
+print(json.dumps({
+    "version": platform.python_version(),
+    "implementation": impl,
+    "bits": 64 if sys.maxsize > 2 ** 32 else 32,
+    "tags": [
+        ("cp" if impl == "CPython" else "pp") + "%d%d" % (ver[0], ver[1]),
+        sysconfig.get_config_var("SOABI") or "",
+        sysconfig.get_platform().replace("-", "_").replace(".", "_"),
+    ],
+    "sys_path": [p for p in sys.path[1:] if p],
+    "site_packages": getattr(site, "getsitepackages", list)() + (
+        [usersite] if usersite else []
+    ),
+    "stdlib": sorted(stdlib),
+}))
+"""
+
+
+def _fingerprint(file_path):
+    """解释器可执行文件的指纹：[inode, 大小, 修改时间(纳秒)]，文件不存在返回 None。"""
+    try:
+        stat = os.stat(file_path)
+    except Exception:
+        return None
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+class PyFingerprints:
+    """
+    保存在 config 目录中的解释器信息缓存，以解释器路径及其指纹为键。
+    缓存的信息包括版本、实现、平台标签、sys.path、site-packages 目录、标准库模块名，
+    解释器文件未改变时读取这些信息不需要启动解释器。
+    """
+
+    def __init__(self):
+        # {解释器路径: {"fp": 指纹, "facts": {...}}}
+        self._data = None
+        self._mutex = QMutex()
+
+    def facts(self, interpreter):
+        """
+        返回 interpreter 解释器的信息字典，缓存中没有或指纹不符时启动一次解释器获取。
+        获取失败返回空字典。
+        """
+        fingerprint = _fingerprint(interpreter) if interpreter else None
+        if fingerprint is None:
+            return dict()
+        self._mutex.lock()
+        try:
+            if self._data is None:
+                self._data = load_conf("fgpt")
+            cached = self._data.get(interpreter, None)
+            if cached is not None and cached["fp"] == fingerprint:
+                return cached["facts"]
+        finally:
+            self._mutex.unlock()
+        try:
+            facts = json.loads(get_cmd_o(interpreter, "-c", _PY_FACTS_CODE))
+        except Exception:
+            return dict()
+        self._mutex.lock()
+        try:
+            self._data[interpreter] = {"fp": fingerprint, "facts": facts}
+            save_conf(self._data, "fgpt")
+        except Exception:
+            pass
+        finally:
+            self._mutex.unlock()
+        return facts
+
+
+py_fingerprints = PyFingerprints()
+
+
+class PyEnv(_PyEnv):
+    """
+    在 fastpip.PyEnv 的基础上，从解释器指纹缓存中读取 Python 版本等信息，
+    解释器未改变时，获取版本信息、显示环境都不需要再启动解释器。
+    """
+
+    @property
+    def env_path(self):
+        if os.name == "nt":
+            return super().env_path
+        return self.path if has_interpreter(self.path) else ""
+
+    @property
+    def interpreter(self):
+        if os.name == "nt":
+            return super().interpreter
+        return find_interpreter(self.path)
+
+    def py_facts(self):
+        """返回该环境解释器的信息字典，获取失败返回空字典。"""
+        if not self.env_path:
+            return dict()
+        return py_fingerprints.facts(self.interpreter)
+
+    def py_info(self):
+        """获取当前环境Python版本信息。"""
+        facts = self.py_facts()
+        return "Python {} :: {} bit".format(
+            facts.get("version", "0.0.0"), facts.get("bits", "?")
+        )
+
+    def install(self, *names, pre=False, user=False, index_url="", upgrade=False):
+        """
+        用 pip 安装 names 中的包，返回值与 fastpip 的 PyEnv.install 相同。
+        非 Windows 系统上通过共享的子进程运行器运行 pip。
+        """
+        if os.name == "nt":
+            return super().install(
+                *names, pre=pre, user=user, index_url=index_url, upgrade=upgrade
+            )
+        args = ["install"]
+        if pre:
+            args.append("--pre")
+        if user:
+            args.append("--user")
+        if upgrade:
+            args.append("--upgrade")
+        if index_url:
+            args.extend(("--index-url", index_url))
+        code, _ = run_pip(self.interpreter, *args, *names)
+        return list(names), code == 0
+
+    def uninstall(self, *names):
+        """
+        用 pip 卸载 names 中的包，返回值与 fastpip 的 PyEnv.uninstall 相同。
+        非 Windows 系统上通过共享的子进程运行器运行 pip。
+        """
+        if os.name == "nt":
+            return super().uninstall(*names)
+        code, _ = run_pip(self.interpreter, "uninstall", "-y", *names)
+        return list(names), code == 0
+
+    def _pip_conf_files(self):
+        """该环境的 pip 会读取的配置文件路径。"""
+        home = os.path.expanduser("~")
+        xdg_home = os.environ.get("XDG_CONFIG_HOME", "") or os.path.join(
+            home, ".config"
+        )
+        xdg_dirs = os.environ.get("XDG_CONFIG_DIRS", "") or "/etc/xdg"
+        files = [os.path.join(d, "pip", "pip.conf") for d in xdg_dirs.split(":") if d]
+        files.extend(
+            (
+                "/etc/pip.conf",
+                os.path.join(home, ".pip", "pip.conf"),
+                os.path.join(xdg_home, "pip", "pip.conf"),
+                os.path.join(os.path.dirname(self.path), "pip.conf"),
+            )
+        )
+        if os.environ.get("PIP_CONFIG_FILE", ""):
+            files.append(os.environ["PIP_CONFIG_FILE"])
+        return files
+
+    def get_global_index(self):
+        """
+        返回该环境 pip 配置的全局镜像源地址，没有配置返回空字符串。
+        pip 的配置文件都未改变时直接返回上次查询的结果。
+        """
+        if os.name == "nt":
+            return super().get_global_index()
+        return get_cmd_o(
+            self.interpreter,
+            "-m",
+            "pip",
+            "config",
+            "get",
+            "global.index-url",
+            depends=self._pip_conf_files(),
+        )
+
+    def imports(self):
+        """
+        返回该环境中可用于 import 语句的名称列表，返回值与 fastpip 的 PyEnv.imports 相同。
+        sys.path 中的目录都未改变(未增删包、模块)时直接返回上次的结果。
+        """
+        sys_path = self.py_facts().get("sys_path", None)
+        if os.name == "nt" or not sys_path:
+            return super().imports()
+        return list(
+            query_memo.get(
+                ("imports", self.interpreter),
+                [self.interpreter] + sys_path,
+                lambda: tuple(super(PyEnv, self).imports()),
+            )
+        )
+
+    def set_global_index(self, index_url):
+        """设置该环境 pip 的全局镜像源地址，返回是否设置成功。"""
+        if os.name == "nt":
+            return super().set_global_index(index_url)
+        if index_url:
+            args = ("config", "set", "global.index-url", index_url)
+        else:
+            args = ("config", "unset", "global.index-url")
+        code, _ = run_pip(self.interpreter, *args)
+        return code == 0
+
+
 def get_cur_pyenv():
     return PyEnv()
 
@@ -119,38 +376,176 @@ def get_pyenv_list(paths=None):
     return env_list
 
 
+def _dir_identity(dir_path):
+    """目录的身份标识：(规范化真实路径, (设备号, inode))，用于探测前去重。"""
+    real_path = os.path.normcase(os.path.realpath(dir_path))
+    try:
+        stat = os.stat(real_path)
+    except Exception:
+        return real_path, None
+    return real_path, (stat.st_dev, stat.st_ino)
+
+
+def _probe_pyenv(_path):
+    """实例化 PyEnv 并启动解释器获取其显示文本，无效的环境返回 None。"""
+    try:
+        env = PyEnv(_path)
+        if not env.env_path:
+            return None
+        return env, str(env)
+    except Exception:
+        return None
+
+
+def search_py_envs(paths, known=(), max_workers=None):
+    """
+    在有限数量的工作线程中并发探测 paths 中的 Python 目录。
+    探测之前先按真实路径、目录 inode 去除重复的目录以及 known 中已有的目录。
+    :param paths: iterable[str], 待探测的 Python 目录路径。
+    :param known: iterable[str], 已知的 Python 目录路径，这些目录不再探测。
+    :param max_workers: int or None, 最大工作线程数，None 则根据 CPU 数量确定。
+    :return: generator, 按探测完成的先后逐个产出 (PyEnv 实例, 显示文本) 元组。
+    """
+    if max_workers is None:
+        max_workers = min(16, (os.cpu_count() or 1) * 2)
+    seen_paths, seen_inodes = set(), set()
+    for _path in known:
+        real_path, inode = _dir_identity(_path)
+        seen_paths.add(real_path)
+        seen_inodes.add(inode)
+    candidates = list()
+    for _path in paths:
+        real_path, inode = _dir_identity(_path)
+        if real_path in seen_paths or (inode is not None and inode in seen_inodes):
+            continue
+        seen_paths.add(real_path)
+        seen_inodes.add(inode)
+        candidates.append(_path)
+    if not candidates:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_probe_pyenv, p) for p in candidates]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                yield result
+
+
 def loop_install(
-    pyenv, sequence, *, index_url="", pre=False, user=False, upgrade=False
+    pyenv,
+    sequence,
+    *,
+    index_url="",
+    pre=False,
+    user=False,
+    upgrade=False,
+    token=None,
 ):
-    """循环历遍包名列表 sequence 每一个包名 name，根据包名调用 pyenv.install 安装。"""
+    """
+    循环历遍包名列表 sequence 每一个包名 name，根据包名调用 pyenv.install 安装。
+    token 被取消后停止，只产出已完成安装的包。
+    """
     for name in sequence:
-        cmd_exec_result = pyenv.install(
-            name,
+        cmd_exec_result = wheelhouse_install(
+            pyenv,
+            (name,),
             pre=pre,
             user=user,
             index_url=index_url,
             upgrade=upgrade,
+            token=token,
         )
+        if token is not None and token.cancelled:
+            return
         yield cmd_exec_result[0][0], cmd_exec_result[1]
 
 
-def loop_uninstall(pyenv, sequence):
-    """循环历遍包名列表 sequence 每一个包名 name，根据包名调用 pyenv.uninstall 卸载。"""
+def batch_install(
+    pyenv,
+    sequence,
+    *,
+    index_url="",
+    pre=False,
+    user=False,
+    upgrade=False,
+    token=None,
+):
+    """
+    用一次 pip 命令安装包名列表 sequence 中所有的包，安装失败时把列表对半分开
+    分别安装，直到找出安装失败的包名，其余的包仍会被安装。
+    只有少数包不可安装时，pip 运行次数远少于 loop_install 的逐个安装。
+    产出值与 loop_install 相同，为(包名, 是否安装成功)元组，按 sequence 的顺序产出。
+    token 被取消后停止，只产出已确定结果的包。
+    """
+    # 待安装的分段：[包名列表, 是否为左半段, 是否已知安装会失败]
+    pending = [[list(sequence), False, False]]
+    while pending:
+        names, is_left, known_failed = pending.pop(0)
+        if not names:
+            continue
+        if known_failed:
+            code = False
+        else:
+            _, code = wheelhouse_install(
+                pyenv,
+                names,
+                pre=pre,
+                user=user,
+                index_url=index_url,
+                upgrade=upgrade,
+                token=token,
+            )
+            # 被取消导致的失败不是包本身的问题，不再对半查找
+            if token is not None and token.cancelled:
+                return
+        if code:
+            # 左半段安装成功，则失败原因一定在紧随其后的右半段中，右半段不必再试
+            if is_left:
+                pending[0][2] = True
+            for name in names:
+                yield name, code
+        elif len(names) == 1:
+            yield names[0], code
+        else:
+            half = len(names) // 2
+            pending[:0] = [[names[:half], True, False], [names[half:], False, False]]
+
+
+def loop_uninstall(pyenv, sequence, *, token=None):
+    """
+    循环历遍包名列表 sequence 每一个包名 name，根据包名调用 pyenv.uninstall 卸载。
+    token 被取消后不再卸载剩余的包。
+    """
     for name in sequence:
+        if token is not None and token.cancelled:
+            return
         cmd_exec_result = pyenv.uninstall(name)
         yield cmd_exec_result[0][0], cmd_exec_result[1]
 
 
 def multi_install(
-    pyenv, sequence, *, index_url="", pre=False, user=False, upgrade=False
+    pyenv,
+    sequence,
+    *,
+    index_url="",
+    pre=False,
+    user=False,
+    upgrade=False,
+    token=None,
 ):
     """
     一次安装包名列表 sequence 中所有的包。
     注意：如果 sequence 中有一个包不可安装（没有匹配的包等原因），那sequence中所有的
     包都不会被安装，所以不是必须的情况下尽量不用这个函数来安装。
     """
-    return pyenv.install(
-        *sequence, pre=pre, user=user, index_url=index_url, upgrade=upgrade
+    return wheelhouse_install(
+        pyenv,
+        sequence,
+        pre=pre,
+        user=user,
+        index_url=index_url,
+        upgrade=upgrade,
+        token=token,
     )
 
 
@@ -162,6 +557,378 @@ def multi_uninstall(pyenv, sequence):
     return pyenv.uninstall(*sequence)
 
 
+# pip list 默认跳过的标准库同名分发包
+_SKIPPED_DISTS = {"python", "wsgiref", "argparse"}
+
+
+def site_packages_dirs(pyenv):
+    """
+    返回 pyenv 所指 Python 环境中存放已安装包元数据的目录列表。
+    目录列表即解释器指纹缓存中的 sys.path 里存在的目录，解释器未改变时不启动解释器。
+    :param pyenv: PyEnv, Python 环境实例。
+    :return: list[str], 按 sys.path 顺序排列的目录路径列表，获取失败返回空列表。
+    """
+    return [p for p in pyenv.py_facts().get("sys_path", []) if os.path.isdir(p)]
+
+
+def _read_metadata(meta_path):
+    """从 METADATA 或 PKG-INFO 文件头部读取 (包名, 版本) 元组，读取失败返回 None。"""
+    name = version = ""
+    try:
+        with open(meta_path, "rt", encoding="utf-8", errors="replace") as fo:
+            for line in fo:
+                if line in ("\n", "\r\n"):
+                    break
+                if line.startswith("Name:"):
+                    name = line[5:].strip()
+                elif line.startswith("Version:"):
+                    version = line[8:].strip()
+                if name and version:
+                    break
+    except Exception:
+        return None
+    if not (name and version):
+        return None
+    return name, version
+
+
+# 元数据条目名称：包名-版本[-py版本].dist-info 或 .egg-info
+_DIST_INFO_PATTERN = re.compile(r"^(.+?)-([^-]+?)(?:-py[\d.]+)?\.(dist|egg)-info$")
+
+
+def dist_info_entry(dir_path, entry_name):
+    """
+    解析 site-packages 目录中的一个 *.dist-info 或 *.egg-info 条目。
+    优先读取元数据文件，元数据文件缺失或不完整时从条目名称中解析。
+    :return: tuple[str, str] or None, (包名, 版本) 元组，不是元数据条目返回 None。
+    """
+    matched = _DIST_INFO_PATTERN.match(entry_name)
+    if not matched:
+        return None
+    entry_path = os.path.join(dir_path, entry_name)
+    if matched.group(3) == "dist":
+        meta_path = os.path.join(entry_path, "METADATA")
+    elif os.path.isdir(entry_path):
+        meta_path = os.path.join(entry_path, "PKG-INFO")
+    else:
+        meta_path = entry_path
+    return _read_metadata(meta_path) or matched.group(1, 2)
+
+
+def dir_dist_infos(dir_path, known=None):
+    """
+    返回 dir_path 目录中所有元数据条目的 {条目名: (包名, 版本)} 字典。
+    :param known: dict or None, 之前读取过的同一目录的结果，条目名未变的直接复用，
+    只解析新出现的条目(条目名包含版本号，条目名不变即可认为元数据未变)。
+    """
+    infos = dict()
+    try:
+        entries = os.listdir(dir_path)
+    except Exception:
+        return infos
+    if known is None:
+        known = dict()
+    for entry_name in entries:
+        if entry_name in known:
+            infos[entry_name] = tuple(known[entry_name])
+            continue
+        pkg_info = dist_info_entry(dir_path, entry_name)
+        if pkg_info is not None:
+            infos[entry_name] = pkg_info
+    return infos
+
+
+def merge_dist_infos(dir_infos):
+    """
+    合并多个 dir_dist_infos 的结果，返回 {规范化包名: (包名, 版本)} 字典。
+    多个目录中有同名包时，以靠前的目录中的为准(与导入顺序一致)。
+    """
+    found = dict()
+    for infos in dir_infos:
+        for pkg_info in infos.values():
+            key = canonical_name(pkg_info[0])
+            if key in _SKIPPED_DISTS or key in found:
+                continue
+            found[key] = pkg_info
+    return found
+
+
+def scan_dist_infos(dirs):
+    """
+    直接读取 dirs 中各目录的 *.dist-info、*.egg-info 元数据获取已安装的包。
+    :param dirs: list[str], site-packages 目录列表。
+    :return: list[tuple[str, str]], 按包名排序的 (包名, 版本) 元组列表。
+    """
+    found = merge_dist_infos(dir_dist_infos(d) for d in dirs)
+    return sorted(found.values(), key=lambda x: x[0].lower())
+
+
+def installed_pkgs_info(pyenv):
+    """
+    不启动 pip，返回 pyenv 环境中已安装的 (包名, 版本) 元组列表。
+    找不到 site-packages 目录时退回 pyenv.pkgs_info() 调用 pip 获取。
+    """
+    dirs = site_packages_dirs(pyenv)
+    if not dirs:
+        return pyenv.pkgs_info()
+    return scan_dist_infos(dirs)
+
+
+def _read_requires(entry_path):
+    """
+    读取元数据条目中声明的依赖，返回规范化包名集合。
+    只在 extra 中需要的依赖不算在内，其他环境标记一律视为满足。
+    """
+    requires = set()
+    if entry_path.endswith(".dist-info"):
+        lines, prefix = list(), "Requires-Dist:"
+        try:
+            with open(
+                os.path.join(entry_path, "METADATA"),
+                "rt",
+                encoding="utf-8",
+                errors="replace",
+            ) as fo:
+                for line in fo:
+                    if line in ("\n", "\r\n"):
+                        break
+                    if line.startswith(prefix):
+                        lines.append(line[len(prefix) :])
+        except Exception:
+            return requires
+        lines = [l for l in lines if "extra" not in l.partition(";")[2]]
+    elif os.path.isdir(entry_path):
+        lines = list()
+        try:
+            with open(
+                os.path.join(entry_path, "requires.txt"),
+                "rt",
+                encoding="utf-8",
+                errors="replace",
+            ) as fo:
+                for line in fo:
+                    # requires.txt 中 [extra] 小节之后的都是可选依赖
+                    if line.startswith("["):
+                        break
+                    lines.append(line)
+        except Exception:
+            return requires
+    else:
+        return requires
+    for line in lines:
+        matched = re.match(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)", line)
+        if matched:
+            requires.add(canonical_name(matched.group(1)))
+    return requires
+
+
+def dist_requires(pyenv):
+    """
+    读取 pyenv 环境中已安装包的元数据，返回依赖关系图。
+    :return: dict, {规范化包名: {依赖的规范化包名...}}，同名包以靠前的目录为准。
+    """
+    graph = dict()
+    for dir_path in site_packages_dirs(pyenv):
+        try:
+            entries = os.listdir(dir_path)
+        except Exception:
+            continue
+        for entry_name in entries:
+            pkg_info = dist_info_entry(dir_path, entry_name)
+            if pkg_info is None:
+                continue
+            key = canonical_name(pkg_info[0])
+            if key in graph:
+                continue
+            graph[key] = _read_requires(os.path.join(dir_path, entry_name))
+    return graph
+
+
+def upgrade_waves(requires, names):
+    """
+    把待升级的包名列表 names 按依赖关系分成若干批，被依赖的包在前面的批次中。
+    一个包经其他已安装包间接依赖的待升级包也算作它的依赖；有循环依赖的包放在
+    最后一批一起升级。每批用一次 pip 命令升级，pip 运行次数为依赖层数。
+    :param requires: dict, dist_requires 返回的依赖关系图。
+    :param names: list[str], 待升级的包名列表。
+    :return: list[list[str]], 各批次的包名列表，批次内保持 names 中的顺序。
+    """
+    keys = [canonical_name(n) for n in names]
+    targets = set(keys)
+    deps = dict()
+    for key in keys:
+        found, stack, visited = set(), list(requires.get(key, ())), {key}
+        while stack:
+            dep = stack.pop()
+            if dep in visited:
+                continue
+            visited.add(dep)
+            if dep in targets:
+                found.add(dep)
+            else:
+                stack.extend(requires.get(dep, ()))
+        deps[key] = found
+    waves, done = list(), set()
+    remaining = list(zip(keys, names))
+    while remaining:
+        wave = [(k, n) for k, n in remaining if deps[k] <= done]
+        if not wave:
+            wave = remaining
+        waves.append([n for _, n in wave])
+        done.update(k for k, _ in wave)
+        remaining = [(k, n) for k, n in remaining if k not in done]
+    return waves
+
+
+def _dir_stamp(dir_path):
+    """目录的变更标记：[修改时间(纳秒), inode]，目录不存在返回 None。"""
+    try:
+        stat = os.stat(dir_path)
+    except Exception:
+        return None
+    return [stat.st_mtime_ns, stat.st_ino]
+
+
+class PkgsInfoCache:
+    """
+    保存在 config 目录中的各 Python 环境已安装包信息缓存。
+    每个环境的缓存条目记录其 site-packages 目录的变更标记(修改时间、inode)，
+    安装、卸载包会改变目录的修改时间，标记未变的目录不再重新读取。
+    """
+
+    def __init__(self):
+        # {env_path: {"stamps": {目录: 标记}, "entries": {目录: {条目名: [包名, 版本]}}}}
+        self._data = load_conf("pkgc")
+        self._mutex = QMutex()
+
+    def _sync(self, pyenv):
+        """
+        按目录变更标记更新 pyenv 环境的缓存，有变化的目录中只解析新出现的条目。
+        :return: tuple[dict, dict] or None, 更新前、后的 merge_dist_infos 结果，
+        找不到 site-packages 目录时返回 None。
+        """
+        dirs = site_packages_dirs(pyenv)
+        if not dirs:
+            return None
+        self._mutex.lock()
+        try:
+            cached = self._data.get(pyenv.env_path, {})
+            old_stamps = cached.get("stamps", {})
+            old_entries = cached.get("entries", {})
+            new_stamps, new_entries, changed = dict(), dict(), False
+            for dir_path in dirs:
+                stamp = _dir_stamp(dir_path)
+                new_stamps[dir_path] = stamp
+                known = old_entries.get(dir_path, None)
+                if known is not None and stamp == old_stamps.get(dir_path, None):
+                    new_entries[dir_path] = known
+                    continue
+                changed = True
+                new_entries[dir_path] = {
+                    k: list(v) for k, v in dir_dist_infos(dir_path, known).items()
+                }
+            before = merge_dist_infos(old_entries.get(d, {}) for d in dirs)
+            if not changed:
+                return before, before
+            self._data[pyenv.env_path] = {
+                "stamps": new_stamps,
+                "entries": new_entries,
+            }
+            try:
+                save_conf(self._data, "pkgc")
+            except Exception:
+                pass
+            return before, merge_dist_infos(new_entries[d] for d in dirs)
+        finally:
+            self._mutex.unlock()
+
+    def _is_fresh(self, pyenv, dirs):
+        """pyenv 环境的缓存是否包含 dirs 中所有目录且目录变更标记都未改变。"""
+        self._mutex.lock()
+        try:
+            cached = self._data.get(pyenv.env_path, {})
+            stamps = cached.get("stamps", {})
+            entries = cached.get("entries", {})
+            return all(
+                d in entries and stamps.get(d, None) == _dir_stamp(d) for d in dirs
+            )
+        finally:
+            self._mutex.unlock()
+
+    def iter_pkgs_info(self, pyenv, batch_size=200):
+        """
+        分批产出 pyenv 环境中已安装的 (包名, 版本) 元组列表，用于逐步填充表格。
+        缓存有效时直接分批产出缓存中的结果；否则每列出一个目录就产出从条目名称解析
+        出的结果，全部读取元数据、更新缓存后再产出与之前产出的不同的条目，
+        最后产出之前产出过但元数据中没有的包，其版本为 None，使用者应删除这些包。
+        同一包可能被产出两次，使用者应按规范化包名合并。
+        """
+        dirs = site_packages_dirs(pyenv)
+        if not dirs or self._is_fresh(pyenv, dirs):
+            pkgs_info = self.pkgs_info(pyenv)
+            for start in range(0, len(pkgs_info), batch_size):
+                yield pkgs_info[start : start + batch_size]
+            return
+        quick = dict()
+        for dir_path in dirs:
+            try:
+                entries = os.listdir(dir_path)
+            except Exception:
+                continue
+            batch = list()
+            for entry_name in entries:
+                matched = _DIST_INFO_PATTERN.match(entry_name)
+                if not matched:
+                    continue
+                key = canonical_name(matched.group(1))
+                if key in _SKIPPED_DISTS or key in quick:
+                    continue
+                quick[key] = matched.group(1, 2)
+                batch.append(quick[key])
+            batch.sort(key=lambda x: x[0].lower())
+            for start in range(0, len(batch), batch_size):
+                yield batch[start : start + batch_size]
+        synced = self._sync(pyenv)
+        if synced is None:
+            return
+        exact = [tuple(v) for k, v in synced[1].items() if quick.get(k) != tuple(v)]
+        for start in range(0, len(exact), batch_size):
+            yield exact[start : start + batch_size]
+        # 条目名称与元数据中的包名不一致等原因，快速产出的包可能不在最终结果中
+        stale = [(v[0], None) for k, v in quick.items() if k not in synced[1]]
+        for start in range(0, len(stale), batch_size):
+            yield stale[start : start + batch_size]
+
+    def pkgs_info(self, pyenv):
+        """
+        返回 pyenv 环境中已安装的 (包名, 版本) 元组列表，优先使用缓存。
+        找不到 site-packages 目录时退回 pyenv.pkgs_info() 调用 pip 获取。
+        """
+        synced = self._sync(pyenv)
+        if synced is None:
+            return pyenv.pkgs_info()
+        return sorted(
+            (tuple(v) for v in synced[1].values()), key=lambda x: x[0].lower()
+        )
+
+    def changes(self, pyenv):
+        """
+        更新缓存并返回相对于上次缓存的变化，用于安装、卸载后只刷新变化的条目。
+        :return: tuple[list, list], ([(新安装或版本改变的包名, 版本)...], [已卸载的包名...])。
+        """
+        synced = self._sync(pyenv)
+        if synced is None:
+            return [], []
+        before, after = synced
+        installed = [
+            tuple(v)
+            for k, v in after.items()
+            if k not in before or tuple(before[k]) != tuple(v)
+        ]
+        removed = [before[k][0] for k in before if k not in after]
+        return installed, removed
+
+
 def set_index_url(pyenv, index_url):
     return pyenv.set_global_index(index_url)
 
@@ -170,12 +937,184 @@ def get_index_url(pyenv):
     return pyenv.get_global_index()
 
 
+# 所有访问镜像源的函数共用的项目页面磁盘缓存
+index_cache = IndexCache(conf_path_index_cache)
+
+
+def query_outdated(pyenv, pkgs_info, pre=False):
+    """
+    并发查询 pyenv 所用的镜像源，检查 pkgs_info 中哪些包有新版本。
+    :param pkgs_info: iterable[tuple[str, str]], (包名, 已安装版本)元组。
+    :return: generator, 按查询完成的先后产出(包名, 已安装版本, 最新版本)。
+    """
+    index_url = get_index_url(pyenv) or DEFAULT_INDEX
+    py_version = pyenv.py_facts().get("version", "")
+    return check_outdated(pkgs_info, index_url, py_version, pre=pre, cache=index_cache)
+
+
+# 所有环境共用的本地 wheel 仓库
+wheelhouse = Wheelhouse(conf_path_wheelhouse)
+
+
+def setup_pip_workers():
+    """
+    按配置文件启用或停用 pip 工作进程模式：
+    {"enabled": 是否启用(默认否), "idle_timeout": 工作进程空闲多少秒后结束}。
+    启用后各环境的 pip 命令在常驻的工作进程中执行，省去每次启动解释器、导入 pip。
+    """
+    conf = load_conf("pipw")
+    pip_workers.enabled = bool(conf.get("enabled", False))
+    pip_workers.idle_timeout = conf.get("idle_timeout", pip_workers.idle_timeout)
+    if not pip_workers.enabled:
+        pip_workers.close_all()
+
+
+def _index_project_files(pyenv, index_url):
+    """返回按项目名从镜像源项目页面(优先使用缓存)获取文件信息列表的函数。"""
+    client = IndexClient(cache=index_cache)
+
+    def project_files(project):
+        nonlocal index_url
+        if not index_url:
+            index_url = get_index_url(pyenv) or DEFAULT_INDEX
+        try:
+            return client.project_files(index_url, project) or []
+        except Exception:
+            return []
+
+    return project_files
+
+
+def _index_hash_lookup(project_files):
+    """返回按文件名从镜像源项目页面查找 sha256 值的函数，供存入 wheel 仓库时校验。"""
+
+    def lookup(filename):
+        for item in project_files(file_project(filename)):
+            if item["filename"] == filename:
+                return item["hashes"].get("sha256", "")
+        return ""
+
+    return lookup
+
+
+def wheelhouse_install(
+    pyenv,
+    sequence,
+    *,
+    index_url="",
+    pre=False,
+    user=False,
+    upgrade=False,
+    token=None,
+):
+    """
+    通过共享 wheel 仓库安装包名列表 sequence 中的包，已在仓库中的文件不再下载。
+    :param token: CancelToken or None, 取消时结束正在运行的 pip 进程组。
+    :return: tuple[list, bool], 与 pyenv.install 的返回值相同。
+    """
+    project_files = _index_project_files(pyenv, index_url)
+    py_version = pyenv.py_facts().get("version", "")
+    return wheelhouse.install(
+        pyenv.interpreter,
+        sequence,
+        index_url=index_url,
+        pre=pre,
+        user=user,
+        upgrade=upgrade,
+        hash_lookup=_index_hash_lookup(project_files),
+        latest=lambda name: latest_version(project_files(name), py_version, pre),
+        installed=lambda: installed_pkgs_info(pyenv),
+        token=token,
+    )
+
+
+# pip_download 的关键字参数与 pip download 命令选项的对应关系
+_DOWNLOAD_FLAGS = {
+    "no_deps": "--no-deps",
+    "prefer_binary": "--prefer-binary",
+    "pre": "--pre",
+    "ignore_requires_python": "--ignore-requires-python",
+}
+_DOWNLOAD_OPTIONS = {
+    "no_binary": "--no-binary",
+    "only_binary": "--only-binary",
+    "platform": "--platform",
+    "python_version": "--python-version",
+    "implementation": "--implementation",
+    "abis": "--abi",
+    "index_url": "--index-url",
+}
+
+
+def pip_download(pyenv, *names, dest="", token=None, **options):
+    """
+    用 pip download 下载 names 中的包到 dest 目录(默认为当前工作目录)。
+    options 与 fastpip 的 PyEnv.download 的关键字参数相同，值为列表的选项
+    (如 platform、abis)逐项传给 pip。
+    :param token: CancelToken or None, 取消时结束正在运行的 pip 进程组。
+    :return: tuple[bool, str], (是否下载成功, 保存目录)。
+    """
+    dest = dest or os.getcwd()
+    args = ["download", "--dest", dest, "--disable-pip-version-check"]
+    for key, value in options.items():
+        if not value:
+            continue
+        if key in _DOWNLOAD_FLAGS:
+            args.append(_DOWNLOAD_FLAGS[key])
+        elif key in _DOWNLOAD_OPTIONS:
+            values = value if isinstance(value, (list, tuple, set)) else (value,)
+            if key in ("no_binary", "only_binary"):
+                values = (",".join(values),)
+            for item in values:
+                args.extend((_DOWNLOAD_OPTIONS[key], item))
+    code, _ = run_pip(pyenv.interpreter, *args, *names, token=token)
+    return code == 0, dest if code == 0 else ""
+
+
+def all_py_paths():
+    """
+    返回本机存在 Python 解释器的目录路径列表。
+    Windows 上使用 fastpip 的查找函数；其他系统使用 PyFinder 搜索，可在配置文件中
+    设置额外搜索虚拟环境的目录(venv_roots)及搜索深度(max_depth)，目录缓存也保存
+    在该配置文件中，再次搜索时只重新列出修改时间发生变化的目录。
+    """
+    if os.name == "nt":
+        return _all_py_paths()
+    conf = load_conf("pfnd")
+    conf.setdefault("venv_roots", ["~"])
+    conf.setdefault("max_depth", 4)
+    finder = PyFinder(
+        conf.get("cache", None),
+        venv_roots=conf["venv_roots"],
+        max_depth=conf["max_depth"],
+    )
+    paths = finder.find()
+    if finder.changed or "cache" not in conf:
+        conf["cache"] = finder.cache
+        try:
+            save_conf(conf, "pfnd")
+        except Exception:
+            pass
+    return paths
+
+
 def check_py_path(py_dir_path):
-    return os.path.isfile(os.path.join(py_dir_path, "python.exe"))
+    if os.name == "nt":
+        return os.path.isfile(os.path.join(py_dir_path, "python.exe"))
+    return has_interpreter(py_dir_path)
 
 
 def clean_py_paths(paths):
-    return [pth for pth in paths if check_py_path(pth)]
+    """去除 paths 中无效、重复的 Python 目录路径，每个目录只检查一次。"""
+    checked, results = set(), list()
+    for pth in paths:
+        key = os.path.normcase(os.path.normpath(pth))
+        if key in checked:
+            continue
+        checked.add(key)
+        if check_py_path(pth):
+            results.append(pth)
+    return results
 
 
 def check_index_url(url):
@@ -186,14 +1125,42 @@ def clean_index_urls(urls):
     return [url for url in urls if check_index_url(url)]
 
 
-class NewTask(QThread):
-    def __init__(self, target, args=tuple()):
-        super().__init__()
+# TaskExecutor 的任务优先级，数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class NewTask:
+    """
+    交给 TaskExecutor 在工作线程中执行的任务。
+    at_start、at_finish 添加的回调在主线程(GUI线程)中调用。
+    """
+
+    PENDING, RUNNING, FINISHED, DROPPED = range(4)
+
+    def __init__(self, target, args=tuple(), token=None):
+        """
+        :param token: CancelToken or None, 传给 target 使用的取消标记，
+        TaskExecutor.cancel 取消正在执行的任务时调用其 cancel 方法。
+        """
         self._args = args
         self._target = target
+        self.token = token
+        self._at_start = list()
+        self._at_finish = list()
+        self.state = None
+        self.priority = PRIORITY_NORMAL
+        self.key = None
+        self.group = None
+        self.error = None
 
     def run(self):
-        self._target(*self._args)
+        try:
+            self._target(*self._args)
+        except Exception as e:
+            self.error = e
+            traceback.print_exc()
 
     def __repr__(self):
         return f"{self._target} with args:{self._args}"
@@ -201,79 +1168,338 @@ class NewTask(QThread):
     __str__ = __repr__
 
     def at_start(self, *callable_objs):
-        for cab in callable_objs:
-            if callable(cab):
-                self.started.connect(cab)
+        self._at_start.extend(c for c in callable_objs if callable(c))
 
     def at_finish(self, *callable_objs):
-        for cab in callable_objs:
-            if callable(cab):
-                self.finished.connect(cab)
+        self._at_finish.extend(c for c in callable_objs if callable(c))
 
+    def is_running(self):
+        return self.state == self.RUNNING
 
-class ThreadRepo:
-    def __init__(self, interval):
-        """interval: 清理已结束线程的时间间隔，单位毫秒。"""
-        self._thread_repo = []
-        self._timer_clths = QTimer()
-        self._mutex = QMutex()
-        self._timer_clths.timeout.connect(self.clean)
-        self._timer_clths.start(interval)
-        self._flag_cleaning = False
+    def is_finished(self):
+        return self.state in (self.FINISHED, self.DROPPED)
 
-    def put(self, threadhandle, level=0):
-        """将(线程句柄、重要等级)元组加入线程仓库。"""
-        self._mutex.lock()
-        self._thread_repo.append((threadhandle, level))
-        self._mutex.unlock()
 
-    def clean(self):
-        """清除已结束的线程。"""
-        if self._flag_cleaning:
-            return
-        self._mutex.lock()
-        index = 0
-        self._flag_cleaning = True
-        while index < len(self._thread_repo):
-            if self._thread_repo[index][0].isRunning():
-                index += 1
-                continue
-            del self._thread_repo[index]
-        self._flag_cleaning = False
-        self._mutex.unlock()
-
-    def stop_all(self):
-        """
-        按线程重要等级退出线程。
-        0级：重要，安全退出；
-        1级：不重要，立即退出；
-        其他：未知等级，安全退出。
-        """
-        for thread, level in self._thread_repo:
-            if level == 0:
-                thread.quit()
-            elif level == 1:
-                thread.terminate()
+class TaskExecutor(QObject):
+    """
+    所有窗口共用的任务执行器，最多同时用 max_workers 个工作线程执行任务。
+    等待中的任务按优先级、提交顺序执行；key 相同的任务不同时执行，且只保留最后
+    提交的那个等待中的任务(被替换的任务状态为 DROPPED，不调用其回调)。
+    任务的开始、结束回调通过信号在主线程中调用，不需要定时轮询。
+    """
+
+    _task_started = pyqtSignal(object)
+    _task_finished = pyqtSignal(object)
+
+    def __init__(self, max_workers=8, idle_timeout=60):
+        """
+        :param max_workers: int, 最多同时运行的工作线程数。
+        :param idle_timeout: int or float, 工作线程空闲超过此秒数后退出。
+        """
+        super().__init__()
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._pending = list()
+        self._running = list()
+        self._workers = 0
+        self._task_started.connect(self._call_at_start)
+        self._task_finished.connect(self._call_at_finish)
+
+    def submit(self, task, priority=PRIORITY_NORMAL, key=None, group=None):
+        """
+        提交尚未执行的 NewTask 任务。
+        :param key: hashable or None, 相同查询的标识，等待中的同 key 任务被替换。
+        :param group: hashable or None, 任务所属的分组(如提交任务的窗口)，用于按组
+        统计、取消任务。
+        :return: NewTask, 即 task。
+        """
+        with self._cond:
+            task.priority, task.key, task.group = priority, key, group
+            if key is not None:
+                for item in self._pending:
+                    if item[2].key == key:
+                        item[2].state = NewTask.DROPPED
+                        self._pending.remove(item)
+                        heapq.heapify(self._pending)
+                        break
+            task.state = NewTask.PENDING
+            heapq.heappush(self._pending, (priority, next(self._seq), task))
+            idle = self._workers - len(self._running)
+            if idle < len(self._pending) and self._workers < self.max_workers:
+                self._workers += 1
+                threading.Thread(target=self._work, daemon=True).start()
             else:
-                thread.quit()
+                self._cond.notify()
+        return task
 
-    def kill_all(self):
-        """立即终止所有线程。"""
-        for thread, _ in self._thread_repo:
-            thread.terminate()
+    def _take(self):
+        """取出优先级最高且 key 不与正在执行的任务相同的任务，没有返回 None。"""
+        busy_keys = {t.key for t in self._running if t.key is not None}
+        skipped, task = list(), None
+        while self._pending:
+            item = heapq.heappop(self._pending)
+            if item[2].key in busy_keys:
+                skipped.append(item)
+                continue
+            task = item[2]
+            break
+        for item in skipped:
+            heapq.heappush(self._pending, item)
+        return task
 
-    def is_empty(self):
-        """返回线程仓库是否为空。"""
-        return not self._thread_repo
+    def _work(self):
+        while True:
+            with self._cond:
+                task = self._take()
+                while task is None:
+                    if not self._cond.wait(self.idle_timeout):
+                        task = self._take()
+                        if task is None:
+                            self._workers -= 1
+                            return
+                        break
+                    task = self._take()
+                task.state = NewTask.RUNNING
+                self._running.append(task)
+            self._task_started.emit(task)
+            task.run()
+            with self._cond:
+                self._running.remove(task)
+                task.state = NewTask.FINISHED
+                # 可能有等待同 key 任务结束的任务
+                self._cond.notify_all()
+            self._task_finished.emit(task)
 
+    @staticmethod
+    def _call_at_start(task):
+        for cab in task._at_start:
+            cab()
 
-def get_cmd_o(*commands, regexp="", timeout=None):
-    """用于从cmd命令执行输出的字符匹配想要的信息。"""
-    proc = Popen(commands, stdout=PIPE, text=True, startupinfo=_STARTUP)
-    try:
-        strings, _ = proc.communicate(timeout=timeout)
-    except Exception:
+    @staticmethod
+    def _call_at_finish(task):
+        for cab in task._at_finish:
+            cab()
+
+    def running_count(self, group=None):
+        """正在执行的任务数量，group 为 None 时统计所有分组。"""
+        with self._cond:
+            return sum(group is None or t.group == group for t in self._running)
+
+    def pending_count(self, group=None):
+        """等待执行的任务数量，group 为 None 时统计所有分组。"""
+        with self._cond:
+            return sum(group is None or i[2].group == group for i in self._pending)
+
+    def is_idle(self, group=None):
+        """group 分组(None 为所有分组)是否没有正在执行和等待执行的任务。"""
+        return not (self.running_count(group) or self.pending_count(group))
+
+    def cancel(self, group=None):
+        """
+        取消 group 分组(None 为所有分组)中等待执行的任务，并通过取消标记结束正在
+        执行的任务(没有取消标记的任务仍会执行完毕)。
+        :return: int, 取消的等待中任务数量。
+        """
+        dropped = self.cancel_pending(group)
+        with self._cond:
+            running = [t for t in self._running if group is None or t.group == group]
+        for task in running:
+            if task.token is not None:
+                task.token.cancel()
+        return dropped
+
+    def wait_idle(self, timeout=None, group=None):
+        """
+        等待 group 分组(None 为所有分组)中正在执行的任务结束，最多等待 timeout 秒。
+        :return: bool, 是否已没有正在执行的任务。
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not any(
+                    group is None or t.group == group for t in self._running
+                ),
+                timeout,
+            )
+
+    def cancel_pending(self, group=None):
+        """
+        取消 group 分组(None 为所有分组)中等待执行的任务，不影响正在执行的任务。
+        :return: int, 取消的任务数量。
+        """
+        with self._cond:
+            kept, dropped = list(), 0
+            for item in self._pending:
+                if group is None or item[2].group == group:
+                    item[2].state = NewTask.DROPPED
+                    dropped += 1
+                else:
+                    kept.append(item)
+            heapq.heapify(kept)
+            self._pending = kept
+        return dropped
+
+
+class EnvJobQueues(QObject):
+    """
+    按 Python 环境分开的任务队列：同一环境的任务按加入顺序逐个执行，
+    不同环境的任务同时执行。只应在主线程(GUI线程)中使用。
+    环境由忙碌变为空闲或由空闲变为忙碌时发出 busy_changed(环境路径, 是否忙碌) 信号。
+    """
+
+    busy_changed = pyqtSignal(str, bool)
+
+    def __init__(self, executor, group=None):
+        """
+        :param executor: TaskExecutor, 执行任务的执行器。
+        :param group: hashable or None, 提交任务时使用的分组。
+        """
+        super().__init__()
+        self._executor = executor
+        self._group = group
+        self._queues = dict()
+        self._running = dict()
+
+    def put(self, key, task, priority=PRIORITY_NORMAL):
+        """把尚未提交的 NewTask 任务加入 key 环境的队列，环境空闲时立即提交。"""
+        self._queues.setdefault(key, deque()).append((task, priority))
+        if key not in self._running:
+            self._start_next(key)
+
+    def _start_next(self, key):
+        queue = self._queues.get(key, None)
+        if not queue:
+            self._queues.pop(key, None)
+            if self._running.pop(key, None) is not None:
+                self.busy_changed.emit(key, False)
+            return
+        task, priority = queue.popleft()
+        was_idle = key not in self._running
+        self._running[key] = task
+        task.at_finish(lambda: self._start_next(key))
+        self._executor.submit(task, priority, group=self._group)
+        if was_idle:
+            self.busy_changed.emit(key, True)
+
+    def cancel_pending(self):
+        """
+        取消所有环境中尚未开始执行的任务，包括已提交给执行器但还未开始的任务
+        (执行器中同一分组的其他任务也被取消)，并通过取消标记结束正在执行的任务。
+        """
+        self._queues.clear()
+        self._executor.cancel(self._group)
+        for key, task in list(self._running.items()):
+            if task.state == NewTask.DROPPED:
+                del self._running[key]
+                self.busy_changed.emit(key, False)
+
+    def is_busy(self, key):
+        """key 环境是否有正在执行的任务。"""
+        return key in self._running
+
+    def pending(self, key):
+        """key 环境队列中等待执行的任务数量。"""
+        return len(self._queues.get(key, ()))
+
+
+class QueryMemo:
+    """
+    只读查询结果的缓存，以查询的键及其依赖文件(或目录)的修改时间、大小为依据，
+    依赖文件均未改变时直接返回上次的结果，任一依赖文件改变、出现或消失时重新查询。
+    最多保留 max_entries 条结果，超出时丢弃最久未使用的。
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # {键: (依赖文件快照, 结果)}
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def _snapshot(depends):
+        snapshot = list()
+        for path in depends:
+            try:
+                stat = os.stat(path)
+                snapshot.append((path, (stat.st_mtime_ns, stat.st_size)))
+            except Exception:
+                snapshot.append((path, None))
+        return tuple(snapshot)
+
+    def get(self, key, depends, compute):
+        """
+        返回键为 key 的查询结果，缓存无效时调用 compute() 查询并缓存其结果。
+        :param depends: iterable[str], 查询结果所依赖的文件或目录路径。
+        :param compute: callable, 无参数，返回查询结果，返回 None 表示查询失败，不缓存。
+        """
+        snapshot = self._snapshot(depends)
+        with self._lock:
+            cached = self._entries.get(key, None)
+            if cached is not None:
+                if cached[0] == snapshot:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return cached[1]
+                del self._entries[key]
+                self._stats["invalidations"] += 1
+            self._stats["misses"] += 1
+        value = compute()
+        if value is None:
+            return value
+        with self._lock:
+            self._entries[key] = snapshot, value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        返回统计信息：{"hits": 命中次数, "misses": 未命中次数,
+        "invalidations": 因依赖文件改变而失效的次数, "entries": 缓存条数, "hit_rate": 命中率}。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+# 所有模块共用的只读查询缓存
+query_memo = QueryMemo()
+
+
+def get_cmd_o(*commands, regexp="", timeout=None, depends=None):
+    """
+    用于从cmd命令执行输出的字符匹配想要的信息。
+    命令由共享的子进程运行器运行，丢弃标准错误输出，无法运行或超时返回空字符串。
+    :param depends: iterable[str] or None, 命令输出所依赖的文件或目录路径，
+    给出时命令的输出保存在 query_memo 中，这些文件都未改变时不再运行命令。
+    """
+
+    def _output():
+        result = run_process(
+            commands, timeout=timeout, merge_stderr=False, label="query"
+        )
+        if result.returncode == -1 and not result.wall_time:
+            return None
+        if result.timed_out:
+            return None
+        return result.output
+
+    if depends is None:
+        output = _output()
+    else:
+        output = query_memo.get(("cmd",) + commands, depends, _output)
+    if output is None:
         return ""
     if not regexp:
-        return strings.strip()
-    return re.search(regexp, strings)
+        return output.strip()
+    return re.search(regexp, output)
@@ -0,0 +1,211 @@
+# coding: utf-8
+
+__doc__ = """包含在常驻的 pip 工作进程中执行 pip 命令的类、函数。"""
+
+import json
+import os
+import threading
+import time
+from subprocess import DEVNULL, PIPE, Popen
+
+from .librun import GROUP_KWARGS, kill_group, pinned_env
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipworker.py")
+# 工作进程启动并导入 pip 的最长等待秒数
+START_TIMEOUT = 30
+
+
+def _file_identity(file_path):
+    try:
+        stat = os.stat(file_path)
+    except Exception:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class PipWorker:
+    """
+    某个 Python 环境的常驻 pip 工作进程(pipworker.py)，pip 只在启动时导入一次，
+    之后的命令通过标准输入输出以 JSON 行的形式发送、返回。
+    该环境的 pip 被升级、重装(pip 包的 __init__.py 改变)后，下次执行命令前自动重启；
+    工作进程意外退出、超时或被取消时结束，下次执行命令时重新启动。
+    同一工作进程中的命令依次执行。
+    这是 pip 不支持的用法(依赖 pip._internal)，工作进程尽量让各条命令互不影响，
+    详见 pipworker.py 的说明；出现问题时可在配置文件中停用工作进程模式。
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._proc = None
+        self._pip_file = ""
+        self._pip_identity = None
+        self._seq = 0
+        # 启动次数，可用于观察重启情况
+        self.starts = 0
+
+    def _alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _start(self):
+        self.close()
+        try:
+            proc = Popen(
+                (self.interpreter, WORKER_SCRIPT),
+                stdin=PIPE,
+                stdout=PIPE,
+                stderr=DEVNULL,
+                text=True,
+                encoding="utf-8",
+                env=pinned_env(self.interpreter),
+                **GROUP_KWARGS,
+            )
+        except Exception:
+            return False
+        timer = threading.Timer(START_TIMEOUT, kill_group, (proc,))
+        timer.daemon = True
+        timer.start()
+        try:
+            ready = json.loads(proc.stdout.readline() or "{}")
+        except Exception:
+            ready = dict()
+        finally:
+            timer.cancel()
+        if not ready.get("ready", False):
+            kill_group(proc)
+            proc.wait()
+            return False
+        self._proc = proc
+        self._pip_file = ready["pip"]
+        self._pip_identity = _file_identity(self._pip_file)
+        self.starts += 1
+        return True
+
+    def _pip_changed(self):
+        return _file_identity(self._pip_file) != self._pip_identity
+
+    def call(self, args, timeout=None, token=None):
+        """
+        在工作进程中执行 pip 命令。
+        :param args: iterable[str], pip 命令参数，如 ("install", "requests")。
+        :param timeout: int or float or None, 超过此秒数结束工作进程，返回码为 -1。
+        :param token: CancelToken or None, 取消时结束工作进程及其子进程。
+        :return: tuple[int, str] or None, (返回码, 输出文本)，工作进程无法启动
+        (如该环境没有 pip)时返回 None。
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            if not self._alive() or self._pip_changed():
+                if not self._start():
+                    return None
+            proc = self._proc
+            self._seq += 1
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, kill_group, (proc,))
+                timer.daemon = True
+                timer.start()
+            if token is not None:
+                token.attach(proc)
+            try:
+                proc.stdin.write(json.dumps({"id": self._seq, "args": list(args)}))
+                proc.stdin.write("\n")
+                proc.stdin.flush()
+                response = json.loads(proc.stdout.readline() or "{}")
+            except Exception:
+                response = dict()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if token is not None:
+                    token.detach(proc)
+            self.last_used = time.monotonic()
+            if response.get("id", None) != self._seq:
+                # 被结束或通信出错，丢弃该工作进程
+                self.close()
+                return -1, ""
+            return response["code"], response["output"]
+
+    def close(self):
+        """结束工作进程。"""
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(2)
+        except Exception:
+            kill_group(proc)
+            try:
+                proc.wait(5)
+            except Exception:
+                pass
+
+
+class PipWorkerPool:
+    """
+    按解释器路径管理的 PipWorker 集合，enabled 为 False 时不使用工作进程。
+    空闲超过 idle_timeout 秒的工作进程在下次调用时结束。
+    """
+
+    def __init__(self, enabled=False, idle_timeout=600):
+        self.enabled = enabled
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._workers = dict()
+        self._stats = {"calls": 0, "fallbacks": 0, "wall_time": 0.0}
+
+    def worker(self, interpreter):
+        """返回 interpreter 解释器的工作进程对象，并结束其他空闲过久的工作进程。"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                w
+                for k, w in self._workers.items()
+                if k != interpreter and now - w.last_used > self.idle_timeout
+            ]
+            for w in idle:
+                del self._workers[w.interpreter]
+            worker = self._workers.get(interpreter, None)
+            if worker is None:
+                worker = self._workers[interpreter] = PipWorker(interpreter)
+        for w in idle:
+            w.close()
+        return worker
+
+    def call(self, interpreter, args, timeout=None, token=None):
+        """
+        用 interpreter 解释器的工作进程执行 pip 命令，参数同 PipWorker.call。
+        未启用或工作进程不可用时返回 None，调用方应改为启动子进程执行。
+        """
+        if not self.enabled:
+            return None
+        start = time.monotonic()
+        result = self.worker(interpreter).call(args, timeout, token)
+        with self._lock:
+            if result is None:
+                self._stats["fallbacks"] += 1
+            else:
+                self._stats["calls"] += 1
+                self._stats["wall_time"] += time.monotonic() - start
+        return result
+
+    def stats(self):
+        """返回统计信息：{"calls": 执行次数, "fallbacks": 不可用次数, "wall_time": 总用时}。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["workers"] = len(self._workers)
+        return stats
+
+    def close_all(self):
+        """结束所有工作进程。"""
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for w in workers:
+            w.close()
+
+
+# 所有模块共用的 pip 工作进程集合，由配置文件决定是否启用
+pip_workers = PipWorkerPool()
@@ -3,24 +3,14 @@
 __doc__ = """包含pyinstaller相关的类或函数。"""
 
 import os
-from subprocess import (
-    PIPE,
-    STARTF_USESHOWWINDOW,
-    STARTUPINFO,
-    STDOUT,
-    SW_HIDE,
-    Popen,
-)
 
 from PyQt5.QtCore import QObject, QTimer, pyqtSignal
 
 from library.libm import conf_path, get_cmd_o
+from library.librun import pinned_env, runner
 
 
 class PyiTool(QObject):
-    STARTUP = STARTUPINFO()
-    STARTUP.dwFlags = STARTF_USESHOWWINDOW
-    STARTUP.wShowWindow = SW_HIDE
     stdout = pyqtSignal(str)
     run_time = pyqtSignal(int)
     completed = pyqtSignal(int)
@@ -46,7 +36,10 @@ class PyiTool(QObject):
     @property
     def pyi_path(self):
         """返回给出的Python路径中的pyinstaller可执行文件路径。"""
-        pyi_exec_path = os.path.join(self._py_path, "Scripts", "pyinstaller.exe")
+        if os.name == "nt":
+            pyi_exec_path = os.path.join(self._py_path, "Scripts", "pyinstaller.exe")
+        else:
+            pyi_exec_path = os.path.join(self._py_path, "pyinstaller")
         if not os.path.isfile(pyi_exec_path):
             return ""
         return pyi_exec_path
@@ -60,21 +53,33 @@ class PyiTool(QObject):
         # 信任传入的py_path
         self._py_path = py_path
         self._cwd = cwd
-        self._process = None
+        self._future = None
+        self._lines = list()
         self._commands = [self.pyi_path]
 
-    def handle(self):
-        if self._process is None:
-            self._process = Popen(
+    def handle(self, token=None):
+        """
+        通过共享的子进程运行器启动 pyinstaller 进程，返回其 Future(结果为 RunResult)。
+        输出由运行器线程逐行读取并通过 stdout 信号发出。
+        :param token: CancelToken or None, 取消时结束 pyinstaller 及其子进程。
+        """
+        if self._future is None:
+            self._lines.clear()
+            if self._log_level == "TRACE":
+                self.run_time.emit(1)
+                on_line = self._emit_split_time
+            else:
+                on_line = self._emit_split_line
+            self._future = runner.submit(
                 self._commands,
-                stdin=PIPE,
-                stdout=PIPE,
-                stderr=STDOUT,
-                text=True,
+                on_line=on_line,
+                token=token,
+                env=pinned_env(os.path.join(self._py_path, "python")),
                 cwd=self._cwd,
-                startupinfo=self.STARTUP,
+                keep_output=False,
+                label="pyinstaller",
             )
-        return self._process
+        return self._future
 
     def _time(self):
         if self.cumulative > 10000:
@@ -88,34 +93,34 @@ class PyiTool(QObject):
             self.emt.stop()
             self.cumulative = -200
 
-    def _emit_split_line(self):
-        for line in self._process.stdout:
-            self.stdout.emit(line.strip())
-        self.completed.emit(self._process.wait())
-
-    def _emit_split_time(self):
-        self.run_time.emit(1)
-        lines = []
-        for line in self._process.stdout:
-            lines.append(line.strip())
-            if self.cumulative > 80:
-                self.stdout.emit("\n".join(lines))
-                lines.clear()
-                self.cumulative = 0
-        self.completed.emit(self._process.wait())
-        self.run_time.emit(0)
+    def _emit_split_line(self, line):
+        self.stdout.emit(line.strip())
+
+    def _emit_split_time(self, line):
+        # 输出很多时合并一段时间内的行再发出，避免界面频繁刷新
+        self._lines.append(line.strip())
+        if self.cumulative > 80:
+            self.stdout.emit("\n".join(self._lines))
+            self._lines.clear()
+            self.cumulative = 0
 
     def execute_cmd(self):
-        """执行命令并读取输出流，通过信号发射字符串、返回码更新主界面面板。"""
-        if self.pyi_ready and self._process:
+        """
+        等待 handle 启动的进程结束，通过信号发射返回码及运行开销更新主界面面板。
+        """
+        if self.pyi_ready and self._future:
+            result = self._future.result()
+            if self._lines:
+                self.stdout.emit("\n".join(self._lines))
+                self._lines.clear()
+            self.stdout.emit(result.cost_text())
+            self.completed.emit(result.returncode)
             if self._log_level == "TRACE":
-                self._emit_split_time()
-            else:
-                self._emit_split_line()
+                self.run_time.emit(0)
         else:
             if not self.pyi_ready:
                 self.stdout.emit("当前Python环境中找不到PYINSTALLER。")
-            if self._process is None:
+            if self._future is None:
                 self.stdout.emit("请先调用handle方法获取进程操作句柄。")
             self.completed.emit(-1)
 
@@ -186,8 +191,11 @@ class PyiTool(QObject):
         self._commands.append(cmd_dict.get("program_entry", ""))
 
     def pyi_info(self):
+        """返回 pyinstaller 版本，pyinstaller 可执行文件未改变时直接返回上次查询的结果。"""
         if self.pyi_ready:
-            return get_cmd_o(self.pyi_path, "-v")
+            return get_cmd_o(
+                self.pyi_path, "-v", depends=(self.pyi_path, self._py_path)
+            )
         return "0.0"
 
     @staticmethod
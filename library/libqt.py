@@ -4,9 +4,13 @@ __doc__ = """包含一些继承自默认Qt控件的自定义行为控件。"""
 
 import os
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QLineEdit, QTextEdit
 
+from .libidx import version_key
+from .libtree import ProjectTree
+
 
 class QLineEditMod(QLineEdit):
     def __init__(self, accept="dir", file_filter=set()):
@@ -75,10 +79,11 @@ class QTextEditMod(QTextEdit):
                 self._drag_temp.append(file_or_dir)
                 continue
             self._drag_temp.append(file_or_dir)
-            for root, _, files in os.walk(file_or_dir):
-                self._drag_temp.extend(
-                    os.path.join(root, filename) for filename in files
-                )
+            # 用户拖入的数据目录中的文件都要保留，只跳过版本控制目录
+            tree = ProjectTree(
+                file_or_dir, skip_dirs=(".git", ".hg", ".svn"), use_gitignore=False
+            )
+            self._drag_temp.extend(tree.files())
 
     def dragEnterEvent(self, event):
         self._drag_temp.clear()
@@ -120,3 +125,289 @@ class QTextEditMod(QTextEdit):
         else:
             self.setText("")
         self.verticalScrollBar().setValue(self.verticalScrollBar().maximumHeight())
+
+
+class PkgsTableModel(QAbstractTableModel):
+    """
+    已安装包信息表格的数据模型，四列依次为名称、当前版本、最新版本、状态。
+    数据按列存放在四个字符串列表中，不为每个单元格创建对象，视图只在绘制可见行时
+    调用 data 取值；数据变化时只对发生变化的行发出 dataChanged 信号。
+    每列另存一份预先计算的排序键(版本号列为按 PEP 440 解析的键)，排序、筛选只
+    调整可见行到数据下标的映射 _order，不移动数据本身。
+    """
+
+    HEADERS = ("名称", "当前版本", "最新版本", "状态")
+    SUCCEEDED = ("升级成功", "安装成功", "卸载成功")
+    FAILED = ("升级失败", "安装失败", "卸载失败")
+    COLOR_GREEN = QColor(0, 170, 0)
+    COLOR_RED = QColor(255, 0, 0)
+    COLOR_GRAY = QColor(243, 243, 243)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._columns = ([], [], [], [])
+        self._keys = ([], [], [], [])
+        # 各列排序键的名次，排序时只比较整数；数据变化后置为 None 下次排序时重算
+        self._ranks = [None, None, None, None]
+        # 包名到数据下标的映射
+        self._index = dict()
+        # 全部行按历次排序得到的数据下标顺序(不筛选)，多列排序的结果保存在其中
+        self._sorted = list()
+        # 可见行依次对应的数据下标，以及数据下标对应的可见行(不可见为-1)
+        self._order = list()
+        self._pos = list()
+        # 排序的列、是否降序，None表示按载入顺序
+        self._sort_column = None
+        self._descending = False
+        self._filter = ""
+
+    @staticmethod
+    def _key(col, value):
+        if col in (1, 2):
+            return version_key(value)
+        return value.lower()
+
+    def _rank(self, col):
+        if self._ranks[col] is None:
+            keys = self._keys[col]
+            ranks, last, rank = [0] * len(keys), None, -1
+            for i in sorted(range(len(keys)), key=keys.__getitem__):
+                if keys[i] != last:
+                    last, rank = keys[i], rank + 1
+                ranks[i] = rank
+            self._ranks[col] = ranks
+        return self._ranks[col]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if role == Qt.DisplayRole:
+            return self._columns[col][self._order[row]]
+        if role == Qt.BackgroundRole:
+            return None if row % 2 else self.COLOR_GRAY
+        if col != 3:
+            return None
+        if role == Qt.ForegroundRole:
+            status = self._columns[3][self._order[row]]
+            if status in self.SUCCEEDED:
+                return self.COLOR_GREEN
+            if status in self.FAILED:
+                return self.COLOR_RED
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignHCenter | Qt.AlignVCenter
+        return None
+
+    def names(self):
+        """返回按可见行排列的包名列表。"""
+        names = self._columns[0]
+        return [names[i] for i in self._order]
+
+    def name(self, row):
+        return self._columns[0][self._order[row]]
+
+    def names_in_ranges(self, ranges):
+        """返回可见行区间列表 [(起始行, 结束行)...] 中各行的包名列表。"""
+        names, order = self._columns[0], self._order
+        return [names[i] for top, bottom in ranges for i in order[top : bottom + 1]]
+
+    def row_of(self, name):
+        """返回包名所在的可见行号，不存在或被筛选掉返回 -1。"""
+        i = self._index.get(name, None)
+        return -1 if i is None else self._pos[i]
+
+    def clear(self):
+        self.load(dict())
+
+    def load(self, pkgs_info):
+        """
+        用 {包名: [当前版本, 最新版本, 状态]} 字典替换全部数据，保持当前的排序和筛选。
+        """
+        self.beginResetModel()
+        values = list(pkgs_info.values())
+        self._columns[0][:] = pkgs_info.keys()
+        for col in (1, 2, 3):
+            self._columns[col][:] = (v[col - 1] for v in values)
+        for col, column in enumerate(self._columns):
+            self._keys[col][:] = (self._key(col, v) for v in column)
+        self._index = {name: i for i, name in enumerate(self._columns[0])}
+        self._ranks = [None, None, None, None]
+        self._sorted = self._sort_rows(list(range(len(self._columns[0]))))
+        self._order = self._filtered(self._sorted)
+        self._update_pos()
+        self.endResetModel()
+
+    def _update_pos(self):
+        self._pos = [-1] * len(self._columns[0])
+        for row, i in enumerate(self._order):
+            self._pos[i] = row
+
+    def _sort_rows(self, order):
+        """
+        按当前排序列对数据下标列表 order 原地排序并返回。排序是稳定的，键相同的行
+        保持 order 中的顺序，依次点击多列即可实现多列排序；未指定排序列时不变。
+        """
+        if self._sort_column is not None:
+            order.sort(
+                key=self._rank(self._sort_column).__getitem__,
+                reverse=self._descending,
+            )
+        return order
+
+    def _filtered(self, order):
+        """
+        按当前的筛选文字从数据下标列表 order 中选出可见行，不改变排序。
+        包名以筛选文字开头的行排在包含筛选文字的行之前，两部分各自保持 order 中的顺序。
+        """
+        if not self._filter:
+            return list(order)
+        names = self._keys[0]
+        text = self._filter
+        prefixed, contained = list(), list()
+        for i in order:
+            name = names[i]
+            if name.startswith(text):
+                prefixed.append(i)
+            elif text in name:
+                contained.append(i)
+        return prefixed + contained
+
+    def update(self, name, values):
+        """
+        更新一个包的 [当前版本, 最新版本, 状态]，值为 None 的列不更新。
+        包名不存在时在末尾添加一行；只对可见且值有变化的单元格发出 dataChanged。
+        """
+        i = self._index.get(name, None)
+        if i is None:
+            self.extend(((name, values),))
+            return
+        changed = [
+            col
+            for col, value in enumerate(values, 1)
+            if value is not None and self._columns[col][i] != value
+        ]
+        if not changed:
+            return
+        for col in changed:
+            self._columns[col][i] = values[col - 1]
+            self._keys[col][i] = self._key(col, values[col - 1])
+            self._ranks[col] = None
+        row = self._pos[i]
+        if row != -1:
+            self.dataChanged.emit(
+                self.index(row, changed[0]), self.index(row, changed[-1])
+            )
+
+    def extend(self, records):
+        """
+        在末尾批量添加新的包，records 为 (包名, [当前版本, 最新版本, 状态]) 元组序列，
+        包名须是模型中没有的。通过筛选的行一次性插入，只发出一次 rowsInserted。
+        """
+        start = len(self._columns[0])
+        for name, values in records:
+            self._index[name] = len(self._columns[0])
+            self._columns[0].append(name)
+            self._keys[0].append(self._key(0, name))
+            for col, value in enumerate(values, 1):
+                self._columns[col].append(value or "")
+                self._keys[col].append(self._key(col, value or ""))
+            self._pos.append(-1)
+        end = len(self._columns[0])
+        if end == start:
+            return
+        self._ranks = [None, None, None, None]
+        added = self._sort_rows(list(range(start, end)))
+        self._sorted.extend(added)
+        visible = self._filtered(added)
+        if not visible:
+            return
+        row = len(self._order)
+        self.beginInsertRows(QModelIndex(), row, row + len(visible) - 1)
+        self._order.extend(visible)
+        for row, i in enumerate(visible, row):
+            self._pos[i] = row
+        self.endInsertRows()
+
+    def rename(self, name, new_name):
+        """修改包名的显示形式(如元数据中的包名与目录条目名称的写法不同)。"""
+        if name not in self._index or new_name in self._index:
+            return
+        i = self._index.pop(name)
+        self._index[new_name] = i
+        self._columns[0][i] = new_name
+        self._keys[0][i] = self._key(0, new_name)
+        self._ranks[0] = None
+        row = self._pos[i]
+        if row != -1:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 0))
+
+    def resort(self):
+        """按当前的排序列重新排列可见行，用于分批添加的行排到正确的位置。"""
+        if self._sort_column is not None:
+            self._rearrange()
+
+    def _rearrange(self):
+        """
+        重新排序当前可见行，顺序有变化时发出 layoutAboutToBeChanged、layoutChanged，
+        并把持久索引(视图的选中行、当前行等)移到各自数据所在的新行。
+        筛选时前缀匹配、包含两部分按新的排序各自重排。
+        """
+        new_order = self._filtered(self._sort_rows(self._sorted))
+        if new_order == self._order:
+            return
+        self.layoutAboutToBeChanged.emit()
+        old_order, self._order = self._order, new_order
+        self._update_pos()
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes,
+            [
+                self.index(self._pos[old_order[index.row()]], index.column())
+                for index in old_indexes
+            ],
+        )
+        self.layoutChanged.emit()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """按第 column 列排序，在当前顺序的基础上稳定排序。"""
+        self._sort_column = column
+        self._descending = order == Qt.DescendingOrder
+        self._rearrange()
+
+    def set_filter(self, text):
+        """
+        只显示包名以 text 开头或包含 text 的行(不区分大小写)，text 为空显示全部。
+        """
+        text = text.strip().lower()
+        if text == self._filter:
+            return
+        self.beginResetModel()
+        self._filter = text
+        self._order = self._filtered(self._sorted)
+        self._update_pos()
+        self.endResetModel()
+
+    def sync(self, pkgs_info):
+        """
+        让模型数据与 {包名: [当前版本, 最新版本, 状态]} 字典一致。
+        包名集合相同时只更新有变化的行；只新增了包名时在末尾添加行；
+        有包名被移除时重新载入全部数据。
+        """
+        if any(name not in pkgs_info for name in self._columns[0]):
+            self.load(pkgs_info)
+            return
+        for name, values in pkgs_info.items():
+            self.update(name, values)
@@ -0,0 +1,489 @@
+# coding: utf-8
+
+__doc__ = """包含运行子进程、取消正在执行的任务相关的类、函数。"""
+
+import os
+import selectors
+import signal
+import threading
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import Future
+from subprocess import DEVNULL, PIPE, STDOUT, Popen, run
+
+if os.name == "nt":
+    from subprocess import (
+        CREATE_NEW_PROCESS_GROUP,
+        STARTF_USESHOWWINDOW,
+        STARTUPINFO,
+        SW_HIDE,
+    )
+
+    _STARTUP = STARTUPINFO()
+    _STARTUP.dwFlags = STARTF_USESHOWWINDOW
+    _STARTUP.wShowWindow = SW_HIDE
+    # 子进程放入新的进程组，取消时连同其子进程一起结束
+    GROUP_KWARGS = {
+        "startupinfo": _STARTUP,
+        "creationflags": CREATE_NEW_PROCESS_GROUP,
+    }
+else:
+    GROUP_KWARGS = {"start_new_session": True}
+
+# 发送终止信号后等待进程组退出的秒数，超时则强制结束
+KILL_GRACE = 3
+# 子进程退出后，其遗留的子孙进程仍占用输出管道时继续读取的秒数
+DRAIN_TIMEOUT = 1
+
+# 子进程中移除的环境变量，避免本程序的运行环境影响目标解释器
+_UNPINNED_VARS = (
+    "PYTHONHOME",
+    "PYTHONPATH",
+    "PYTHONSTARTUP",
+    "PYTHONUSERBASE",
+    "PYTHONEXECUTABLE",
+    "__PYVENV_LAUNCHER__",
+    "PIP_REQUIRE_VIRTUALENV",
+)
+# 子进程中固定的环境变量，使输出编码、pip 的行为不受用户设置影响
+_PINNED_VARS = {
+    "PYTHONIOENCODING": "utf-8",
+    "PYTHONUTF8": "1",
+    "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+    "PIP_NO_INPUT": "1",
+    "PIP_NO_COLOR": "1",
+    "PIP_PROGRESS_BAR": "off",
+}
+
+
+class Cancelled(Exception):
+    """任务已被取消。"""
+
+
+class CancelToken:
+    """
+    在任务之间传递的取消标记。任务通过 attach 登记正在运行的子进程，
+    调用 cancel 后标记为已取消，并结束所有已登记子进程的整个进程组。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._procs = set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """取消任务，可在任意线程中调用，重复调用无影响。"""
+        with self._lock:
+            self._event.set()
+            procs = list(self._procs)
+        for proc in procs:
+            kill_group(proc)
+
+    def check(self):
+        """已取消时抛出 Cancelled 异常。"""
+        if self._event.is_set():
+            raise Cancelled()
+
+    def attach(self, proc):
+        """登记子进程，已取消时立即结束其进程组。"""
+        with self._lock:
+            if not self._event.is_set():
+                self._procs.add(proc)
+                return
+        kill_group(proc)
+
+    def detach(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    def wait(self, timeout=None):
+        """等待被取消，返回是否已取消。"""
+        return self._event.wait(timeout)
+
+
+def kill_group(proc, grace=KILL_GRACE):
+    """
+    结束以 GROUP_KWARGS 启动的子进程 proc 及其进程组中的所有进程。
+    先发送终止信号，grace 秒后再强制结束仍未退出的进程。
+    不等待、不回收子进程，子进程的退出状态仍由启动它的一方获取。
+    """
+    if proc.returncode is not None:
+        return
+    if os.name == "nt":
+        run(
+            ("taskkill", "/F", "/T", "/PID", str(proc.pid)),
+            stdout=DEVNULL,
+            stderr=DEVNULL,
+            startupinfo=_STARTUP,
+        )
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+
+    def force_kill():
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    timer = threading.Timer(grace, force_kill)
+    timer.daemon = True
+    timer.start()
+
+
+def pinned_env(interpreter="", extra=None):
+    """
+    返回运行子进程使用的环境变量字典：移除会改变目标解释器行为的变量，固定输出
+    编码及 pip 的非交互行为。
+    :param interpreter: str, 要运行的 Python 解释器路径，其所在目录放在 PATH 最前，
+    使构建过程中调用的 python、脚本与该解释器一致。
+    :param extra: dict or None, 额外设置的环境变量。
+    """
+    env = {k: v for k, v in os.environ.items() if k not in _UNPINNED_VARS}
+    env.update(_PINNED_VARS)
+    if interpreter:
+        bin_dir = os.path.dirname(os.path.abspath(interpreter))
+        env["PATH"] = os.pathsep.join((bin_dir, env.get("PATH", "")))
+    if extra:
+        env.update(extra)
+    return env
+
+
+class RunResult(
+    namedtuple(
+        "RunResult",
+        ("returncode", "output", "wall_time", "cpu_time", "max_rss", "timed_out"),
+        defaults=(False,),
+    )
+):
+    """
+    子进程的运行结果。
+    returncode: 返回码，无法启动或无法回收时为 -1，被信号结束时为负的信号值；
+    output: 标准输出及标准错误输出文本(keep_output 为 False 时为空字符串)；
+    wall_time、cpu_time: 运行用时、用户态与内核态 CPU 时间之和，单位秒；
+    max_rss: 峰值常驻内存，单位 KB，无法获取时为 0；
+    timed_out: 是否因超时被结束。
+    """
+
+    __slots__ = ()
+
+    def cost_text(self):
+        text = f"用时 {self.wall_time:.2f} 秒，CPU {self.cpu_time:.2f} 秒"
+        if self.max_rss:
+            text += f"，峰值内存 {self.max_rss / 1024:.1f} MB"
+        return text
+
+
+class _Job:
+    def __init__(self, proc, future, on_line, timeout, token, keep_output, label):
+        self.proc = proc
+        self.future = future
+        self.on_line = on_line
+        self.token = token
+        self.keep_output = keep_output
+        self.label = label
+        self.started = time.monotonic()
+        self.deadline = None if timeout is None else self.started + timeout
+        self.timed_out = False
+        self.buffer = bytearray()
+        self.lines = list()
+        self.eof = False
+        self.reaped_at = None
+        self.status = None
+        self.rusage = None
+
+    def feed(self, chunk):
+        self.buffer.extend(chunk)
+        *lines, rest = self.buffer.split(b"\n")
+        self.buffer = bytearray(rest)
+        for line in lines:
+            self._emit(line)
+
+    def flush(self):
+        if self.buffer:
+            self._emit(bytes(self.buffer))
+            self.buffer.clear()
+
+    def _emit(self, raw):
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+        if self.keep_output:
+            self.lines.append(line)
+        if self.on_line is not None:
+            try:
+                self.on_line(line)
+            except Exception:
+                traceback.print_exc()
+
+
+class ProcessRunner:
+    """
+    所有调用方共用的子进程运行器。子进程在新的进程组中启动，输出由同一个后台线程
+    通过 selectors 同时读取、按行分发，并由该线程用 os.wait4 回收，得到每个进程的
+    CPU 时间与峰值内存，不需要为每个子进程占用一个线程。
+    没有子进程运行时后台线程退出，下次提交时再启动。
+    Windows 上没有 os.wait4，管道也不能用 selectors 读取，改为每个子进程一个线程
+    读取，只统计运行用时。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._new_jobs = list()
+        self._jobs = list()
+        self._thread = None
+        self._selector = None
+        self._wakeup = None
+        self._stats = dict()
+
+    def submit(
+        self,
+        commands,
+        *,
+        on_line=None,
+        timeout=None,
+        token=None,
+        env=None,
+        cwd=None,
+        keep_output=True,
+        merge_stderr=True,
+        label="",
+    ):
+        """
+        启动命令 commands，立即返回 Future，其结果为 RunResult。
+        :param on_line: callable or None, 每读到一行输出(不含换行符)就在运行器线程中
+        以该行为参数调用。
+        :param timeout: int or float or None, 超过此秒数结束整个进程组。
+        :param token: CancelToken or None, 取消时结束整个进程组。
+        :param env: dict or None, 子进程的环境变量，None 则使用 pinned_env()。
+        :param keep_output: bool, 是否在结果中保留全部输出。
+        :param merge_stderr: bool, 是否把标准错误输出合并到输出中，否则丢弃。
+        :param label: str, 统计运行开销时使用的分类名，默认为命令的文件名。
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        label = label or os.path.basename(str(commands[0]))
+        if token is not None and token.cancelled:
+            future.set_result(RunResult(-1, "", 0.0, 0.0, 0))
+            return future
+        try:
+            proc = Popen(
+                commands,
+                stdin=DEVNULL,
+                stdout=PIPE,
+                stderr=STDOUT if merge_stderr else DEVNULL,
+                env=pinned_env() if env is None else env,
+                cwd=cwd,
+                **GROUP_KWARGS,
+            )
+        except Exception as e:
+            future.set_result(RunResult(-1, str(e), 0.0, 0.0, 0))
+            return future
+        job = _Job(proc, future, on_line, timeout, token, keep_output, label)
+        if token is not None:
+            token.attach(proc)
+        if os.name == "nt":
+            threading.Thread(
+                target=self._run_blocking, args=(job,), daemon=True
+            ).start()
+            return future
+        with self._lock:
+            self._new_jobs.append(job)
+            if self._thread is None:
+                self._selector = selectors.DefaultSelector()
+                self._wakeup = os.pipe()
+                self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+            else:
+                os.write(self._wakeup[1], b"\0")
+        return future
+
+    def run(self, commands, **kwargs):
+        """启动命令 commands 并等待其结束，参数与 submit 相同，返回 RunResult。"""
+        return self.submit(commands, **kwargs).result()
+
+    def _loop(self):
+        selector = self._selector
+        while True:
+            with self._lock:
+                for job in self._new_jobs:
+                    os.set_blocking(job.proc.stdout.fileno(), False)
+                    selector.register(job.proc.stdout, selectors.EVENT_READ, job)
+                self._jobs.extend(self._new_jobs)
+                self._new_jobs.clear()
+                if not self._jobs:
+                    self._thread = None
+                    selector.close()
+                    for fd in self._wakeup:
+                        os.close(fd)
+                    return
+            # 输出已读完的进程通常随即退出，缩短等待以尽快回收
+            waiting = any(j.eof and j.reaped_at is None for j in self._jobs)
+            for key, _ in selector.select(0.002 if waiting else 0.05):
+                if key.data is None:
+                    os.read(key.fd, 512)
+                    continue
+                job = key.data
+                try:
+                    chunk = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if chunk:
+                    job.feed(chunk)
+                else:
+                    self._close_output(job)
+            now = time.monotonic()
+            for job in list(self._jobs):
+                if (
+                    job.deadline is not None
+                    and not job.timed_out
+                    and now > job.deadline
+                ):
+                    job.timed_out = True
+                    kill_group(job.proc)
+                if job.reaped_at is None:
+                    self._reap(job, now)
+                if job.reaped_at is not None and (
+                    job.eof or now - job.reaped_at > DRAIN_TIMEOUT
+                ):
+                    self._close_output(job)
+                    self._finish(job)
+
+    def _close_output(self, job):
+        if job.eof:
+            return
+        job.eof = True
+        try:
+            self._selector.unregister(job.proc.stdout)
+        except Exception:
+            pass
+        job.proc.stdout.close()
+        job.flush()
+
+    def _reap(self, job, now):
+        try:
+            pid, status, rusage = os.wait4(job.proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            # 已被其他地方回收，无法得知其退出状态，按失败处理
+            job.reaped_at = now
+            job.rusage = None
+            job.proc.returncode = -1
+            return
+        if pid == 0:
+            return
+        job.reaped_at = now
+        job.status = status
+        job.rusage = rusage
+        job.proc.returncode = os.waitstatus_to_exitcode(status)
+
+    def _finish(self, job):
+        # running() 等方法在其他线程中持锁读取 _jobs
+        with self._lock:
+            self._jobs.remove(job)
+        wall = time.monotonic() - job.started
+        cpu = rss = 0
+        if job.rusage is not None:
+            cpu = job.rusage.ru_utime + job.rusage.ru_stime
+            rss = job.rusage.ru_maxrss
+        self._complete(job, wall, cpu, rss)
+
+    def _run_blocking(self, job):
+        timer = None
+        if job.deadline is not None:
+
+            def _expire():
+                job.timed_out = True
+                kill_group(job.proc)
+
+            timer = threading.Timer(job.deadline - job.started, _expire)
+            timer.daemon = True
+            timer.start()
+        for raw in job.proc.stdout:
+            job.feed(raw)
+        job.flush()
+        job.proc.wait()
+        if timer is not None:
+            timer.cancel()
+        self._complete(job, time.monotonic() - job.started, 0.0, 0)
+
+    def _complete(self, job, wall, cpu, rss):
+        if job.token is not None:
+            job.token.detach(job.proc)
+        result = RunResult(
+            job.proc.returncode, "\n".join(job.lines), wall, cpu, rss, job.timed_out
+        )
+        self.record(job.label, wall, cpu, rss)
+        job.future.set_result(result)
+
+    def record(self, label, wall, cpu=0.0, rss=0):
+        """
+        把一次运行的开销计入 label 分类的统计，
+        不经运行器执行的命令(如在 pip 工作进程中执行的命令)也可以用此方法计入。
+        """
+        with self._lock:
+            stats = self._stats.setdefault(
+                label,
+                {"count": 0, "wall_time": 0.0, "cpu_time": 0.0, "max_rss": 0},
+            )
+            stats["count"] += 1
+            stats["wall_time"] += wall
+            stats["cpu_time"] += cpu
+            stats["max_rss"] = max(stats["max_rss"], rss)
+
+    def stats(self):
+        """
+        返回按分类名汇总的运行开销：
+        {分类名: {"count": 次数, "wall_time": 总用时, "cpu_time": 总CPU时间,
+        "max_rss": 最大峰值内存}}。
+        """
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
+
+    def report(self, prefix=""):
+        """
+        返回分类名以 prefix 开头的各分类运行开销的说明文字，每个分类一行，
+        如 "pip install：3 次，用时 12.50 秒，CPU 8.20 秒，峰值内存 85.3 MB"。
+        """
+        lines = list()
+        for label, stats in sorted(self.stats().items()):
+            if not label.startswith(prefix):
+                continue
+            text = "{}：{} 次，用时 {:.2f} 秒，CPU {:.2f} 秒".format(
+                label, stats["count"], stats["wall_time"], stats["cpu_time"]
+            )
+            if stats["max_rss"]:
+                text += f"，峰值内存 {stats['max_rss'] / 1024:.1f} MB"
+            lines.append(text)
+        return "\n".join(lines)
+
+    def running(self):
+        """正在运行的子进程数量。"""
+        with self._lock:
+            return len(self._jobs) + len(self._new_jobs)
+
+
+# 所有模块共用的子进程运行器
+runner = ProcessRunner()
+
+
+def run_process(commands, **kwargs):
+    """用共享的运行器运行命令 commands 并等待结束，参数同 ProcessRunner.submit。"""
+    return runner.run(commands, **kwargs)
+
+
+def run_cancellable(commands, *, token=None, timeout=None, **kwargs):
+    """
+    在新的进程组中运行命令 commands，合并标准输出与标准错误输出。
+    token 被取消或超过 timeout 秒时结束整个进程组。
+    :return: tuple[int, str], (返回码, 输出文本)，无法运行时返回码为 -1。
+    """
+    result = run_process(commands, token=token, timeout=timeout, **kwargs)
+    return result.returncode, result.output
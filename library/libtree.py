@@ -0,0 +1,200 @@
+# coding: utf-8
+
+__doc__ = """包含列出项目目录中文件的类、函数。"""
+
+import fnmatch
+import os
+import re
+
+GITIGNORE = ".gitignore"
+VENV_CFG = "pyvenv.cfg"
+# 列出项目文件时不进入的目录名，可以使用通配符
+SKIP_DIRS = (
+    ".git",
+    ".hg",
+    ".svn",
+    ".tox",
+    ".nox",
+    ".venv",
+    ".idea",
+    ".vscode",
+    ".mypy_cache",
+    ".pytest_cache",
+    "__pycache__",
+    "venv",
+    "build",
+    "dist",
+    "node_modules",
+    "*.egg-info",
+)
+
+
+def _glob_regex(pattern):
+    """把 .gitignore 中的通配符模式转换为正则表达式字符串。"""
+    parts, index, size = [], 0, len(pattern)
+    while index < size:
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", index + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                chars = pattern[index + 1 : end].replace("\\", "\\\\")
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                parts.append(f"[{chars}]")
+                index = end
+        elif char == "\\" and index + 1 < size:
+            index += 1
+            parts.append(re.escape(pattern[index]))
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    return "".join(parts)
+
+
+def parse_gitignore(file_path, base=""):
+    """
+    读取 .gitignore 文件，返回规则列表，不支持的行忽略。
+    :param base: str, .gitignore 所在目录相对于项目根目录的路径，根目录为 ""。
+    :return: list[tuple], [(base, 正则表达式, 是否为排除规则(!), 是否只匹配目录,
+    是否匹配相对路径(否则只匹配名称)), ...]。
+    """
+    rules = []
+    try:
+        with open(file_path, "rt", encoding="utf-8", errors="replace") as fo:
+            lines = fo.read().splitlines()
+    except Exception:
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            continue
+        try:
+            regex = re.compile(_glob_regex(line) + "$")
+        except re.error:
+            continue
+        rules.append((base, regex, negate, dir_only, anchored))
+    return rules
+
+
+def _ignored(rules, rel_path, name, is_dir):
+    """按 rules 判断项目中相对路径为 rel_path 的文件或目录是否被忽略，后面的规则优先。"""
+    ignored = False
+    for base, regex, negate, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if not anchored:
+            target = name
+        elif not base:
+            target = rel_path
+        elif rel_path.startswith(base + "/"):
+            target = rel_path[len(base) + 1 :]
+        else:
+            continue
+        if regex.match(target):
+            ignored = not negate
+    return ignored
+
+
+class ProjectTree:
+    """
+    项目目录的文件索引，用 os.scandir 遍历一次，之后的各次查询共用遍历结果。
+    不进入 SKIP_DIRS 中的目录、含 pyvenv.cfg 的虚拟环境目录及符号链接目录，
+    跳过各级 .gitignore 忽略的文件和目录。根目录本身总是会被遍历。
+    """
+
+    def __init__(self, root, skip_dirs=SKIP_DIRS, use_gitignore=True):
+        self.root = root
+        self.skip_dirs = skip_dirs
+        self.use_gitignore = use_gitignore
+        # [(目录路径, [文件名...]), ...]，顺序与 os.walk 相同
+        self._dirs = None
+        # 遍历的目录数量、保留的文件数量、跳过的目录数量、跳过的文件数量
+        self.stats = {"dirs": 0, "files": 0, "skipped_dirs": 0, "skipped_files": 0}
+
+    def _skip_dir(self, name):
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.skip_dirs)
+
+    def _build(self):
+        self._dirs = []
+        # 栈中元素：(目录路径, 相对于根目录的路径, 适用的 .gitignore 规则)
+        stack = [(self.root, "", [])]
+        while stack:
+            dir_path, rel_dir, rules = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except Exception:
+                continue
+            names = {entry.name for entry in entries}
+            if rel_dir and VENV_CFG in names:
+                self.stats["skipped_dirs"] += 1
+                continue
+            self.stats["dirs"] += 1
+            if self.use_gitignore and GITIGNORE in names:
+                rules = rules + parse_gitignore(
+                    os.path.join(dir_path, GITIGNORE), rel_dir
+                )
+            files, subdirs = [], []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if (
+                        self._skip_dir(entry.name)
+                        or entry.is_symlink()
+                        or (rules and _ignored(rules, rel_path, entry.name, True))
+                    ):
+                        self.stats["skipped_dirs"] += 1
+                        continue
+                    subdirs.append((entry.path, rel_path, rules))
+                elif rules and _ignored(rules, rel_path, entry.name, False):
+                    self.stats["skipped_files"] += 1
+                else:
+                    files.append(entry.name)
+            self.stats["files"] += len(files)
+            self._dirs.append((dir_path, files))
+            stack.extend(reversed(subdirs))
+
+    def walk(self):
+        """产出 (目录路径, [文件名...])，与 os.walk 类似但不含子目录列表。"""
+        if self._dirs is None:
+            self._build()
+        yield from self._dirs
+
+    def files(self, pattern=None):
+        """
+        返回项目中文件的路径列表。
+        :param pattern: re.Pattern or None, 只返回文件名与之匹配的文件。
+        """
+        return [
+            os.path.join(dir_path, name)
+            for dir_path, names in self.walk()
+            for name in names
+            if pattern is None or pattern.match(name)
+        ]
@@ -0,0 +1,372 @@
+# coding: utf-8
+
+__doc__ = """包含本地共享 wheel 仓库(wheelhouse)相关的类、函数。"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from .libidx import SDIST_EXTS, canonical_name, file_version, version_key
+from .libpipw import pip_workers
+from .librun import pinned_env, run_process, runner
+
+DIST_EXTS = (".whl",) + SDIST_EXTS
+# 只有包名或用 == 固定版本的安装要求，其他写法无法不经 pip 判断要安装的版本
+_PINNED_NAME = re.compile(
+    r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:==\s*([^\s,;*]+))?\s*$"
+)
+
+
+def file_sha256(file_path):
+    """计算文件的 sha256 值，读取失败返回空字符串。"""
+    sha = hashlib.sha256()
+    try:
+        with open(file_path, "rb") as fo:
+            for chunk in iter(lambda: fo.read(1024 * 1024), b""):
+                sha.update(chunk)
+    except Exception:
+        return ""
+    return sha.hexdigest()
+
+
+def file_project(filename):
+    """从 wheel 或源码包文件名中解析规范化的项目名，不是这两类文件返回空字符串。"""
+    version = file_version(filename)
+    if version is None:
+        return ""
+    if filename.endswith(".whl"):
+        return canonical_name(filename.split("-", 1)[0])
+    return canonical_name(filename.rsplit("-", 1)[0])
+
+
+def run_pip(interpreter, *args, timeout=None, token=None):
+    """
+    用 interpreter 解释器在新的进程组中运行 pip 命令，环境变量按该解释器固定，
+    运行开销按 "pip 子命令" 分类计入共享运行器的统计。
+    启用了 pip 工作进程时在该环境的常驻工作进程中执行，不可用时再启动子进程。
+    :param token: CancelToken or None, 取消时结束 pip 及其子进程。
+    :return: tuple[int, str], (返回码, 标准输出及标准错误输出)，无法运行时返回码为 -1。
+    """
+    label = f"pip {args[0]}" if args else "pip"
+    start = time.monotonic()
+    result = pip_workers.call(interpreter, args, timeout=timeout, token=token)
+    if result is not None:
+        runner.record(label, time.monotonic() - start)
+        return result
+    result = run_process(
+        (interpreter, "-m", "pip") + args,
+        token=token,
+        timeout=timeout,
+        env=pinned_env(interpreter),
+        label=label,
+    )
+    return result.returncode, result.output
+
+
+class Wheelhouse:
+    """
+    多个 Python 环境共用的本地 wheel 仓库，安装包时先从镜像源下载到仓库中，
+    再用 pip install --find-links 从仓库安装，之后其他环境安装相同的包不再下载。
+    仓库目录结构：
+        blobs/<sha256前两位>/<sha256>  按内容哈希存放的文件；
+        links/<文件名>                  指向 blobs 中文件的硬链接，作为 --find-links 目录；
+        index.json                      文件名到哈希值、大小、最近使用时间的索引及统计数据。
+    仓库总大小超过 max_bytes 时按最近使用时间淘汰文件。
+    """
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.links_dir = os.path.join(root, "links")
+        self._index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _load(self):
+        if self._index is not None:
+            return
+        try:
+            with open(self._index_path, "rt", encoding="utf-8") as fo:
+                self._index = json.load(fo)
+        except Exception:
+            self._index = dict()
+        self._index.setdefault("files", dict())
+        self._index.setdefault(
+            "stats",
+            {"hits": 0, "misses": 0, "bytes_downloaded": 0, "bytes_saved": 0},
+        )
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.links_dir, exist_ok=True)
+
+    def _save(self):
+        tmp_path = self._index_path + ".tmp"
+        try:
+            with open(tmp_path, "wt", encoding="utf-8") as fo:
+                json.dump(self._index, fo, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self._index_path)
+        except Exception:
+            pass
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blobs_dir, sha256[:2], sha256)
+
+    def _link(self, blob_path, link_path):
+        if os.path.exists(link_path):
+            os.remove(link_path)
+        try:
+            os.link(blob_path, link_path)
+        except Exception:
+            shutil.copyfile(blob_path, link_path)
+
+    def ingest(self, download_dir, hash_lookup=None):
+        """
+        把 download_dir 中下载的文件按内容哈希存入仓库。
+        :param hash_lookup: callable or None, 以文件名为参数，返回镜像源公布的 sha256
+        值(未知返回空字符串)，哈希值不一致的文件不存入仓库。
+        :return: tuple[int, int], (新存入的字节数, 仓库中已有因而节省的字节数)。
+        """
+        # 计算哈希值、查询镜像源不需要持有锁
+        checked = list()
+        for filename in os.listdir(download_dir):
+            if not filename.endswith(DIST_EXTS):
+                continue
+            file_path = os.path.join(download_dir, filename)
+            sha256 = file_sha256(file_path)
+            if not sha256:
+                continue
+            expected = hash_lookup(filename) if hash_lookup else ""
+            if expected and expected != sha256:
+                continue
+            checked.append((filename, file_path, sha256))
+        added = saved = 0
+        with self._lock:
+            self._load()
+            files = self._index["files"]
+            for filename, file_path, sha256 in checked:
+                size = os.path.getsize(file_path)
+                blob_path = self._blob_path(sha256)
+                record = files.get(filename, None)
+                if (
+                    record is not None
+                    and record["sha256"] == sha256
+                    and os.path.isfile(blob_path)
+                ):
+                    saved += size
+                else:
+                    if record is not None and record["sha256"] != sha256:
+                        # 同名文件内容已改变，删除不再被引用的旧文件
+                        self._drop_blob(record["sha256"], filename)
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    if os.path.isfile(blob_path):
+                        saved += size
+                    else:
+                        shutil.move(file_path, blob_path)
+                        added += size
+                    self._link(blob_path, os.path.join(self.links_dir, filename))
+                files[filename] = {"sha256": sha256, "size": size, "used": time.time()}
+            self._index["stats"]["bytes_downloaded"] += added
+            self._index["stats"]["bytes_saved"] += saved
+            self._evict()
+            self._save()
+        return added, saved
+
+    def verify(self):
+        """
+        重新计算仓库中所有文件的哈希值，删除与索引记录不一致或已丢失的文件。
+        :return: list[str], 被删除的文件名列表。
+        """
+        removed = list()
+        with self._lock:
+            self._load()
+            files = self._index["files"]
+            for filename, record in list(files.items()):
+                link_path = os.path.join(self.links_dir, filename)
+                if file_sha256(link_path) != record["sha256"]:
+                    self._remove(filename)
+                    removed.append(filename)
+            self._save()
+        return removed
+
+    def _drop_blob(self, sha256, filename):
+        """删除哈希值为 sha256 的文件，除 filename 外还有其他记录引用时保留。"""
+        for name, record in self._index["files"].items():
+            if name != filename and record["sha256"] == sha256:
+                return
+        try:
+            os.remove(self._blob_path(sha256))
+        except Exception:
+            pass
+
+    def _remove(self, filename):
+        record = self._index["files"].pop(filename)
+        try:
+            os.remove(os.path.join(self.links_dir, filename))
+        except Exception:
+            pass
+        self._drop_blob(record["sha256"], filename)
+
+    def _evict(self):
+        files = self._index["files"]
+        total = sum(r["size"] for r in files.values())
+        for filename, record in sorted(files.items(), key=lambda x: x[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= record["size"]
+            self._remove(filename)
+
+    def has_all(self, names, latest):
+        """
+        仓库中是否已有 names 中各包要安装的版本的文件，有则不必先用 pip download 解析。
+        :param latest: callable, 以包名为参数，返回镜像源中适用的最新版本号，未知返回 None；
+        用 == 固定了版本的包使用固定的版本。
+        """
+        wanted = set()
+        for name in names:
+            matched = _PINNED_NAME.match(name)
+            if not matched:
+                return False
+            version = matched.group(2) or latest(matched.group(1))
+            if version is None:
+                return False
+            wanted.add((canonical_name(matched.group(1)), version_key(version)))
+        with self._lock:
+            self._load()
+            stored = {
+                (file_project(f), version_key(file_version(f)))
+                for f in self._index["files"]
+                if file_version(f) is not None
+            }
+        return wanted <= stored
+
+    def mark_used(self, pkgs_info):
+        """
+        更新被安装的文件的最近使用时间，安装成功后调用。
+        :param pkgs_info: iterable[tuple[str, str]], 本次新安装的(包名, 版本)元组。
+        :return: int, 这些文件的总字节数，即本次没有从镜像源下载的字节数。
+        """
+        installed = {(canonical_name(n), v) for n, v in pkgs_info}
+        now, used_bytes = time.time(), 0
+        with self._lock:
+            self._load()
+            for filename, record in self._index["files"].items():
+                if (file_project(filename), file_version(filename)) in installed:
+                    record["used"] = now
+                    used_bytes += record["size"]
+            self._save()
+        return used_bytes
+
+    def _count(self, **counts):
+        with self._lock:
+            self._load()
+            for name, value in counts.items():
+                self._index["stats"][name] += value
+            self._save()
+
+    def stats(self):
+        """返回仓库统计信息字典。"""
+        with self._lock:
+            self._load()
+            stats = dict(self._index["stats"])
+            stats["files"] = len(self._index["files"])
+            stats["bytes"] = sum(r["size"] for r in self._index["files"].values())
+        return stats
+
+    def install(
+        self,
+        interpreter,
+        names,
+        *,
+        index_url="",
+        pre=False,
+        user=False,
+        upgrade=False,
+        hash_lookup=None,
+        latest=None,
+        installed=None,
+        token=None,
+    ):
+        """
+        通过仓库安装 names 中的包。
+        仓库中已有各包在镜像源中的最新版本(由 latest 给出)时，只运行一次 pip，
+        直接从仓库安装(--no-index)，成功则计为命中。否则先用 pip download 按镜像源
+        解析出当前版本，仓库中已有的文件直接使用，缺少的下载到临时目录并存入仓库，
+        再从仓库安装；仍失败(如缺少构建依赖)时才允许 pip 同时从镜像源获取。
+        没有新下载任何文件时计为命中。
+        :param latest: callable or None, 以包名为参数返回镜像源中适用的最新版本号，
+        未知返回 None；为 None 时总是先运行 pip download。
+        :param installed: callable or None, 返回环境中已安装的(包名, 版本)元组列表，
+        用于找出本次安装用到的文件，更新其最近使用时间并统计节省的下载量。
+        :param token: CancelToken or None, 取消后结束正在运行的 pip，不再执行后续步骤。
+        :return: tuple[list, bool], 与 fastpip 的 PyEnv.install 返回值相同。
+        """
+        names = list(names)
+        common = ["--find-links", self.links_dir, "--disable-pip-version-check"]
+        if pre:
+            common.append("--pre")
+        install_args = ["install"] + common
+        if user:
+            install_args.append("--user")
+        if upgrade:
+            install_args.append("--upgrade")
+        with self._lock:
+            self._load()
+        before = set(installed()) if installed is not None else set()
+
+        def used_bytes():
+            if installed is None:
+                return 0
+            return self.mark_used(set(installed()) - before)
+
+        def cancelled():
+            return token is not None and token.cancelled
+
+        if latest is not None and self.has_all(names, latest):
+            # pip 默认只在需要时升级依赖，只需确认直接安装的包是最新版本；
+            # 缺少依赖等原因失败时再按下面的步骤下载
+            code, _ = run_pip(
+                interpreter, *install_args, "--no-index", *names, token=token
+            )
+            if code == 0:
+                self._count(hits=1, bytes_saved=used_bytes())
+                return names, True
+            if cancelled():
+                return names, False
+        index_args = ["--index-url", index_url] if index_url else []
+        download_dir = tempfile.mkdtemp(prefix="whl-", dir=self.root)
+        try:
+            # 按镜像源解析出当前应安装的版本，仓库中已有的文件直接复制，不重新下载
+            run_pip(
+                interpreter,
+                "download",
+                "--dest",
+                download_dir,
+                *common,
+                *index_args,
+                *names,
+                token=token,
+            )
+            # 取消前已下载完成的文件仍存入仓库，下次安装时可以直接使用
+            added, _ = self.ingest(download_dir, hash_lookup)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+        if cancelled():
+            return names, False
+        code, _ = run_pip(interpreter, *install_args, "--no-index", *names, token=token)
+        if code != 0 and not cancelled():
+            code, _ = run_pip(
+                interpreter, *install_args, *index_args, *names, token=token
+            )
+        if code == 0:
+            # 节省的下载量已由 ingest 统计，这里只更新最近使用时间
+            used_bytes()
+        if added:
+            self._count(misses=1)
+        elif code == 0:
+            self._count(hits=1)
+        return names, code == 0
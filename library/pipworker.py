@@ -0,0 +1,156 @@
+# coding: utf-8
+
+__doc__ = """
+在目标 Python 环境中常驻运行的 pip 工作进程，由 libpipw.PipWorker 用该环境的解释器
+启动，只依赖标准库和该环境中的 pip。
+注意：pip 不支持作为库在同一进程中多次调用(pip._internal 是内部接口，模块状态、
+日志配置等会保留到下一条命令)。因此支持 fork 的系统上每条命令都在从本进程 fork 出的
+新子进程中执行，子进程继承已导入的 pip 但不会把状态留给后续命令；不支持 fork 时在
+本进程中执行，每条命令前重置日志配置、pip 模块中的缓存、警告过滤器、环境变量和
+工作目录，这种情况下仍可能有未被重置的状态。
+协议(每行一个 JSON 对象)：
+    启动后输出 {"ready": true, "pip": pip 包的 __init__.py 路径, "version": pip 版本}；
+    标准输入每行一个请求 {"id": 编号, "args": [pip 命令参数...]}；
+    标准输出每行一个响应 {"id": 编号, "code": 返回码, "output": 输出文本}。
+标准输入关闭后退出。
+"""
+
+import importlib
+import io
+import json
+import logging
+import os
+import sys
+import traceback
+import warnings
+
+
+def _send(stream, obj):
+    stream.write(json.dumps(obj) + "\n")
+    stream.flush()
+
+
+def _refresh_metadata():
+    """使 pip 重新读取已安装包的信息，否则看不到本进程之前的命令所做的改动。"""
+    importlib.invalidate_caches()
+    pkg_resources = sys.modules.get("pip._vendor.pkg_resources", None)
+    if pkg_resources is not None:
+        pkg_resources.working_set = pkg_resources.WorkingSet._build_master()
+
+
+def _preload_commands():
+    """预先导入常用的 pip 命令模块，fork 出的子进程不必再导入。"""
+    try:
+        from pip._internal.commands import create_command
+
+        for name in ("install", "uninstall", "download", "list", "show", "config"):
+            create_command(name)
+    except Exception:
+        pass
+
+
+def _reset_state(environ, cwd, filters):
+    """在同一进程中执行下一条命令前，重置上一条命令留下的状态。"""
+    logging.disable(logging.NOTSET)
+    loggers = [logging.getLogger()]
+    loggers.extend(
+        logger
+        for logger in logging.root.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    )
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    for name, module in list(sys.modules.items()):
+        if module is None or not name.startswith("pip"):
+            continue
+        for value in list(vars(module).values()):
+            if callable(getattr(value, "cache_clear", None)):
+                try:
+                    value.cache_clear()
+                except Exception:
+                    pass
+    warnings.filters[:] = filters
+    os.environ.clear()
+    os.environ.update(environ)
+    os.chdir(cwd)
+
+
+def _run_forked(pip_main, args):
+    """在 fork 出的子进程中执行 pip 命令，结果经管道传回。"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            result = json.dumps(_run(pip_main, args)).encode("utf-8")
+            with io.open(write_fd, "wb") as fo:
+                fo.write(result)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    with io.open(read_fd, "rb") as fi:
+        data = fi.read()
+    os.waitpid(pid, 0)
+    try:
+        code, output = json.loads(data.decode("utf-8"))
+    except Exception:
+        code, output = 1, "pip 子进程意外退出"
+    return code, output
+
+
+def _run(pip_main, args):
+    _refresh_metadata()
+    buffer = io.StringIO()
+    saved = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(), buffer, buffer
+    try:
+        code = pip_main(list(args))
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except BaseException:
+        traceback.print_exc(file=buffer)
+        code = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved
+    return code or 0, buffer.getvalue()
+
+
+def main():
+    # 协议使用原标准输出，文件描述符1改指向标准错误输出，
+    # 防止 pip 启动的子进程继承后向协议流中写入内容
+    protocol = io.open(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    try:
+        import pip
+        from pip._internal.cli.main import main as pip_main
+    except Exception:
+        _send(protocol, {"ready": False, "error": traceback.format_exc()})
+        return 1
+    _send(
+        protocol,
+        {
+            "ready": True,
+            "pip": os.path.abspath(pip.__file__),
+            "version": pip.__version__,
+        },
+    )
+    forking = hasattr(os, "fork")
+    if forking:
+        _preload_commands()
+    environ, cwd, filters = dict(os.environ), os.getcwd(), warnings.filters[:]
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if forking:
+            code, output = _run_forked(pip_main, request.get("args", ()))
+        else:
+            _reset_state(environ, cwd, filters)
+            code, output = _run(pip_main, request.get("args", ()))
+        _send(protocol, {"id": request.get("id"), "code": code, "output": output})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
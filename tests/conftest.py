@@ -0,0 +1,36 @@
+# coding: utf-8
+
+import os
+import sys
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeEnv:
+    """代替 PyEnv 的环境，不启动解释器，py_facts、imports 返回固定的内容。"""
+
+    def __init__(self, env_path, site_dir=None):
+        self.env_path = env_path
+        self._site_dir = site_dir
+
+    def py_facts(self):
+        return {"sys_path": [self._site_dir] if self._site_dir else []}
+
+    def imports(self):
+        return ["os", "sys"]
+
+
+def bump_mtime(path):
+    """把文件或目录的修改时间推后一秒，使以修改时间判断的缓存失效。"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """所有测试共用的 QApplication，没有显示器时使用 offscreen 平台。"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return QApplication.instance() or QApplication([])
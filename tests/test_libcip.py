@@ -0,0 +1,286 @@
+# coding: utf-8
+
+import os
+
+import pytest
+from conftest import FakeEnv, bump_mtime
+
+from library import libcip
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """返回 (项目目录, 缓存, 各查找方式读取的文件名列表)。"""
+    root = tmp_path / "proj"
+    root.mkdir()
+    (root / "a.py").write_text("import os\nimport requests\n", encoding="utf-8")
+    (root / "b.py").write_text("from sys import path\n", encoding="utf-8")
+    cache = libcip.ImportScanCache(str(tmp_path / "cache"))
+    scanned = []
+
+    def wrap(name):
+        extractor = libcip.IMPORT_EXTRACTORS[name]
+
+        def counted(string):
+            scanned.append(name)
+            return extractor(string)
+
+        return counted
+
+    for name in ("stmt", "ast"):
+        monkeypatch.setitem(libcip.IMPORT_EXTRACTORS, name, wrap(name))
+    monkeypatch.setattr(libcip, "import_scan_cache", cache)
+    monkeypatch.setattr(libcip, "PyEnv", FakeEnv)
+    return root, cache, scanned
+
+
+def _missing(root, engine="stmt"):
+    inspector = libcip.ImportInspector("", str(root), engine=engine)
+    return {
+        os.path.basename(path): (imps, missing)
+        for path, imps, missing in inspector.missing_items(workers=1)
+    }
+
+
+def test_second_scan_uses_cache(project):
+    root, cache, scanned = project
+    first = _missing(root)
+    assert first == {
+        "a.py": ({"os", "requests"}, {"requests"}),
+        "b.py": ({"sys"}, set()),
+    }
+    assert len(scanned) == 2
+    assert sorted(cache.load(str(root), "stmt")) == ["a.py", "b.py"]
+    assert _missing(root) == first
+    assert len(scanned) == 2
+
+
+def test_modified_file_is_rescanned(project):
+    root, cache, scanned = project
+    _missing(root)
+    (root / "b.py").write_text("import numpy, sys\n", encoding="utf-8")
+    bump_mtime(root / "b.py")
+    result = _missing(root)
+    assert scanned == ["stmt"] * 3
+    assert result["b.py"] == ({"numpy", "sys"}, {"numpy"})
+    assert cache.load(str(root), "stmt")["b.py"][4] == ["numpy", "sys"]
+
+
+def test_touched_file_reuses_names_by_sha1(project):
+    root, cache, scanned = project
+    _missing(root)
+    bump_mtime(root / "a.py")
+    mtime_ns = os.stat(root / "a.py").st_mtime_ns
+    assert _missing(root)["a.py"] == ({"os", "requests"}, {"requests"})
+    assert len(scanned) == 2
+    assert cache.load(str(root), "stmt")["a.py"][1] == mtime_ns
+
+
+def test_deleted_file_is_dropped(project):
+    root, cache, scanned = project
+    _missing(root)
+    (root / "b.py").unlink()
+    assert list(_missing(root)) == ["a.py"]
+    assert list(cache.load(str(root), "stmt")) == ["a.py"]
+
+
+def test_new_file_is_scanned_alone(project):
+    root, cache, scanned = project
+    _missing(root)
+    (root / "c.py").write_text("import yaml\n", encoding="utf-8")
+    assert _missing(root)["c.py"] == ({"yaml"}, {"yaml"})
+    assert len(scanned) == 3
+
+
+def test_engine_change_invalidates_cache(project):
+    root, cache, scanned = project
+    _missing(root)
+    assert cache.load(str(root), "ast") == {}
+    _missing(root, engine="ast")
+    assert scanned == ["stmt", "stmt", "ast", "ast"]
+    assert cache.load(str(root), "stmt") == {}
+    _missing(root, engine="ast")
+    assert len(scanned) == 4
+
+
+def test_corrupt_cache_file_is_ignored(project):
+    root, cache, scanned = project
+    _missing(root)
+    with open(cache._file_path(str(root)), "wt", encoding="utf-8") as fo:
+        fo.write("{not json")
+    assert cache.load(str(root), "stmt") == {}
+    assert _missing(root)["a.py"] == ({"os", "requests"}, {"requests"})
+    assert len(scanned) == 4
+
+
+def test_unreadable_and_undecodable_files_are_reported(project):
+    root, cache, scanned = project
+    os.symlink(str(root / "missing.py"), str(root / "broken.py"))
+    (root / "binary.py").write_bytes(b"\x00\xff\x00\xfe\x81")
+    result = _missing(root)
+    assert result["broken.py"] == (None, None)
+    assert result["binary.py"] == (None, None)
+    assert result["a.py"] == ({"os", "requests"}, {"requests"})
+    # 再次检查时仍然报告
+    assert _missing(root)["binary.py"] == (None, None)
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"\xef\xbb\xbfimport os\n", ("utf-8-sig", "import os\n", "bom")),
+        ("import os\n".encode("utf-16"), ("utf-16", "import os\n", "bom")),
+        ("import os\n".encode("utf-32"), ("utf-32", "import os\n", "bom")),
+        (
+            "# coding: gbk\ns = '中文'\n".encode("gbk"),
+            ("gbk", "# coding: gbk\ns = '中文'\n", "cookie"),
+        ),
+        (
+            "#!/usr/bin/env python\n# -*- coding: latin-1 -*-\nx = 'é'\n".encode(
+                "latin-1"
+            ),
+            (
+                "iso8859-1",
+                "#!/usr/bin/env python\n# -*- coding: latin-1 -*-\nx = 'é'\n",
+                "cookie",
+            ),
+        ),
+        ("s = '中文'\n".encode("utf-8"), ("utf-8", "s = '中文'\n", "utf8")),
+        (b"", ("utf-8", "", "utf8")),
+    ],
+)
+def test_decode_source(data, expected):
+    assert libcip.decode_source(data) == expected
+
+
+def test_cookie_after_second_line_is_ignored():
+    data = b"\n\n# coding: latin-1\nx = 1\n"
+    assert libcip.decode_source(data)[2] == "utf8"
+
+
+def test_invalid_cookie_falls_back_to_utf8():
+    data = "# coding: no-such-codec\ns = '中文'\n".encode("utf-8")
+    assert libcip.decode_source(data) == ("utf-8", data.decode("utf-8"), "utf8")
+
+
+def test_non_utf8_without_cookie_uses_chardet():
+    text = "# 中文注释，用于检测编码。\n" * 20
+    encoding, string, how = libcip.decode_source(text.encode("gb18030"))
+    assert how == "chardet"
+    assert encoding is not None
+    assert string == text
+
+
+def test_detect_encoding_counts_detections(tmp_path):
+    path = tmp_path / "a.py"
+    path.write_bytes(b"\xef\xbb\xbfimport os\n")
+    before = libcip.detection_stats()
+    assert libcip.detect_encoding(str(path)) == "utf-8-sig"
+    assert libcip.detect_encoding(str(tmp_path / "missing.py")) is None
+    after = libcip.detection_stats()
+    assert after["bom"] == before["bom"] + 1
+    assert sum(after.values()) == sum(before.values()) + 1
+
+
+_SOURCE = '''\
+import os, sys as system
+import xml.etree.ElementTree as ET
+from collections import (
+    OrderedDict,
+    defaultdict,
+)
+from . import sibling
+from .pkg.mod import thing
+import json; import re
+from urllib.parse import \\
+    urlparse
+
+# import commented
+text = """
+import in_docstring
+"""
+value = "import in_string"
+
+
+def func():
+    import inner
+    if True: import inline
+
+
+class Klass:
+    from typing import List
+'''
+
+_EXPECTED = {
+    "os",
+    "sys",
+    "xml",
+    "collections",
+    "pkg",
+    "json",
+    "re",
+    "urllib",
+    "inner",
+    "inline",
+    "typing",
+}
+
+
+@pytest.mark.parametrize("name", ["stmt", "ast"])
+def test_extractors_agree_with_ast(name):
+    assert libcip.IMPORT_EXTRACTORS[name](_SOURCE) == _EXPECTED
+
+
+def test_tokenize_imports_matches_ast():
+    assert libcip.tokenize_imports(_SOURCE) == _EXPECTED
+
+
+def test_regex_imports_top_level_statements():
+    found = libcip.regex_imports("import os, sys\nfrom json import loads\n")
+    assert found == {"os", "sys", "json"}
+
+
+def test_invalid_syntax_still_finds_imports():
+    source = "import os\nprint 'python2'\nfrom yaml import load\n"
+    assert libcip.ast_imports(source) == {"os", "yaml"}
+    assert libcip.statement_imports(source) == {"os", "yaml"}
+    assert libcip.tokenize_imports(source) == {"os", "yaml"}
+
+
+def test_unterminated_string_returns_found_imports():
+    source = "import os\ns = '''never closed\nimport late\n"
+    assert "os" in libcip.tokenize_imports(source)
+    assert "os" in libcip.statement_imports(source)
+
+
+def test_names_that_only_look_like_imports():
+    source = "important = 1\nfromage = important\nx.import_thing()\n"
+    for name in ("stmt", "ast", "regex"):
+        assert libcip.IMPORT_EXTRACTORS[name](source) == set(), name
+
+
+def test_parallel_scan_matches_serial(tmp_path, monkeypatch):
+    root = tmp_path / "proj"
+    root.mkdir()
+    for i in range(12):
+        (root / f"m{i}.py").write_text(
+            f"import os\nimport pkg{i}\nfrom sys import path\n", encoding="utf-8"
+        )
+    (root / "gbk.py").write_bytes("# coding: gbk\nimport 中文\n".encode("gbk"))
+    monkeypatch.setattr(libcip, "PyEnv", FakeEnv)
+    monkeypatch.setattr(libcip.ImportInspector, "PARALLEL_MIN_FILES", 4)
+    monkeypatch.setattr(libcip.ImportInspector, "CHUNK_SIZE", 3)
+    serial = libcip.ImportInspector("", str(root), use_cache=False)
+    expected = sorted(serial.missing_items(workers=1), key=lambda x: x[0])
+    before = libcip.detection_stats()
+    parallel = libcip.ImportInspector("", str(root), use_cache=False)
+    found = sorted(parallel.missing_items(workers=3), key=lambda x: x[0])
+    assert found == expected
+    assert len(found) == 13
+    missing = {os.path.basename(path): names for path, _, names in found}
+    assert missing["m5.py"] == {"pkg5"}
+    assert missing["gbk.py"] == {"中文"}
+    after = libcip.detection_stats()
+    # 工作进程中的编码检测次数也汇总到本进程
+    assert sum(after.values()) - sum(before.values()) == 13
+    assert after["cookie"] - before["cookie"] == 1
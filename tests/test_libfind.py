@@ -0,0 +1,117 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+from library import libfind
+
+
+def _make_python(dir_path, name="python3"):
+    dir_path.mkdir(parents=True, exist_ok=True)
+    exe = dir_path / name
+    exe.write_text("#!/bin/sh\n", encoding="utf-8")
+    exe.chmod(0o755)
+    return exe
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """根目录下有系统解释器、venv、conda 环境及应跳过的目录。"""
+    root = tmp_path / "root"
+    _make_python(root / "usr" / "bin")
+    venv = root / "home" / "proj" / ".venv"
+    (venv / "lib" / "python3.10" / "site-packages").mkdir(parents=True)
+    (venv / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+    _make_python(venv / "bin")
+    _make_python(venv / "lib" / "deep" / "bin")
+    conda = root / "opt" / "conda"
+    (conda / "conda-meta").mkdir(parents=True)
+    _make_python(conda / "bin")
+    _make_python(conda / "envs" / "py39" / "bin", "python3.9")
+    _make_python(root / "home" / "node_modules" / "bin")
+    _make_python(root / "home" / ".hidden" / "bin")
+    return root
+
+
+def _finder(root, cache=None, depth=4):
+    return libfind.PyFinder(cache=cache, roots=[(str(root), depth)])
+
+
+def test_find_interpreter_dirs(tree):
+    found = _finder(tree).find()
+    assert sorted(os.path.relpath(p, tree) for p in found) == [
+        "home/proj/.venv/bin",
+        "opt/conda/bin",
+        "opt/conda/envs/py39/bin",
+        "usr/bin",
+    ]
+
+
+def test_find_respects_depth(tree):
+    opt, conda = tree / "opt", tree / "opt" / "conda"
+    assert _finder(opt, depth=0).find() == []
+    # 环境根目录中的 bin、envs 目录不受深度限制
+    assert _finder(opt, depth=1).find() == [str(conda / "bin")]
+    assert _finder(opt, depth=3).find() == [
+        str(conda / "bin"),
+        str(conda / "envs" / "py39" / "bin"),
+    ]
+
+
+def test_rescan_lists_only_changed_dirs(tree):
+    cache = dict()
+    first = _finder(tree, cache)
+    found = first.find()
+    assert first.changed and first.listed == first.stated
+    second = _finder(tree, cache)
+    assert second.find() == found
+    assert not second.changed
+    assert second.listed == 0 and second.stated == first.stated
+    _make_python(tree / "opt" / "py311" / "bin")
+    third = _finder(tree, cache)
+    assert str(tree / "opt" / "py311" / "bin") in third.find()
+    # 只有新增的两个目录和修改时间改变的 opt 目录需要重新列出
+    assert third.changed and third.listed == 3
+
+
+def test_removed_dirs_are_dropped_from_cache(tree):
+    cache = dict()
+    _finder(tree, cache).find()
+    conda_bin = tree / "opt" / "conda" / "envs" / "py39" / "bin"
+    (conda_bin / "python3.9").unlink()
+    conda_bin.rmdir()
+    finder = _finder(tree, cache)
+    assert str(conda_bin) not in finder.find()
+    assert str(conda_bin) not in cache and finder.changed
+
+
+def test_duplicates_and_shims_are_skipped(tree):
+    (tree / "bin").symlink_to(tree / "usr" / "bin")
+    _make_python(tree / "pyenv" / "shims")
+    finder = libfind.PyFinder(
+        roots=[(str(tree / "usr" / "bin"), 0), (str(tree / "bin"), 0)]
+        + [(str(tree / "pyenv"), 1)]
+    )
+    assert finder.find() == [str(tree / "usr" / "bin")]
+
+
+def test_has_interpreter_accepts_env_roots(tree):
+    assert libfind.has_interpreter(str(tree / "usr" / "bin"))
+    assert libfind.has_interpreter(str(tree / "home" / "proj" / ".venv"))
+    assert libfind.has_interpreter(str(tree / "opt" / "conda"))
+    assert not libfind.has_interpreter(str(tree / "home"))
+    assert not libfind.has_interpreter(str(tree / "missing"))
+
+
+def test_find_interpreter_prefers_python3(tmp_path):
+    bin_dir = tmp_path / "bin"
+    _make_python(bin_dir, "python3.11")
+    assert libfind.find_interpreter(str(bin_dir)) == str(bin_dir / "python3.11")
+    _make_python(bin_dir, "python")
+    assert libfind.find_interpreter(str(bin_dir)) == str(bin_dir / "python")
+    _make_python(bin_dir, "python3")
+    assert libfind.find_interpreter(str(bin_dir)) == str(bin_dir / "python3")
+    (tmp_path / "pyvenv.cfg").write_text("", encoding="utf-8")
+    assert libfind.find_interpreter(str(tmp_path)) == str(bin_dir / "python3")
+    assert libfind.find_interpreter(str(tmp_path / "missing")) == ""
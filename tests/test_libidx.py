@@ -0,0 +1,418 @@
+# coding: utf-8
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from library import libidx
+
+
+def test_canonical_name():
+    assert libidx.canonical_name("Foo_Bar.baz--Qux") == "foo-bar-baz-qux"
+
+
+def test_version_key_pep440_order():
+    ordered = [
+        "1.0.dev1",
+        "1.0a1",
+        "1.0a2.dev1",
+        "1.0a2",
+        "1.0b1",
+        "1.0rc1",
+        "1.0",
+        "1.0+local.1",
+        "1.0.post1.dev1",
+        "1.0.post1",
+        "1.0.1",
+        "1.10",
+        "1!0.1",
+    ]
+    assert sorted(reversed(ordered), key=libidx.version_key) == ordered
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        ("1.0", "1.0.0"),
+        ("1.0", "v1.0"),
+        ("1.0a1", "1.0alpha1"),
+        ("1.0rc1", "1.0c1"),
+        ("1.0-1", "1.0.post1"),
+        ("1.0.post", "1.0.post0"),
+    ],
+)
+def test_version_key_equivalent_spellings(left, right):
+    assert libidx.version_key(left) == libidx.version_key(right)
+
+
+def test_version_key_legacy_versions_sort_first():
+    assert libidx.version_key("not-a-version") < libidx.version_key("0.0.1")
+    assert max(["2.0", "foo", "10.0"], key=libidx.version_key) == "10.0"
+
+
+def test_is_prerelease():
+    assert libidx.is_prerelease("1.0b2")
+    assert libidx.is_prerelease("1.0.dev3")
+    assert not libidx.is_prerelease("1.0.post1")
+    assert not libidx.is_prerelease("legacy")
+
+
+@pytest.mark.parametrize(
+    "requires, py_version, expected",
+    [
+        ("", "3.8.10", True),
+        (">=3.8", "", True),
+        (">=3.8", "3.8.10", True),
+        (">=3.9", "3.8.10", False),
+        (">=3.6, <4", "3.11.2", True),
+        ("<3.8", "3.8.0", False),
+        ("!=3.8.*", "3.8.10", False),
+        ("!=3.8.*", "3.9.1", True),
+        ("==3.*", "3.12.0", True),
+        ("==2.7.*", "3.8.0", False),
+        ("~=3.7", "3.11.0", True),
+        ("~=3.7.2", "3.7.5", True),
+        ("~=3.7.2", "3.8.0", False),
+        (">=3.8,,", "3.8.0", True),
+        ("garbage", "3.8.0", True),
+        (">= 3.7", "3.7.0", True),
+    ],
+)
+def test_python_matches(requires, py_version, expected):
+    assert libidx.python_matches(requires, py_version) is expected
+
+
+@pytest.mark.parametrize(
+    "filename, version",
+    [
+        ("demo_pkg-1.2.3-py3-none-any.whl", "1.2.3"),
+        ("demo_pkg-1.2.3-1-cp38-cp38-manylinux1_x86_64.whl", "1.2.3"),
+        ("demo-pkg-0.9rc1.tar.gz", "0.9rc1"),
+        ("demo.zip", None),
+        ("demo-1.0.exe", None),
+    ],
+)
+def test_file_version(filename, version):
+    assert libidx.file_version(filename) == version
+
+
+def test_parse_project_json():
+    text = json.dumps(
+        {
+            "files": [
+                {
+                    "filename": "demo-1.0-py3-none-any.whl",
+                    "url": "https://example.org/demo-1.0-py3-none-any.whl",
+                    "hashes": {"sha256": "abc"},
+                    "requires-python": ">=3.8",
+                },
+                {
+                    "filename": "demo-0.9.tar.gz",
+                    "url": "https://example.org/demo-0.9.tar.gz",
+                    "hashes": {},
+                    "requires-python": None,
+                    "yanked": "broken",
+                },
+            ]
+        }
+    )
+    assert libidx.parse_project_json(text) == [
+        {
+            "filename": "demo-1.0-py3-none-any.whl",
+            "url": "https://example.org/demo-1.0-py3-none-any.whl",
+            "hashes": {"sha256": "abc"},
+            "requires_python": ">=3.8",
+            "yanked": False,
+        },
+        {
+            "filename": "demo-0.9.tar.gz",
+            "url": "https://example.org/demo-0.9.tar.gz",
+            "hashes": {},
+            "requires_python": "",
+            "yanked": True,
+        },
+    ]
+
+
+def test_parse_project_html():
+    text = """<!DOCTYPE html><html><body>
+    <a href="../../files/demo-1.0-py3-none-any.whl#sha256=abc"
+       data-requires-python="&gt;=3.8">demo-1.0-py3-none-any.whl</a><br/>
+    <a href='/files/demo-0.9.tar.gz' data-yanked="">demo-0.9.tar.gz</a>
+    <a href=/files/demo%2D0.8.zip></a>
+    </body></html>"""
+    assert libidx.parse_project_html(text) == [
+        {
+            "filename": "demo-1.0-py3-none-any.whl",
+            "url": "../../files/demo-1.0-py3-none-any.whl#sha256=abc",
+            "hashes": {"sha256": "abc"},
+            "requires_python": ">=3.8",
+            "yanked": False,
+        },
+        {
+            "filename": "demo-0.9.tar.gz",
+            "url": "/files/demo-0.9.tar.gz",
+            "hashes": {},
+            "requires_python": "",
+            "yanked": True,
+        },
+        {
+            "filename": "demo-0.8.zip",
+            "url": "/files/demo%2D0.8.zip",
+            "hashes": {},
+            "requires_python": "",
+            "yanked": False,
+        },
+    ]
+
+
+def test_latest_version_skips_yanked_pre_and_python():
+    files = [
+        {"filename": name, "requires_python": requires, "yanked": yanked}
+        for name, requires, yanked in [
+            ("demo-1.0.tar.gz", "", False),
+            ("demo-1.1-py3-none-any.whl", "", False),
+            ("demo-1.2-py3-none-any.whl", ">=3.10", False),
+            ("demo-1.3-py3-none-any.whl", "", True),
+            ("demo-2.0b1-py3-none-any.whl", "", False),
+            ("demo-index.html", "", False),
+        ]
+    ]
+    assert libidx.latest_version(files, "3.8.10") == "1.1"
+    assert libidx.latest_version(files, "3.11.0") == "1.2"
+    assert libidx.latest_version(files, "3.11.0", pre=True) == "2.0b1"
+    assert libidx.latest_version([], "3.8.10") is None
+
+
+@pytest.mark.parametrize(
+    "requires",
+    ["~=2.0", "~=3.10.0", "~=3.12", "~=3.11.8"],
+)
+def test_python_matches_compatible_release_keeps_written_zeros(requires):
+    assert libidx.python_matches(requires, "3.11.7") is False
+
+
+@pytest.mark.parametrize("requires", ["~=3.6.*", "~=3", "~=abc"])
+def test_python_matches_skips_invalid_compatible_release(requires):
+    assert libidx.python_matches(requires, "3.11.7") is True
+    assert libidx.python_matches(requires + ", <3.8", "3.11.7") is False
+
+
+class _Index:
+    """测试用的本地 simple 镜像源，pages 为 {项目名: (Content-Type, 页面内容)}。"""
+
+    def __init__(self):
+        self.pages = dict()
+        # 收到的请求：[(路径, 客户端端口, If-None-Match 请求头)...]
+        self.requests = list()
+        self.delay = 0
+        self.use_gzip = False
+
+    def add_json(self, project, *filenames, requires_python=""):
+        files = [
+            {
+                "filename": name,
+                "url": f"../../files/{name}",
+                "hashes": {},
+                "requires-python": requires_python,
+            }
+            for name in filenames
+        ]
+        self.pages[project] = (
+            "application/vnd.pypi.simple.v1+json",
+            json.dumps({"files": files}),
+        )
+
+    def add_html(self, project, *filenames):
+        anchors = "".join(f'<a href="/files/{n}">{n}</a>' for n in filenames)
+        self.pages[project] = ("text/html; charset=utf-8", anchors)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    """启动一个本地 HTTP 服务器作为镜像源，返回 (_Index, 镜像源地址)。"""
+    monkeypatch.setenv("no_proxy", "*")
+    monkeypatch.setenv("NO_PROXY", "*")
+    state = _Index()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, headers=(), body=b""):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            etag = self.headers.get("If-None-Match", "")
+            state.requests.append((self.path, self.client_address[1], etag))
+            if state.delay:
+                time.sleep(state.delay)
+            if self.path.startswith("/old/"):
+                self._send(301, [("Location", self.path[4:])])
+                return
+            project = self.path.strip("/").rpartition("/")[2]
+            if not self.path.startswith("/simple/") or project not in state.pages:
+                self._send(404)
+                return
+            content_type, text = state.pages[project]
+            tag = '"{}"'.format(hash(text) & 0xFFFFFFFF)
+            if etag == tag:
+                self._send(304, [("ETag", tag)])
+                return
+            body, headers = text.encode("utf-8"), [("Content-Type", content_type)]
+            if state.use_gzip:
+                body = gzip.compress(body)
+                headers.append(("Content-Encoding", "gzip"))
+            self._send(200, headers + [("ETag", tag)], body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield state, "http://127.0.0.1:{}/simple".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_parses_json_and_html_pages(index):
+    state, url = index
+    state.add_json("demo-pkg", "demo_pkg-1.0-py3-none-any.whl")
+    state.add_html("other", "other-2.0.tar.gz")
+    client = libidx.IndexClient()
+    try:
+        files = client.project_files(url, "Demo_Pkg")
+        assert [f["url"] for f in files] == [
+            url.rpartition("/")[0] + "/files/demo_pkg-1.0-py3-none-any.whl"
+        ]
+        files = client.project_files(url, "other")
+        assert [f["filename"] for f in files] == ["other-2.0.tar.gz"]
+        assert files[0]["url"].startswith("http://127.0.0.1:")
+        assert client.project_files(url, "missing") is None
+    finally:
+        client.close()
+    assert [r[0] for r in state.requests] == [
+        "/simple/demo-pkg/",
+        "/simple/other/",
+        "/simple/missing/",
+    ]
+    # 保持连接，三个请求使用同一个连接
+    assert len({r[1] for r in state.requests}) == 1
+
+
+def test_client_follows_redirects_and_gzip(index):
+    state, url = index
+    state.add_json("demo", "demo-1.0.tar.gz")
+    state.use_gzip = True
+    client = libidx.IndexClient()
+    try:
+        status, headers, body, final_url = client.request(
+            url.replace("/simple", "/old/simple") + "/demo/"
+        )
+    finally:
+        client.close()
+    assert status == 200
+    assert final_url == url + "/demo/"
+    assert json.loads(body)["files"][0]["filename"] == "demo-1.0.tar.gz"
+
+
+def test_check_outdated_reports_newer_versions(index):
+    state, url = index
+    state.add_json("old", "old-1.0.tar.gz", "old-1.5-py3-none-any.whl")
+    state.add_json("current", "current-2.0.tar.gz")
+    state.add_json("py-only", "py_only-9.0.tar.gz", requires_python=">=3.12")
+    state.add_html("pre", "pre-1.0.tar.gz", "pre-2.0b1.tar.gz", "pre-2.1a1.tar.gz")
+    pkgs_info = [
+        ("old", "1.0"),
+        ("current", "2.0"),
+        ("py-only", "1.0"),
+        ("pre", "2.0b1"),
+        ("unknown", "1.0"),
+    ]
+    found = sorted(libidx.check_outdated(pkgs_info, url, "3.8.10", max_workers=3))
+    assert found == [("old", "1.0", "1.5"), ("pre", "2.0b1", "2.1a1")]
+    assert len(state.requests) == len(pkgs_info)
+
+
+def test_index_cache_hit_and_etag_revalidation(index, tmp_path):
+    state, url = index
+    state.add_json("demo", "demo-1.0.tar.gz")
+    cache = libidx.IndexCache(str(tmp_path / "cache"), ttl=600)
+    client = libidx.IndexClient(cache=cache)
+    try:
+        first = client.project_files(url, "demo")
+        assert client.project_files(url, "demo") == first
+        assert len(state.requests) == 1
+        cache.ttl = 0
+        assert client.project_files(url, "demo") == first
+        assert state.requests[-1][2] != ""
+        state.add_json("demo", "demo-1.0.tar.gz", "demo-1.1.tar.gz")
+        files = client.project_files(url, "demo")
+    finally:
+        client.close()
+    assert [f["filename"] for f in files] == ["demo-1.0.tar.gz", "demo-1.1.tar.gz"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["revalidated"], stats["misses"]) == (1, 1, 2)
+    assert stats["entries"] == 1
+
+
+def test_index_cache_persists_and_expires(index, tmp_path):
+    state, url = index
+    state.add_json("demo", "demo-1.0.tar.gz")
+    cache_dir = str(tmp_path / "cache")
+    client = libidx.IndexClient(cache=libidx.IndexCache(cache_dir))
+    client.project_files(url, "demo")
+    client.close()
+    cache = libidx.IndexCache(cache_dir)
+    record = cache.get(url, "DEMO")
+    assert record is not None and cache.is_fresh(record)
+    assert cache.stats()["entries"] == 1
+    record["stored"] -= cache.ttl + 1
+    assert not cache.is_fresh(record)
+
+
+def test_index_cache_evicts_least_recently_used(tmp_path):
+    cache = libidx.IndexCache(str(tmp_path / "cache"))
+    record = {"url": "", "content_type": "", "etag": "", "text": "x" * 100}
+    for project in ("a", "b", "c"):
+        cache.put("https://example.org/simple", project, dict(record))
+    size = cache.stats()["bytes"] // 3
+    cache.touch("https://example.org/simple", "a")
+    # 记录中的时间戳长度可能相差几个字节，上限留出余量：放得下两条，放不下三条
+    cache.max_bytes = size * 2 + size // 2
+    cache.put("https://example.org/simple", "d", dict(record))
+    assert cache.get("https://example.org/simple", "b") is None
+    assert cache.get("https://example.org/simple", "c") is None
+    assert cache.get("https://example.org/simple", "a") is not None
+    stats = cache.stats()
+    assert stats["evicted"] == 2
+    assert stats["entries"] == 2
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == sorted(
+        cache._files
+    )
+
+
+def test_check_outdated_close_does_not_wait_for_queued_requests(index):
+    state, url = index
+    for i in range(40):
+        state.add_json(f"p{i}", f"p{i}-2.0.tar.gz")
+    state.delay = 0.2
+    results = libidx.check_outdated(
+        [(f"p{i}", "1.0") for i in range(40)], url, max_workers=2
+    )
+    assert next(results)[2] == "2.0"
+    start = time.perf_counter()
+    results.close()
+    assert time.perf_counter() - start < 1
+    time.sleep(0.5)
+    assert len(state.requests) < 10
@@ -0,0 +1,540 @@
+# coding: utf-8
+
+import os
+import threading
+import time
+
+import pytest
+from conftest import FakeEnv, bump_mtime
+from PyQt5.QtCore import QCoreApplication
+
+from library import libm, libpipw
+
+
+def _add_dist(site_dir, name, version, requires=()):
+    entry = site_dir / f"{name}-{version}.dist-info"
+    entry.mkdir()
+    lines = [f"Requires-Dist: {r}\n" for r in requires]
+    (entry / "METADATA").write_text(
+        f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+        + "".join(lines)
+        + "\n",
+        encoding="utf-8",
+    )
+    bump_mtime(site_dir)
+    return entry
+
+
+def _remove_dist(entry):
+    for child in entry.iterdir():
+        child.unlink()
+    entry.rmdir()
+    bump_mtime(entry.parent)
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """返回 (site-packages 目录, 环境, 保存缓存的次数列表)。"""
+    site_dir = tmp_path / "site-packages"
+    site_dir.mkdir()
+    saved = []
+    monkeypatch.setattr(libm, "load_conf", lambda conf: {})
+    monkeypatch.setattr(libm, "save_conf", lambda data, conf: saved.append(conf))
+    return site_dir, FakeEnv(str(tmp_path), str(site_dir)), saved
+
+
+def test_changes_reports_installed_upgraded_and_removed(site):
+    site_dir, env, saved = site
+    _add_dist(site_dir, "Demo_Pkg", "1.0")
+    old = _add_dist(site_dir, "other", "2.0")
+    cache = libm.PkgsInfoCache()
+    installed, removed = cache.changes(env)
+    assert sorted(installed) == [("Demo_Pkg", "1.0"), ("other", "2.0")]
+    assert removed == []
+    assert cache.changes(env) == ([], [])
+    assert saved == ["pkgc"]
+    _remove_dist(old)
+    _add_dist(site_dir, "other", "2.1")
+    _add_dist(site_dir, "fresh", "0.1")
+    installed, removed = cache.changes(env)
+    assert sorted(installed) == [("fresh", "0.1"), ("other", "2.1")]
+    assert removed == []
+    _remove_dist(site_dir / "Demo_Pkg-1.0.dist-info")
+    assert cache.changes(env) == ([], ["Demo_Pkg"])
+    assert cache.pkgs_info(env) == [("fresh", "0.1"), ("other", "2.1")]
+
+
+def test_changes_skips_unchanged_dirs(site, monkeypatch):
+    site_dir, env, saved = site
+    _add_dist(site_dir, "demo", "1.0")
+    cache = libm.PkgsInfoCache()
+    cache.changes(env)
+    monkeypatch.setattr(
+        libm, "dir_dist_infos", lambda *args: pytest.fail("directory re-read")
+    )
+    assert cache.changes(env) == ([], [])
+    assert cache.pkgs_info(env) == [("demo", "1.0")]
+
+
+def test_changes_without_site_packages(site):
+    _, env, saved = site
+    env.py_facts = lambda: {"sys_path": []}
+    assert libm.PkgsInfoCache().changes(env) == ([], [])
+    assert saved == []
+
+
+def test_search_py_envs_dedups_before_probing(tmp_path, monkeypatch):
+    dirs = [tmp_path / n for n in ("a", "b", "c", "known")]
+    for d in dirs:
+        d.mkdir()
+    (tmp_path / "a_link").symlink_to(dirs[0])
+    probed = []
+
+    def probe(_path):
+        probed.append(_path)
+        return None if _path.endswith("c") else (_path, "env " + _path)
+
+    monkeypatch.setattr(libm, "_probe_pyenv", probe)
+    paths = [str(p) for p in dirs] + [str(tmp_path / "a_link"), str(dirs[1])]
+    found = libm.search_py_envs(paths, known=[str(dirs[3])], max_workers=2)
+    assert sorted(found) == [(str(d), "env " + str(d)) for d in dirs[:2]]
+    assert sorted(probed) == [str(d) for d in dirs[:3]]
+
+
+def test_search_py_envs_probes_concurrently(tmp_path, monkeypatch):
+    paths = [str(tmp_path / str(i)) for i in range(3)]
+    for _path in paths:
+        os.mkdir(_path)
+    # 三个探测同时进行时才能都通过屏障，串行探测会超时出错
+    barrier = threading.Barrier(3, timeout=5)
+
+    def probe(_path):
+        barrier.wait()
+        return _path, _path
+
+    monkeypatch.setattr(libm, "_probe_pyenv", probe)
+    found = libm.search_py_envs(paths, max_workers=3)
+    assert sorted(p for p, _ in found) == paths
+
+
+@pytest.fixture
+def fake_python(tmp_path, monkeypatch):
+    """返回 (解释器所在目录, 解释器被运行的次数函数)，指纹缓存保存在内存中。"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    runs = tmp_path / "runs"
+    stored = {}
+    monkeypatch.setattr(libm, "load_conf", lambda conf: dict(stored))
+    monkeypatch.setattr(libm, "save_conf", lambda data, conf: stored.update(data))
+    monkeypatch.setattr(libm, "py_fingerprints", libm.PyFingerprints())
+    _write_python(bin_dir, "3.9.1")
+    return bin_dir, lambda: len(runs.read_text().split()) if runs.exists() else 0
+
+
+def _write_python(bin_dir, version):
+    exe = bin_dir / "python3"
+    exe.write_text(
+        "#!/bin/sh\n"
+        f"echo run >> {bin_dir.parent / 'runs'}\n"
+        f'echo \'{{"version": "{version}", "bits": 64}}\'\n',
+        encoding="utf-8",
+    )
+    exe.chmod(0o755)
+
+
+def test_py_facts_are_cached_by_fingerprint(fake_python):
+    bin_dir, runs = fake_python
+    env = libm.PyEnv(str(bin_dir))
+    assert env.py_info() == "Python 3.9.1 :: 64 bit"
+    assert env.py_facts()["version"] == "3.9.1"
+    assert runs() == 1
+    # 新的缓存实例从配置文件读取，解释器未改变时也不启动解释器
+    libm.py_fingerprints = libm.PyFingerprints()
+    assert libm.PyEnv(str(bin_dir)).py_info() == "Python 3.9.1 :: 64 bit"
+    assert runs() == 1
+
+
+def test_py_facts_refresh_when_interpreter_changes(fake_python):
+    bin_dir, runs = fake_python
+    env = libm.PyEnv(str(bin_dir))
+    assert env.py_info() == "Python 3.9.1 :: 64 bit"
+    _write_python(bin_dir, "3.10.12")
+    bump_mtime(bin_dir / "python3")
+    assert env.py_info() == "Python 3.10.12 :: 64 bit"
+    assert runs() == 2
+
+
+def test_py_facts_of_missing_interpreter(tmp_path, fake_python):
+    _, runs = fake_python
+    assert libm.PyEnv(str(tmp_path / "missing")).py_facts() == {}
+    assert libm.PyEnv(str(tmp_path / "missing")).py_info() == "Python 0.0.0 :: ? bit"
+    assert runs() == 0
+
+
+class _Token:
+    cancelled = False
+
+
+@pytest.fixture
+def fake_install(monkeypatch):
+    """返回 (pip 命令调用记录列表, 不可安装的包名集合)。"""
+    calls, bad = [], set()
+
+    def install(pyenv, names, **kwargs):
+        calls.append(list(names))
+        return list(names), not bad.intersection(names)
+
+    monkeypatch.setattr(libm, "wheelhouse_install", install)
+    return calls, bad
+
+
+def test_batch_install_all_ok_uses_one_command(fake_install):
+    calls, bad = fake_install
+    result = list(libm.batch_install(None, ["a", "b", "c"]))
+    assert result == [("a", True), ("b", True), ("c", True)]
+    assert calls == [["a", "b", "c"]]
+
+
+def test_batch_install_bisects_to_failed_names(fake_install):
+    calls, bad = fake_install
+    bad.update({"b", "g"})
+    names = list("abcdefgh")
+    result = list(libm.batch_install(None, names))
+    assert result == [(n, n not in bad) for n in names]
+    assert calls == [
+        names,
+        list("abcd"),
+        list("ab"),
+        ["a"],
+        list("cd"),
+        list("efgh"),
+        list("ef"),
+        ["g"],
+        ["h"],
+    ]
+
+
+def test_batch_install_few_failures_use_few_commands(fake_install):
+    calls, bad = fake_install
+    bad.add("n05")
+    names = [f"n{i:02}" for i in range(32)]
+    result = list(libm.batch_install(None, names))
+    assert result == [(n, n != "n05") for n in names]
+    assert len(calls) <= 11
+
+
+def test_batch_install_skips_known_failed_right_half(fake_install):
+    calls, bad = fake_install
+    bad.add("d")
+    result = list(libm.batch_install(None, ["a", "b", "c", "d"]))
+    assert result == [("a", True), ("b", True), ("c", True), ("d", False)]
+    # 左半段成功后右半段必然失败，直接对半查找而不再整体重试
+    assert calls == [["a", "b", "c", "d"], ["a", "b"], ["c"]]
+
+
+def test_batch_install_stops_when_cancelled(fake_install, monkeypatch):
+    calls, bad = fake_install
+    bad.add("a")
+    token = _Token()
+    install = libm.wheelhouse_install
+
+    def cancel_after_first(pyenv, names, **kwargs):
+        token.cancelled = True
+        return install(pyenv, names, **kwargs)
+
+    monkeypatch.setattr(libm, "wheelhouse_install", cancel_after_first)
+    assert list(libm.batch_install(None, ["a", "b"], token=token)) == []
+    assert calls == [["a", "b"]]
+
+
+def test_dist_requires_skips_extras(site):
+    site_dir, env, _ = site
+    _add_dist(
+        site_dir,
+        "Demo",
+        "1.0",
+        requires=[
+            "Six (>=1.0)",
+            'Colorama; sys_platform == "win32"',
+            "pytest; extra == 'test'",
+        ],
+    )
+    egg = site_dir / "legacy-0.1-py3.8.egg-info"
+    egg.mkdir()
+    (egg / "PKG-INFO").write_text("Name: legacy\nVersion: 0.1\n\n", encoding="utf-8")
+    (egg / "requires.txt").write_text("zope.interface\n[docs]\nsphinx\n", "utf-8")
+    assert libm.dist_requires(env) == {
+        "demo": {"six", "colorama"},
+        "legacy": {"zope-interface"},
+    }
+
+
+def test_upgrade_waves_orders_dependencies_first():
+    requires = {"app": {"lib"}, "lib": {"core"}, "core": set(), "tool": set()}
+    names = ["App", "tool", "core", "lib"]
+    assert libm.upgrade_waves(requires, names) == [["tool", "core"], ["lib"], ["App"]]
+
+
+def test_upgrade_waves_follows_indirect_dependencies():
+    # app 经未升级的 mid 间接依赖 core
+    requires = {"app": {"mid"}, "mid": {"core"}, "core": set()}
+    assert libm.upgrade_waves(requires, ["app", "core"]) == [["core"], ["app"]]
+
+
+def test_upgrade_waves_cycle_goes_last():
+    requires = {"a": {"b"}, "b": {"a"}, "c": set(), "d": {"c", "a"}}
+    assert libm.upgrade_waves(requires, ["a", "b", "c", "d"]) == [
+        ["c"],
+        ["a", "b", "d"],
+    ]
+
+
+def test_upgrade_waves_unknown_packages():
+    assert libm.upgrade_waves({}, ["x", "y"]) == [["x", "y"]]
+    assert libm.upgrade_waves({}, []) == []
+
+
+def test_iter_pkgs_info_streams_then_uses_cache(site):
+    site_dir, env, saved = site
+    for i in range(5):
+        _add_dist(site_dir, f"pkg{i}", "1.0")
+    cache = libm.PkgsInfoCache()
+    batches = list(cache.iter_pkgs_info(env, batch_size=2))
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert sorted(p for b in batches for p in b) == [
+        (f"pkg{i}", "1.0") for i in range(5)
+    ]
+    assert saved == ["pkgc"]
+    # 缓存有效时直接分批产出缓存中的结果
+    batches = list(cache.iter_pkgs_info(env, batch_size=4))
+    assert batches == [
+        [(f"pkg{i}", "1.0") for i in range(4)],
+        [("pkg4", "1.0")],
+    ]
+
+
+def test_iter_pkgs_info_corrects_quick_rows(site):
+    site_dir, env, _ = site
+    entry = site_dir / "Demo_Pkg-1.0.dist-info"
+    entry.mkdir()
+    (entry / "METADATA").write_text(
+        "Name: demo-pkg\nVersion: 1.0.post1\n\n", encoding="utf-8"
+    )
+    entry = site_dir / "wrong_name-2.0.dist-info"
+    entry.mkdir()
+    (entry / "METADATA").write_text("Name: right\nVersion: 2.0\n\n", encoding="utf-8")
+    batches = list(libm.PkgsInfoCache().iter_pkgs_info(env))
+    assert sorted(batches[0]) == [("Demo_Pkg", "1.0"), ("wrong_name", "2.0")]
+    assert sorted(batches[1]) == [("demo-pkg", "1.0.post1"), ("right", "2.0")]
+    # 快速产出但元数据中没有的包最后以版本 None 产出
+    assert batches[2:] == [[("wrong_name", None)]]
+
+
+def test_setup_pip_workers_follows_config(monkeypatch):
+    pool = libpipw.PipWorkerPool()
+    monkeypatch.setattr(libm, "pip_workers", pool)
+    monkeypatch.setattr(libm, "load_conf", lambda conf: {"enabled": True})
+    libm.setup_pip_workers()
+    assert pool.enabled and pool.idle_timeout == 600
+    pool.worker("python")
+    monkeypatch.setattr(libm, "load_conf", lambda conf: {"idle_timeout": 5})
+    libm.setup_pip_workers()
+    assert not pool.enabled and pool.idle_timeout == 5
+    assert pool.stats()["workers"] == 0
+
+
+def _process_until(predicate, timeout=5):
+    """处理主线程事件(执行器的回调经信号在主线程中调用)直到 predicate() 为真。"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        QCoreApplication.processEvents()
+        time.sleep(0.005)
+
+
+def _env_queues():
+    return libm.EnvJobQueues(libm.TaskExecutor(max_workers=4), group="pm")
+
+
+def test_env_job_queues_serialize_per_env(qapp):
+    queues, busy, started = _env_queues(), [], []
+    queues.busy_changed.connect(lambda key, is_busy: busy.append((key, is_busy)))
+    gates = {name: threading.Event() for name in ("a1", "a2", "b1")}
+
+    def job(name):
+        started.append(name)
+        assert gates[name].wait(5)
+
+    queues.put("a", libm.NewTask(job, ("a1",)))
+    queues.put("a", libm.NewTask(job, ("a2",)))
+    queues.put("b", libm.NewTask(job, ("b1",)))
+    assert busy == [("a", True), ("b", True)]
+    _process_until(lambda: sorted(started) == ["a1", "b1"])
+    assert queues.pending("a") == 1 and queues.pending("b") == 0
+    gates["b1"].set()
+    _process_until(lambda: ("b", False) in busy)
+    assert started == ["a1", "b1"] or started == ["b1", "a1"]
+    assert queues.is_busy("a") and not queues.is_busy("b")
+    gates["a1"].set()
+    _process_until(lambda: "a2" in started)
+    assert queues.is_busy("a") and queues.pending("a") == 0
+    gates["a2"].set()
+    _process_until(lambda: ("a", False) in busy)
+    assert busy == [("a", True), ("b", True), ("b", False), ("a", False)]
+
+
+def test_env_job_queues_cancel_pending(qapp):
+    queues, busy, started = _env_queues(), [], []
+    queues.busy_changed.connect(lambda key, is_busy: busy.append((key, is_busy)))
+    gate = threading.Event()
+
+    def job(name):
+        started.append(name)
+        assert gate.wait(5)
+
+    for name in ("a1", "a2", "a3"):
+        queues.put("a", libm.NewTask(job, (name,)))
+    _process_until(lambda: started == ["a1"])
+    queues.cancel_pending()
+    assert queues.pending("a") == 0 and queues.is_busy("a")
+    gate.set()
+    _process_until(lambda: busy == [("a", True), ("a", False)])
+    assert started == ["a1"]
+
+
+@pytest.fixture
+def blocked_executor(qapp):
+    """返回 (只有一个工作线程的执行器, 放行正在执行的阻塞任务的 Event)。"""
+    executor, gate = libm.TaskExecutor(max_workers=1), threading.Event()
+    executor.submit(libm.NewTask(gate.wait, (5,)))
+    _process_until(lambda: executor.running_count() == 1)
+    yield executor, gate
+    gate.set()
+
+
+def test_executor_runs_pending_tasks_by_priority(blocked_executor):
+    executor, gate = blocked_executor
+    order = []
+    for name, priority in (
+        ("low", libm.PRIORITY_LOW),
+        ("normal", libm.PRIORITY_NORMAL),
+        ("high", libm.PRIORITY_HIGH),
+        ("normal2", libm.PRIORITY_NORMAL),
+    ):
+        executor.submit(libm.NewTask(order.append, (name,)), priority)
+    assert executor.pending_count() == 4
+    gate.set()
+    _process_until(executor.is_idle)
+    assert order == ["high", "normal", "normal2", "low"]
+
+
+def test_executor_keeps_last_pending_task_per_key(blocked_executor):
+    executor, gate = blocked_executor
+    ran, finished = [], []
+    tasks = [libm.NewTask(ran.append, (name,)) for name in ("a", "b", "c")]
+    for task, name in zip(tasks, "abc"):
+        task.at_finish(lambda name=name: finished.append(name))
+        executor.submit(task, key="query" if name != "c" else None, group="w")
+    assert tasks[0].state == libm.NewTask.DROPPED and tasks[0].is_finished()
+    assert executor.pending_count("w") == 2
+    gate.set()
+    _process_until(lambda: len(finished) == 2)
+    assert sorted(ran) == sorted(finished) == ["b", "c"]
+    assert all(t.state == libm.NewTask.FINISHED for t in tasks[1:])
+
+
+def test_executor_never_runs_one_key_twice_at_once(qapp):
+    executor, gate, ran = libm.TaskExecutor(max_workers=2), threading.Event(), []
+    executor.submit(libm.NewTask(gate.wait, (5,)), key="env")
+    # 等待中的同 key 任务会被替换，先让第一个任务开始执行
+    _process_until(lambda: executor.running_count() == 1)
+    executor.submit(libm.NewTask(ran.append, ("same",)), key="env")
+    executor.submit(libm.NewTask(ran.append, ("other",)))
+    _process_until(lambda: ran == ["other"])
+    time.sleep(0.1)
+    assert ran == ["other"] and executor.pending_count() == 1
+    gate.set()
+    _process_until(executor.is_idle)
+    assert ran == ["other", "same"]
+
+
+def test_executor_cancel_pending_by_group(blocked_executor):
+    executor, gate = blocked_executor
+    ran = []
+    for name in ("w1", "w2", "x1"):
+        executor.submit(libm.NewTask(ran.append, (name,)), group=name[0])
+    assert executor.cancel_pending("w") == 2
+    assert executor.pending_count() == 1 and executor.pending_count("w") == 0
+    gate.set()
+    _process_until(executor.is_idle)
+    assert ran == ["x1"]
+
+
+def test_executor_cancel_signals_running_tokens(qapp):
+    executor = libm.TaskExecutor(max_workers=2)
+    tokens = [libm.CancelToken(), libm.CancelToken()]
+    for token, group in zip(tokens, ("w", "x")):
+        executor.submit(libm.NewTask(token.wait, (5,), token=token), group=group)
+    _process_until(lambda: executor.running_count() == 2)
+    assert not executor.wait_idle(0.05, group="w")
+    assert executor.cancel("w") == 0
+    assert executor.wait_idle(5, group="w")
+    assert tokens[0].cancelled and not tokens[1].cancelled
+    executor.cancel()
+    assert executor.wait_idle(5) and tokens[1].cancelled
+
+
+def test_query_memo_revalidates_on_depends(tmp_path):
+    memo, calls = libm.QueryMemo(), []
+    conf, missing = tmp_path / "pip.conf", tmp_path / "missing.conf"
+    conf.write_text("[global]\n", encoding="utf-8")
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    depends = [str(conf), str(missing)]
+    assert memo.get("key", depends, compute) == 1
+    assert memo.get("key", depends, compute) == 1
+    bump_mtime(conf)
+    assert memo.get("key", depends, compute) == 2
+    missing.write_text("", encoding="utf-8")
+    assert memo.get("key", depends, compute) == 3
+    assert memo.get("other", depends, compute) == 4
+    stats = memo.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 4, 2)
+    assert stats["entries"] == 2 and stats["hit_rate"] == 0.2
+    memo.clear()
+    assert memo.get("key", depends, compute) == 5
+
+
+def test_query_memo_skips_failures_and_evicts_oldest():
+    memo, calls = libm.QueryMemo(max_entries=2), []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    assert memo.get("a", [], lambda: compute(None)) is None
+    assert memo.get("a", [], lambda: compute("a")) == "a"
+    memo.get("b", [], lambda: compute("b"))
+    memo.get("a", [], lambda: compute("a"))
+    memo.get("c", [], lambda: compute("c"))
+    memo.get("a", [], lambda: compute("a"))
+    memo.get("b", [], lambda: compute("b"))
+    assert calls == [None, "a", "b", "c", "b"]
+
+
+def test_get_cmd_o_memoizes_with_depends(tmp_path, monkeypatch):
+    monkeypatch.setattr(libm, "query_memo", libm.QueryMemo())
+    conf, runs = tmp_path / "conf", tmp_path / "runs"
+    conf.write_text("one", encoding="utf-8")
+    script = f"echo run >> {runs}; cat {conf}"
+    assert libm.get_cmd_o("sh", "-c", script, depends=[str(conf)]) == "one"
+    assert libm.get_cmd_o("sh", "-c", script, depends=[str(conf)]) == "one"
+    assert libm.get_cmd_o("sh", "-c", script) == "one"
+    assert runs.read_text().split() == ["run"] * 2
+    conf.write_text("two", encoding="utf-8")
+    match = libm.get_cmd_o("sh", "-c", script, regexp=r"t(\w+)", depends=[str(conf)])
+    assert match.group(1) == "wo"
+    assert libm.get_cmd_o("/nonexistent/command", depends=[str(conf)]) == ""
@@ -0,0 +1,119 @@
+# coding: utf-8
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from library import libpipw
+from library.librun import CancelToken
+
+# 代替 pip 的包：把参数写到输出中，"state" 命令输出本进程中执行过的命令数量
+FAKE_PIP_MAIN = """
+import sys, time
+
+calls = []
+
+
+def main(args):
+    calls.append(args)
+    if args == ["sleep"]:
+        time.sleep(30)
+    if args == ["state"]:
+        print(len(calls))
+        return 0
+    print(" ".join(args))
+    return 3 if "fail" in args else 0
+"""
+
+
+@pytest.fixture(scope="module")
+def venv(tmp_path_factory):
+    """返回装有假 pip 包的虚拟环境中的 (解释器路径, pip 包的 __init__.py 路径)。"""
+    root = tmp_path_factory.mktemp("venv")
+    subprocess.run(
+        (sys.executable, "-m", "venv", "--without-pip", str(root)), check=True
+    )
+    interpreter = str(root / "bin" / "python")
+    purelib = subprocess.run(
+        (interpreter, "-c", "import sysconfig; print(sysconfig.get_path('purelib'))"),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    cli = os.path.join(purelib, "pip", "_internal", "cli")
+    os.makedirs(cli)
+    for pkg in ("pip", "pip/_internal", "pip/_internal/cli"):
+        with open(os.path.join(purelib, pkg, "__init__.py"), "a") as fo:
+            fo.write("")
+    init_file = os.path.join(purelib, "pip", "__init__.py")
+    with open(init_file, "w") as fo:
+        fo.write('__version__ = "1.0"\n')
+    with open(os.path.join(cli, "main.py"), "w") as fo:
+        fo.write(FAKE_PIP_MAIN)
+    return interpreter, init_file
+
+
+@pytest.fixture
+def worker(venv):
+    worker = libpipw.PipWorker(venv[0])
+    yield worker
+    worker.close()
+
+
+def test_worker_runs_commands_in_one_process(worker):
+    assert worker.call(("list",)) == (0, "list\n")
+    assert worker.call(("install", "fail")) == (3, "install fail\n")
+    assert worker.starts == 1
+
+
+def test_worker_commands_do_not_share_state(worker):
+    assert worker.call(("list",)) == (0, "list\n")
+    assert worker.call(("state",)) == (0, "1\n")
+    assert worker.call(("state",)) == (0, "1\n")
+    assert worker.starts == 1
+
+
+def test_worker_restarts_when_pip_changes(venv, worker):
+    assert worker.call(("show",)) == (0, "show\n")
+    with open(venv[1], "a") as fo:
+        fo.write("# upgraded\n")
+    assert worker.call(("show",)) == (0, "show\n")
+    assert worker.starts == 2
+
+
+def test_worker_restarts_after_timeout_and_cancel(worker):
+    start = time.monotonic()
+    assert worker.call(("sleep",), timeout=0.5) == (-1, "")
+    assert time.monotonic() - start < 5
+    token = CancelToken()
+    token.cancel()
+    assert worker.call(("sleep",), token=token) == (-1, "")
+    assert worker.call(("list",)) == (0, "list\n")
+    assert worker.starts == 3
+
+
+def test_pool_falls_back_without_pip(venv):
+    pool = libpipw.PipWorkerPool()
+    assert pool.call(venv[0], ("list",)) is None
+    pool.enabled = True
+    assert pool.call(venv[0], ("list",)) == (0, "list\n")
+    assert pool.call(sys.executable + "-missing", ("list",)) is None
+    stats = pool.stats()
+    assert (stats["calls"], stats["fallbacks"], stats["workers"]) == (1, 1, 2)
+    pool.close_all()
+    assert pool.stats()["workers"] == 0
+
+
+def test_pool_closes_idle_workers(venv):
+    pool = libpipw.PipWorkerPool(enabled=True, idle_timeout=0)
+    first = pool.worker(venv[0])
+    assert pool.call(venv[0], ("list",)) == (0, "list\n")
+    time.sleep(0.01)
+    pool.worker(sys.executable)
+    assert pool.stats()["workers"] == 1
+    assert not first._alive()
+    assert pool.worker(venv[0]) is not first
+    pool.close_all()
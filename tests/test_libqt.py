@@ -0,0 +1,236 @@
+# coding: utf-8
+
+import time
+
+from PyQt5.QtCore import QItemSelectionModel, Qt
+from PyQt5.QtWidgets import QTableView
+
+from library.libqt import PkgsTableModel
+
+PKGS = {
+    "beta": ["1.0", "", ""],
+    "alpha": ["3.0", "", ""],
+    "delta": ["2.0", "", ""],
+    "gamma": ["10.0", "", ""],
+}
+
+
+def _model(pkgs_info):
+    model = PkgsTableModel()
+    model.load({name: list(values) for name, values in pkgs_info.items()})
+    return model
+
+
+def _selected_names(view):
+    ranges = [
+        (sel_range.top(), sel_range.bottom())
+        for sel_range in view.selectionModel().selection()
+    ]
+    return sorted(view.model().names_in_ranges(ranges))
+
+
+def _record(model):
+    """返回模型发出的信号记录列表，元素为 (信号名, 参数...) 元组。"""
+    signals = []
+    model.dataChanged.connect(
+        lambda tl, br, *_: signals.append(
+            ("changed", tl.row(), tl.column(), br.row(), br.column())
+        )
+    )
+    model.rowsInserted.connect(lambda _, a, b: signals.append(("inserted", a, b)))
+    model.modelReset.connect(lambda: signals.append(("reset",)))
+    return signals
+
+
+def test_model_serves_cells_by_row(qapp):
+    model = _model({"demo": ["1.0", "1.1", "升级成功"], "bad": ["2.0", "", "卸载失败"]})
+    assert (model.rowCount(), model.columnCount()) == (2, 4)
+    assert model.headerData(0, Qt.Horizontal) == "名称"
+    assert model.headerData(1, Qt.Vertical) == 2
+    assert [model.data(model.index(0, c)) for c in range(4)] == [
+        "demo",
+        "1.0",
+        "1.1",
+        "升级成功",
+    ]
+    assert model.data(model.index(0, 3), Qt.ForegroundRole) == model.COLOR_GREEN
+    assert model.data(model.index(1, 3), Qt.ForegroundRole) == model.COLOR_RED
+    assert model.data(model.index(0, 1), Qt.ForegroundRole) is None
+    assert model.data(model.index(0, 0), Qt.BackgroundRole) == model.COLOR_GRAY
+    assert model.data(model.index(1, 0), Qt.BackgroundRole) is None
+    assert (model.name(1), model.row_of("bad"), model.row_of("none")) == ("bad", 1, -1)
+
+
+def test_update_signals_only_changed_cells(qapp):
+    model = _model(PKGS)
+    signals = _record(model)
+    model.update("delta", [None, "2.1", "正在升级"])
+    model.update("delta", ["2.0", "2.1", None])
+    model.update("omega", ["0.1", None, None])
+    assert signals == [("changed", 2, 2, 2, 3), ("inserted", 4, 4)]
+    assert model.data(model.index(2, 3)) == "正在升级"
+    assert model.data(model.index(4, 2)) == ""
+    assert model.row_of("omega") == 4
+
+
+def test_sync_updates_rows_or_reloads(qapp):
+    model = _model(PKGS)
+    signals = _record(model)
+    pkgs_info = {name: list(values) for name, values in PKGS.items()}
+    pkgs_info["alpha"][1] = "3.1"
+    pkgs_info["zeta"] = ["0.1", "", ""]
+    model.sync(pkgs_info)
+    assert signals == [("changed", 1, 2, 1, 2), ("inserted", 4, 4)]
+    del pkgs_info["beta"]
+    model.sync(pkgs_info)
+    assert signals[-1] == ("reset",)
+    assert sorted(model.names()) == ["alpha", "delta", "gamma", "zeta"]
+    model.clear()
+    assert model.rowCount() == 0 and model.names() == []
+
+
+def test_sort_uses_versions_and_folded_names(qapp):
+    model = _model(
+        {
+            "beta": ["1.0rc1", "", ""],
+            "Alpha": ["1.0", "", ""],
+            "delta": ["1.0.post1", "", ""],
+            "gamma": ["0.9", "", ""],
+        }
+    )
+    model.sort(1)
+    assert model.names() == ["gamma", "beta", "Alpha", "delta"]
+    model.sort(0, Qt.DescendingOrder)
+    assert model.names() == ["gamma", "delta", "beta", "Alpha"]
+    assert model.row_of("Alpha") == 3
+
+
+def test_sort_is_stable_across_columns(qapp):
+    model = _model(
+        {
+            "b": ["1.0", "2.0", ""],
+            "a": ["2.0", "2.0", ""],
+            "d": ["1.0", "1.0", ""],
+            "c": ["2.0", "1.0", ""],
+        }
+    )
+    model.sort(1)
+    model.sort(2)
+    assert model.names() == ["d", "c", "b", "a"]
+    model.update("d", [None, "3.0", None])
+    model.resort()
+    assert model.names() == ["c", "b", "a", "d"]
+
+
+def test_filter_puts_prefix_matches_first(qapp):
+    model = _model(
+        {
+            "pytest-cov": ["4.0", "", ""],
+            "numpy": ["1.26", "", ""],
+            "PyQt5": ["5.15", "", ""],
+            "typing": ["3.7", "", ""],
+        }
+    )
+    model.sort(0)
+    signals = _record(model)
+    model.set_filter(" PY ")
+    assert signals == [("reset",)]
+    assert model.names() == ["PyQt5", "pytest-cov", "numpy"]
+    assert model.row_of("typing") == -1
+    model.update("typing", ["3.8", None, None])
+    assert len(signals) == 1
+    model.sort(1)
+    assert model.names() == ["pytest-cov", "PyQt5", "numpy"]
+    model.set_filter("")
+    assert model.names() == ["numpy", "typing", "pytest-cov", "PyQt5"]
+
+
+def test_sort_and_filter_10k_rows_quickly(qapp):
+    # 目标是一帧(16 毫秒)以内，见 benchmarks/bench_pkgs_table.py；这里放宽到十倍
+    # 只防止退化为逐行重建表格，避免在较慢的机器上误报
+    model = _model({f"pkg{i}": [f"1.{i % 97}.{i}", "", ""] for i in range(10000)})
+    view = QTableView()
+    view.setModel(model)
+    for action in (
+        lambda: model.sort(1),
+        lambda: model.sort(0, Qt.DescendingOrder),
+        lambda: model.set_filter("pkg12"),
+        lambda: model.set_filter(""),
+    ):
+        start = time.perf_counter()
+        action()
+        assert time.perf_counter() - start < 0.16
+    assert model.names()[0] == "pkg9999"
+
+
+def test_selection_follows_rows_across_sort(qapp):
+    model = _model(
+        {
+            "beta": ["1.0", "", ""],
+            "alpha": ["3.0", "", ""],
+            "delta": ["2.0", "", ""],
+            "gamma": ["10.0", "", ""],
+        }
+    )
+    view = QTableView()
+    view.setModel(model)
+    selection = view.selectionModel()
+    for name in ("alpha", "gamma"):
+        selection.select(
+            model.index(model.row_of(name), 0),
+            QItemSelectionModel.Select | QItemSelectionModel.Rows,
+        )
+    selection.setCurrentIndex(
+        model.index(model.row_of("delta"), 1), QItemSelectionModel.NoUpdate
+    )
+    model.sort(1, Qt.DescendingOrder)
+    assert model.names() == ["gamma", "alpha", "delta", "beta"]
+    assert _selected_names(view) == ["alpha", "gamma"]
+    assert model.name(selection.currentIndex().row()) == "delta"
+    assert selection.currentIndex().column() == 1
+    model.sort(0)
+    assert model.names() == ["alpha", "beta", "delta", "gamma"]
+    assert _selected_names(view) == ["alpha", "gamma"]
+
+
+def test_filter_keeps_multi_column_sort(qapp):
+    model = _model(
+        {
+            "pyb": ["1.0", "", ""],
+            "pya": ["2.0", "", ""],
+            "pyd": ["1.0", "", ""],
+            "pyc": ["2.0", "", ""],
+        }
+    )
+    model.sort(0, Qt.DescendingOrder)
+    model.sort(1)
+    assert model.names() == ["pyd", "pyb", "pyc", "pya"]
+    model.set_filter("py")
+    assert model.names() == ["pyd", "pyb", "pyc", "pya"]
+    model.set_filter("")
+    assert model.names() == ["pyd", "pyb", "pyc", "pya"]
+
+
+def test_names_in_ranges_follow_visible_rows(qapp):
+    model = _model({f"pkg{i:02}": ["1.0", "", ""] for i in range(10)})
+    model.sort(0, Qt.DescendingOrder)
+    assert model.names_in_ranges([(0, 1), (5, 5)]) == ["pkg09", "pkg08", "pkg04"]
+    model.set_filter("pkg0")
+    assert model.names_in_ranges([(8, 20)]) == ["pkg01", "pkg00"]
+    assert model.names_in_ranges([]) == []
+
+
+def test_extend_inserts_batches_in_sort_order(qapp):
+    model = _model({"b": ["1.0", "", ""]})
+    model.sort(0)
+    signals = _record(model)
+    model.extend([("d", ["1.0", None, None]), ("a", ["2.0", "", ""])])
+    model.extend([])
+    assert signals == [("inserted", 1, 2)]
+    assert model.names() == ["b", "a", "d"]
+    model.resort()
+    assert model.names() == ["a", "b", "d"]
+    model.rename("d", "D")
+    model.rename("a", "b")
+    assert signals[-1] == ("changed", 2, 0, 2, 0)
+    assert model.names() == ["a", "b", "D"] and model.row_of("d") == -1
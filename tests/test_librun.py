@@ -0,0 +1,143 @@
+# coding: utf-8
+
+import sys
+import threading
+import time
+
+import pytest
+
+from library import librun
+
+
+def _gone(pid, timeout=5):
+    """等待进程 pid 退出(不存在或已成为僵尸进程)，返回是否已退出。"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat") as fi:
+                if fi.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    return True
+        except FileNotFoundError:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_cancel_kills_the_whole_process_group(tmp_path):
+    pid_file = tmp_path / "pid"
+    token = librun.CancelToken()
+    script = f"sleep 30 & echo $! > {pid_file}; wait"
+    threading.Timer(0.5, token.cancel).start()
+    start = time.monotonic()
+    code, _ = librun.run_cancellable(("sh", "-c", script), token=token)
+    assert time.monotonic() - start < 5
+    assert code != 0 and token.cancelled
+    assert _gone(int(pid_file.read_text()))
+    with pytest.raises(librun.Cancelled):
+        token.check()
+
+
+def test_cancelled_token_skips_and_kills_late_processes():
+    token = librun.CancelToken()
+    token.cancel()
+    token.cancel()
+    assert token.wait(0)
+    assert librun.run_cancellable(("sh", "-c", "exit 0"), token=token) == (-1, "")
+    proc = librun.Popen(("sleep", "30"), **librun.GROUP_KWARGS)
+    token.attach(proc)
+    assert proc.wait(5) == -15
+
+
+def test_kill_group_ignores_finished_process():
+    proc = librun.Popen(("true",), **librun.GROUP_KWARGS)
+    proc.wait()
+    librun.kill_group(proc)
+    assert proc.returncode == 0
+
+
+def test_timeout_kills_the_process_group():
+    start = time.monotonic()
+    code, _ = librun.run_cancellable(("sh", "-c", "sleep 30"), timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert code != 0
+
+
+@pytest.fixture
+def runner():
+    return librun.ProcessRunner()
+
+
+def test_runner_reports_output_and_costs(runner):
+    lines = []
+    code = "x = bytearray(64 * 2**20); sum(range(3 * 10**6)); print('a\\nb')"
+    result = runner.run(
+        (sys.executable, "-c", code), on_line=lines.append, label="demo"
+    )
+    assert (result.returncode, result.output, lines) == (0, "a\nb", ["a", "b"])
+    assert result.wall_time >= result.cpu_time > 0
+    # max_rss 以 KB 为单位
+    assert result.max_rss > 64 * 1024
+    assert "峰值内存" in result.cost_text()
+    assert runner.running() == 0
+
+
+def test_runner_keeps_or_drops_stderr(runner):
+    commands = ("sh", "-c", "echo out; echo err >&2; exit 3")
+    assert runner.run(commands).returncode == 3
+    assert sorted(runner.run(commands).output.split()) == ["err", "out"]
+    assert runner.run(commands, merge_stderr=False).output == "out"
+    assert runner.run(commands, keep_output=False).output == ""
+    failed = runner.run(("/nonexistent/command",))
+    assert failed.returncode == -1 and failed.output
+
+
+def test_runner_reads_processes_concurrently(runner):
+    start = time.monotonic()
+    futures = [runner.submit(("sh", "-c", f"sleep 0.5; echo {i}")) for i in range(4)]
+    assert runner.running() == 4
+    assert [f.result().output for f in futures] == ["0", "1", "2", "3"]
+    assert time.monotonic() - start < 1.5
+
+
+def test_runner_does_not_wait_for_orphans_holding_output(runner):
+    start = time.monotonic()
+    result = runner.run(("sh", "-c", "sleep 30 & echo started"))
+    assert (result.returncode, result.output) == (0, "started")
+    assert time.monotonic() - start < librun.DRAIN_TIMEOUT + 2
+
+
+def test_runner_timeout_and_cancel(runner):
+    start = time.monotonic()
+    result = runner.run(("sh", "-c", "echo begin; sleep 30"), timeout=0.5)
+    assert result.returncode == -15 and result.output == "begin"
+    assert time.monotonic() - start < 5
+    token = librun.CancelToken()
+    future = runner.submit(("sleep", "30"), token=token)
+    token.cancel()
+    assert future.result(5).returncode == -15
+    token = librun.CancelToken()
+    token.cancel()
+    assert runner.run(("true",), token=token).returncode == -1
+
+
+def test_runner_flags_timeouts(runner):
+    result = runner.run(("sleep", "30"), timeout=0.3)
+    assert result.timed_out and result.returncode == -15
+    result = runner.run(("sh", "-c", "sleep 0.1"), timeout=5)
+    assert not result.timed_out and result.returncode == 0
+    assert librun.RunResult(0, "", 0.0, 0.0, 0).timed_out is False
+
+
+def test_runner_stats_and_report(runner):
+    runner.run(("true",), label="pip install")
+    runner.run(("false",), label="pip install")
+    runner.run(("true",), label="query")
+    runner.record("pip install", 1.5, 0.5, 2048)
+    stats = runner.stats()
+    assert stats["pip install"]["count"] == 3
+    assert stats["pip install"]["max_rss"] >= 2048
+    assert stats["query"]["count"] == 1
+    report = runner.report("pip ")
+    assert report.startswith("pip install：3 次，用时 ")
+    assert "query" not in report and "峰值内存" in report
+    assert runner.report("none") == ""
@@ -0,0 +1,146 @@
+# coding: utf-8
+
+import os
+
+from library.libtree import ProjectTree, _ignored, parse_gitignore
+
+
+def _rules(tmp_path, text, base=""):
+    path = tmp_path / ".gitignore"
+    path.write_text(text, encoding="utf-8")
+    return parse_gitignore(str(path), base)
+
+
+def _touch(root, *rel_paths):
+    for rel_path in rel_paths:
+        path = root.joinpath(*rel_path.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("", encoding="utf-8")
+
+
+def _rel_files(tree):
+    return sorted(
+        os.path.relpath(path, tree.root).replace(os.sep, "/") for path in tree.files()
+    )
+
+
+def test_comments_and_blank_lines_skipped(tmp_path):
+    assert _rules(tmp_path, "# comment\n\n   \n/\n") == []
+
+
+def test_unanchored_pattern_matches_name_at_any_depth(tmp_path):
+    rules = _rules(tmp_path, "*.log\n")
+    assert _ignored(rules, "a.log", "a.log", False)
+    assert _ignored(rules, "x/y/a.log", "a.log", False)
+    assert not _ignored(rules, "a.txt", "a.txt", False)
+
+
+def test_star_does_not_cross_slash(tmp_path):
+    rules = _rules(tmp_path, "doc/*.txt\n")
+    assert _ignored(rules, "doc/a.txt", "a.txt", False)
+    assert not _ignored(rules, "doc/sub/a.txt", "a.txt", False)
+
+
+def test_anchored_pattern_only_matches_from_base(tmp_path):
+    rules = _rules(tmp_path, "/build\n")
+    assert _ignored(rules, "build", "build", True)
+    assert not _ignored(rules, "src/build", "build", True)
+
+
+def test_dir_only_pattern_skips_files(tmp_path):
+    rules = _rules(tmp_path, "out/\n")
+    assert _ignored(rules, "out", "out", True)
+    assert not _ignored(rules, "out", "out", False)
+
+
+def test_double_star(tmp_path):
+    rules = _rules(tmp_path, "**/cache\nlogs/**\n")
+    assert _ignored(rules, "cache", "cache", True)
+    assert _ignored(rules, "a/b/cache", "cache", True)
+    assert _ignored(rules, "logs/a/b.txt", "b.txt", False)
+    assert not _ignored(rules, "src/logs/a.txt", "a.txt", False)
+
+
+def test_later_negation_wins(tmp_path):
+    rules = _rules(tmp_path, "*.py\n!keep.py\n")
+    assert _ignored(rules, "a.py", "a.py", False)
+    assert not _ignored(rules, "keep.py", "keep.py", False)
+    rules = _rules(tmp_path, "!keep.py\n*.py\n")
+    assert _ignored(rules, "keep.py", "keep.py", False)
+
+
+def test_character_class_and_escape(tmp_path):
+    rules = _rules(tmp_path, "file[0-9].txt\nx[!a].md\n\\#hash\n")
+    assert _ignored(rules, "file3.txt", "file3.txt", False)
+    assert not _ignored(rules, "fileA.txt", "fileA.txt", False)
+    assert _ignored(rules, "xb.md", "xb.md", False)
+    assert not _ignored(rules, "xa.md", "xa.md", False)
+    assert _ignored(rules, "#hash", "#hash", False)
+
+
+def test_nested_base_anchors_to_its_directory(tmp_path):
+    rules = _rules(tmp_path, "gen/*.c\n", base="pkg")
+    assert _ignored(rules, "pkg/gen/a.c", "a.c", False)
+    assert not _ignored(rules, "gen/a.c", "a.c", False)
+    assert not _ignored(rules, "other/gen/a.c", "a.c", False)
+
+
+def test_missing_file_gives_no_rules(tmp_path):
+    assert parse_gitignore(str(tmp_path / "missing")) == []
+
+
+def test_project_tree_applies_nested_gitignore(tmp_path):
+    _touch(
+        tmp_path,
+        "main.py",
+        "debug.log",
+        "pkg/mod.py",
+        "pkg/gen/out.py",
+        "pkg/keep.log",
+        "gen/top.py",
+    )
+    (tmp_path / ".gitignore").write_text("*.log\n", encoding="utf-8")
+    (tmp_path / "pkg" / ".gitignore").write_text("/gen/\n!keep.log\n", encoding="utf-8")
+    tree = ProjectTree(str(tmp_path))
+    assert _rel_files(tree) == [
+        ".gitignore",
+        "gen/top.py",
+        "main.py",
+        "pkg/.gitignore",
+        "pkg/keep.log",
+        "pkg/mod.py",
+    ]
+    assert tree.stats["skipped_files"] == 1
+    assert tree.stats["skipped_dirs"] == 1
+
+
+def test_project_tree_skips_dirs_and_venvs(tmp_path):
+    _touch(
+        tmp_path,
+        "app.py",
+        ".git/config",
+        "__pycache__/app.cpython-38.pyc",
+        "demo.egg-info/PKG-INFO",
+        "env/pyvenv.cfg",
+        "env/lib/site.py",
+    )
+    assert _rel_files(ProjectTree(str(tmp_path))) == ["app.py"]
+
+
+def test_project_tree_without_gitignore(tmp_path):
+    _touch(tmp_path, "a.tmp", "build/b.py", ".git/config")
+    (tmp_path / ".gitignore").write_text("*.tmp\nbuild/\n", encoding="utf-8")
+    tree = ProjectTree(
+        str(tmp_path), skip_dirs=(".git", ".hg", ".svn"), use_gitignore=False
+    )
+    assert _rel_files(tree) == [".gitignore", "a.tmp", "build/b.py"]
+
+
+def test_files_pattern_filters_names(tmp_path):
+    import re
+
+    _touch(tmp_path, "a.py", "b.txt", "sub/c.py")
+    tree = ProjectTree(str(tmp_path))
+    assert _rel_files(tree) == ["a.py", "b.txt", "sub/c.py"]
+    paths = tree.files(re.compile(r".*\.py$"))
+    assert sorted(os.path.basename(p) for p in paths) == ["a.py", "c.py"]
@@ -0,0 +1,341 @@
+# coding: utf-8
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from library import libwhl
+from library.libidx import canonical_name, file_version, version_key
+
+
+class _Token:
+    cancelled = False
+
+
+class _FakePip:
+    """
+    代替 run_pip，从本地 wheel 目录 remote 中"下载"、安装文件。
+    requires 为 {项目名: [依赖的项目名...]}，installed 为已安装的 (包名, 版本) 集合。
+    """
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.requires = dict()
+        self.installed = set()
+        self.calls = list()
+        self.cancel_on_download = None
+
+    def latest_file(self, project):
+        files = [
+            f for f in os.listdir(self.remote) if libwhl.file_project(f) == project
+        ]
+        return max(files, key=lambda f: version_key(file_version(f)), default=None)
+
+    def resolve(self, names):
+        found, stack = dict(), [canonical_name(n) for n in names]
+        while stack:
+            project = stack.pop()
+            if project not in found:
+                found[project] = self.latest_file(project)
+                stack.extend(self.requires.get(project, ()))
+        return found
+
+    def __call__(self, interpreter, *args, timeout=None, token=None):
+        self.calls.append(args)
+        options = {a for a in args if a.startswith("--")}
+        with_value = ("--dest", "--find-links", "--index-url")
+        names = [
+            a
+            for i, a in enumerate(args[1:], 1)
+            if not a.startswith("--") and args[i - 1] not in with_value
+        ]
+        links = args[args.index("--find-links") + 1]
+        resolved = self.resolve(names)
+        if args[0] == "download":
+            dest = args[args.index("--dest") + 1]
+            for project, filename in resolved.items():
+                if filename is None:
+                    return 1, "no matching distribution"
+                shutil.copyfile(
+                    os.path.join(self.remote, filename), os.path.join(dest, filename)
+                )
+                if self.cancel_on_download is not None:
+                    self.cancel_on_download.cancelled = True
+                    return -15, ""
+            return 0, ""
+        local = set(os.listdir(links))
+        for project, filename in resolved.items():
+            if filename is None:
+                return 1, "no matching distribution"
+            if "--no-index" in options and filename not in local:
+                return 1, "no matching distribution"
+        for filename in resolved.values():
+            self.installed.add((filename.split("-")[0], file_version(filename)))
+        return 0, ""
+
+
+def _publish(remote, project, version, size=1000):
+    filename = f"{project}-{version}-py3-none-any.whl"
+    (remote / filename).write_bytes((f"{project} {version}\n".encode() * size)[:size])
+    return filename
+
+
+@pytest.fixture
+def house(tmp_path, monkeypatch):
+    """返回 (Wheelhouse, _FakePip, 远程 wheel 目录)。"""
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    pip = _FakePip(str(remote))
+    monkeypatch.setattr(libwhl, "run_pip", pip)
+    return libwhl.Wheelhouse(str(tmp_path / "wheelhouse")), pip, remote
+
+
+def _install(wheelhouse, pip, names, **kwargs):
+    kwargs.setdefault(
+        "latest", lambda name: file_version(pip.latest_file(canonical_name(name)))
+    )
+    kwargs.setdefault("installed", lambda: set(pip.installed))
+    return wheelhouse.install(sys.executable, names, **kwargs)
+
+
+def _links(wheelhouse):
+    return sorted(os.listdir(wheelhouse.links_dir))
+
+
+def _blobs(wheelhouse):
+    return sorted(
+        os.path.basename(p)
+        for p in glob.glob(os.path.join(wheelhouse.blobs_dir, "*", "*"))
+    )
+
+
+def test_first_install_downloads_then_reuses(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _publish(remote, "dep", "2.0", size=500)
+    pip.requires["demo"] = ["dep"]
+    assert _install(wheelhouse, pip, ["demo"]) == (["demo"], True)
+    assert [c[0] for c in pip.calls] == ["download", "install"]
+    assert "--no-index" in pip.calls[1]
+    assert _links(wheelhouse) == [
+        "demo-1.0-py3-none-any.whl",
+        "dep-2.0-py3-none-any.whl",
+    ]
+    stats = wheelhouse.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 0)
+    assert stats["bytes_downloaded"] == stats["bytes"] == 1500
+    # 另一个环境安装相同的包：仓库中已有最新版本，只运行一次 pip
+    pip.calls.clear()
+    pip.installed.clear()
+    assert _install(wheelhouse, pip, ["Demo"]) == (["Demo"], True)
+    assert len(pip.calls) == 1
+    assert pip.calls[0][0] == "install" and "--no-index" in pip.calls[0]
+    stats = wheelhouse.stats()
+    assert (stats["misses"], stats["hits"]) == (1, 1)
+    assert stats["bytes_saved"] == 1500
+
+
+def test_new_release_is_downloaded(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _install(wheelhouse, pip, ["demo"])
+    _publish(remote, "demo", "1.1")
+    pip.calls.clear()
+    assert _install(wheelhouse, pip, ["demo"], upgrade=True) == (["demo"], True)
+    assert [c[0] for c in pip.calls] == ["download", "install"]
+    assert "--upgrade" in pip.calls[1]
+    assert _links(wheelhouse) == [
+        "demo-1.0-py3-none-any.whl",
+        "demo-1.1-py3-none-any.whl",
+    ]
+    assert wheelhouse.stats()["misses"] == 2
+
+
+def test_has_all_uses_pinned_or_latest_version(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _install(wheelhouse, pip, ["demo"])
+    _publish(remote, "demo", "1.1")
+    assert wheelhouse.has_all(["demo == 1.0"], lambda name: "1.1")
+    assert not wheelhouse.has_all(["demo"], lambda name: "1.1")
+    assert not wheelhouse.has_all(["demo>=1.0"], lambda name: "1.0")
+    assert not wheelhouse.has_all(["demo"], lambda name: None)
+
+
+def test_missing_dependency_falls_back_to_download(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _install(wheelhouse, pip, ["demo"])
+    _publish(remote, "dep", "1.0")
+    pip.requires["demo"] = ["dep"]
+    pip.calls.clear()
+    assert _install(wheelhouse, pip, ["demo"]) == (["demo"], True)
+    assert [c[0] for c in pip.calls] == ["install", "download", "install"]
+    assert "dep-1.0-py3-none-any.whl" in _links(wheelhouse)
+
+
+def test_without_latest_always_downloads(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _install(wheelhouse, pip, ["demo"], latest=None)
+    pip.calls.clear()
+    _install(wheelhouse, pip, ["demo"], latest=None)
+    assert [c[0] for c in pip.calls] == ["download", "install"]
+    stats = wheelhouse.stats()
+    assert (stats["misses"], stats["hits"], stats["bytes_saved"]) == (1, 1, 1000)
+
+
+def test_cancel_during_download_keeps_finished_files(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    token = _Token()
+    pip.cancel_on_download = token
+    assert _install(wheelhouse, pip, ["demo"], token=token) == (["demo"], False)
+    assert [c[0] for c in pip.calls] == ["download"]
+    assert _links(wheelhouse) == ["demo-1.0-py3-none-any.whl"]
+
+
+def test_ingest_rejects_hash_mismatch(house, tmp_path):
+    wheelhouse, pip, remote = house
+    download = tmp_path / "download"
+    download.mkdir()
+    good = _publish(download, "good", "1.0")
+    bad = _publish(download, "bad", "1.0")
+    (download / "notes.txt").write_text("not a distribution", encoding="utf-8")
+    good_sha = libwhl.file_sha256(str(download / good))
+    lookup = {good: good_sha, bad: "0" * 64}.get
+    assert wheelhouse.ingest(str(download), lookup) == (1000, 0)
+    assert _links(wheelhouse) == [good]
+    assert _blobs(wheelhouse) == [good_sha]
+
+
+def test_ingest_replaces_changed_file_and_drops_orphan(house, tmp_path):
+    wheelhouse, pip, remote = house
+    first, second, third = (tmp_path / name for name in ("d1", "d2", "d3"))
+    for download in (first, second, third):
+        download.mkdir()
+    name = _publish(first, "demo", "1.0")
+    shutil.copyfile(first / name, first / "copy-1.0-py3-none-any.whl")
+    old_sha = libwhl.file_sha256(str(first / name))
+    assert wheelhouse.ingest(str(first)) == (1000, 1000)
+    assert _blobs(wheelhouse) == [old_sha]
+    (second / name).write_bytes(b"rebuilt")
+    new_sha = libwhl.file_sha256(str(second / name))
+    assert wheelhouse.ingest(str(second)) == (7, 0)
+    # 旧文件仍被另一个文件名引用，不能删除
+    assert _blobs(wheelhouse) == sorted([old_sha, new_sha])
+    (third / name).write_bytes(b"rebuilt again")
+    assert wheelhouse.ingest(str(third)) == (13, 0)
+    # 只被 name 引用的文件内容改变后，旧文件不再保留
+    assert new_sha not in _blobs(wheelhouse)
+    assert len(_blobs(wheelhouse)) == 2
+    with open(os.path.join(wheelhouse.links_dir, name), "rb") as fo:
+        assert fo.read() == b"rebuilt again"
+
+
+def test_eviction_removes_least_recently_used(house, tmp_path):
+    wheelhouse, pip, remote = house
+    for i, project in enumerate(("a", "b", "c")):
+        download = tmp_path / f"download{i}"
+        download.mkdir()
+        _publish(download, project, "1.0")
+        wheelhouse.ingest(str(download))
+    wheelhouse.mark_used([("A", "1.0")])
+    wheelhouse.max_bytes = 2500
+    download = tmp_path / "download3"
+    download.mkdir()
+    _publish(download, "d", "1.0")
+    wheelhouse.ingest(str(download))
+    assert _links(wheelhouse) == [
+        "a-1.0-py3-none-any.whl",
+        "d-1.0-py3-none-any.whl",
+    ]
+    assert len(_blobs(wheelhouse)) == 2
+    stats = wheelhouse.stats()
+    assert (stats["files"], stats["bytes"]) == (2, 2000)
+
+
+def test_verify_removes_corrupt_files(house, tmp_path):
+    wheelhouse, pip, remote = house
+    download = tmp_path / "download"
+    download.mkdir()
+    _publish(download, "a", "1.0")
+    _publish(download, "b", "1.0")
+    wheelhouse.ingest(str(download))
+    with open(os.path.join(wheelhouse.links_dir, "b-1.0-py3-none-any.whl"), "ab") as fo:
+        fo.write(b"corrupt")
+    assert wheelhouse.verify() == ["b-1.0-py3-none-any.whl"]
+    assert _links(wheelhouse) == ["a-1.0-py3-none-any.whl"]
+    assert len(_blobs(wheelhouse)) == 1
+
+
+def test_stats_survive_reload(house):
+    wheelhouse, pip, remote = house
+    _publish(remote, "demo", "1.0")
+    _install(wheelhouse, pip, ["demo"])
+    reloaded = libwhl.Wheelhouse(wheelhouse.root)
+    assert reloaded.stats() == wheelhouse.stats()
+
+
+def _build_wheel(dest, name, version):
+    dist_info = f"{name}-{version}.dist-info"
+    path = os.path.join(dest, f"{name}-{version}-py3-none-any.whl")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr(f"{name}/__init__.py", f"VERSION = {version!r}\n")
+        zf.writestr(
+            f"{dist_info}/METADATA",
+            f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n",
+        )
+        zf.writestr(
+            f"{dist_info}/WHEEL",
+            "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\n"
+            "Tag: py3-none-any\n",
+        )
+        zf.writestr(f"{dist_info}/RECORD", "")
+    return os.path.basename(path)
+
+
+def test_real_pip_install_from_local_index(tmp_path):
+    venv = tmp_path / "venv"
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "venv", str(venv)],
+            check=True,
+            capture_output=True,
+            timeout=120,
+        )
+    except Exception:
+        pytest.skip("venv with pip is not available")
+    interpreter = glob.glob(str(venv / "bin" / "python"))
+    interpreter = interpreter or glob.glob(str(venv / "Scripts" / "python.exe"))
+    project_dir = tmp_path / "simple" / "demo-pkg-x"
+    project_dir.mkdir(parents=True)
+    filename = _build_wheel(str(project_dir), "demo_pkg_x", "1.0")
+    (project_dir / "index.html").write_text(
+        f'<a href="{filename}">{filename}</a>', encoding="utf-8"
+    )
+    index_url = (tmp_path / "simple").as_uri()
+    wheelhouse = libwhl.Wheelhouse(str(tmp_path / "wheelhouse"))
+    result = wheelhouse.install(
+        interpreter[0], ["demo-pkg-x"], index_url=index_url, latest=lambda n: "1.0"
+    )
+    assert result == (["demo-pkg-x"], True)
+    assert _links(wheelhouse) == [filename]
+    assert wheelhouse.stats()["misses"] == 1
+    subprocess.run(
+        [interpreter[0], "-m", "pip", "uninstall", "-y", "demo-pkg-x"],
+        check=True,
+        capture_output=True,
+    )
+    shutil.rmtree(project_dir)
+    # 镜像源中的文件已删除，只能从仓库安装
+    result = wheelhouse.install(
+        interpreter[0], ["demo-pkg-x"], index_url=index_url, latest=lambda n: "1.0"
+    )
+    assert result == (["demo-pkg-x"], True)
+    assert wheelhouse.stats()["hits"] == 1
@@ -0,0 +1,26 @@
+# coding: utf-8
+
+from types import SimpleNamespace
+
+from PyQt5.QtCore import QItemSelection, QItemSelectionModel
+from PyQt5.QtWidgets import QTableView
+
+import RunPyKit
+from library.libqt import PkgsTableModel
+
+
+def test_selected_row_ranges_are_merged(qapp):
+    model = PkgsTableModel()
+    model.load({f"pkg{i:02}": ["1.0", "", ""] for i in range(20)})
+    view = QTableView()
+    view.setModel(model)
+    selection = QItemSelection()
+    for top, bottom in ((12, 14), (0, 2), (3, 4), (13, 16), (8, 8)):
+        selection.select(model.index(top, 0), model.index(bottom, 3))
+    view.selectionModel().select(selection, QItemSelectionModel.Select)
+    window = SimpleNamespace(tv_installed_info=view)
+    ranges = RunPyKit.PackageManagerWindow.selected_row_ranges(window)
+    assert ranges == [[0, 4], [8, 8], [12, 16]]
+    assert model.names_in_ranges(ranges)[-2:] == ["pkg15", "pkg16"]
+    view.selectAll()
+    assert RunPyKit.PackageManagerWindow.selected_row_ranges(window) == [[0, 19]]